@@ -0,0 +1,233 @@
+"""
+Detection, tracking and CASA accuracy of an analysis against ground truth
+
+Ground truth uses the ``SyntheticSpermVideo.ground_truth()`` layout (one
+dict per cell with frames, x and y in pixels). The detector only reports
+head centers and tracks carry fixed-size boxes, so detections and tracks
+are matched to ground-truth heads by center distance rather than box IoU:
+  detection   COCO-style average precision, averaged over match radii
+  tracking    CLEAR-MOT MOTA (with ID switches) and IDF1
+  casa        error of population VCL/VSL/VAP and motility percentages
+"""
+
+from typing import Dict, Iterable, List, Optional, Any, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from services.casa_calculator import CASACalculator, DEFAULT_PIXEL_TO_MICRON
+
+# Match radii for detection AP, in μm (a head is about 5 x 3 μm)
+DETECTION_MATCH_RADII = (1.0, 2.0, 3.0)
+# Radius for the operating-point precision/recall and for MOT matching, in μm
+MATCH_RADIUS = 2.0
+
+# Recall points of the interpolated precision-recall curve (as in COCO)
+RECALL_POINTS = np.linspace(0.0, 1.0, 101)
+
+# Population CASA metrics compared as relative errors, and percentages compared in points
+CASA_VELOCITY_METRICS = ['vcl_mean', 'vsl_mean', 'vap_mean']
+CASA_PERCENT_METRICS = ['progressive_motility', 'total_motility']
+
+# Minimum track length for CASA, as in analysis
+MIN_TRACK_POINTS = 3
+
+FramePoints = Dict[int, Tuple[np.ndarray, np.ndarray]]
+
+
+def ground_truth_points(tracks: List[Dict[str, Any]], frames: Optional[Iterable[int]] = None) -> FramePoints:
+    """Per frame number, the (ids, xy) of every ground-truth head, limited to ``frames`` when given"""
+    wanted = set(frames) if frames is not None else None
+    per_frame: Dict[int, List[Tuple[Any, float, float]]] = {}
+    for track in tracks:
+        for frame, x, y in zip(track['frames'], track['x'], track['y']):
+            if wanted is None or frame in wanted:
+                per_frame.setdefault(int(frame), []).append((track['track_id'], x, y))
+    return {frame: _points(rows) for frame, rows in per_frame.items()}
+
+
+def tracked_points(frame_detections: List[Dict[str, Any]]) -> FramePoints:
+    """Per analyzed frame, the (track ids, box centers) the tracker reported"""
+    points = {}
+    for record in frame_detections:
+        rows = [(track['track_id'], (track['bbox'][0] + track['bbox'][2]) / 2,
+                 (track['bbox'][1] + track['bbox'][3]) / 2) for track in record['tracks']]
+        points[record['frame_number']] = _points(rows)
+    return points
+
+
+def _points(rows: List[Tuple[Any, float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    ids = np.array([row[0] for row in rows], dtype=object)
+    xy = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 2)
+    return ids, xy
+
+
+def _distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.linalg.norm(a[:, None, :] - b[None, :, :], axis=2)
+
+
+def _greedy_matches(truth: np.ndarray, detections: np.ndarray, radius: float) -> np.ndarray:
+    """Whether each detection (in descending confidence) claims a still-unmatched head within ``radius``"""
+    order = np.argsort(-detections[:, 2], kind='stable')
+    matched = np.zeros(len(detections), dtype=bool)
+    if len(truth) == 0 or len(detections) == 0:
+        return matched
+    distances = _distances(detections[order, :2].astype(np.float64), truth)
+    free = np.ones(len(truth), dtype=bool)
+    for rank, row in enumerate(distances):
+        candidates = np.where(free & (row <= radius))[0]
+        if len(candidates):
+            free[candidates[np.argmin(row[candidates])]] = False
+            matched[order[rank]] = True
+    return matched
+
+
+def average_precision(truth: FramePoints, detections: Dict[int, np.ndarray], radius: float) -> float:
+    """
+    Area under the interpolated precision-recall curve of all frames' detections
+
+    ``detections`` maps frame number to an (N, 3) array of x, y, confidence;
+    ground truth in frames without an entry is not counted.
+    Recall is capped by the lowest confidence the detector was run at.
+    """
+    total = sum(len(xy) for frame, (_, xy) in truth.items() if frame in detections)
+    if total == 0:
+        return float('nan')
+    confidences, hits = [], []
+    for frame, frame_detections in detections.items():
+        _, xy = truth.get(frame, _points([]))
+        confidences.append(frame_detections[:, 2])
+        hits.append(_greedy_matches(xy, frame_detections, radius))
+    if not confidences:
+        return 0.0
+    confidence = np.concatenate(confidences)
+    hit = np.concatenate(hits)[np.argsort(-confidence, kind='stable')]
+
+    true_positives = np.cumsum(hit)
+    precision = true_positives / np.arange(1, len(hit) + 1)
+    recall = true_positives / total
+    # Precision envelope: best precision at any recall at least this high
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    indices = np.searchsorted(recall, RECALL_POINTS, side='left')
+    sampled = np.array([envelope[i] if i < len(envelope) else 0.0 for i in indices])
+    return float(sampled.mean())
+
+
+def detection_accuracy(truth: FramePoints, detections: Dict[int, np.ndarray], threshold: float,
+                       pixel_to_micron: float = DEFAULT_PIXEL_TO_MICRON) -> Dict[str, float]:
+    """mAP over ``DETECTION_MATCH_RADII`` plus precision and recall at the operating ``threshold``"""
+    ap = {radius: average_precision(truth, detections, radius / pixel_to_micron)
+          for radius in DETECTION_MATCH_RADII}
+
+    true_positives = reported = 0
+    for frame, frame_detections in detections.items():
+        kept = frame_detections[frame_detections[:, 2] >= threshold]
+        _, xy = truth.get(frame, _points([]))
+        true_positives += int(_greedy_matches(xy, kept, MATCH_RADIUS / pixel_to_micron).sum())
+        reported += len(kept)
+    total = sum(len(xy) for frame, (_, xy) in truth.items() if frame in detections)
+    return {
+        'map': float(np.mean(list(ap.values()))),
+        **{f'ap@{radius:g}um': value for radius, value in ap.items()},
+        'precision': true_positives / reported if reported else 0.0,
+        'recall': true_positives / total if total else 0.0
+    }
+
+
+def tracking_accuracy(truth: FramePoints, hypotheses: FramePoints, radius: float) -> Dict[str, float]:
+    """
+    CLEAR-MOT MOTA and IDF1 over the frames in ``hypotheses``
+
+    Matches that held in the previous frame are kept while still within
+    ``radius``; the remaining heads and tracks are paired by minimum
+    distance. IDF1 pairs each ground-truth cell with at most one track id
+    for the whole video so as to maximise frames matched.
+    """
+    misses = false_positives = switches = total_truth = total_hypotheses = 0
+    last_match: Dict[Any, Any] = {}
+    overlap: Dict[Tuple[Any, Any], int] = {}
+
+    for frame in sorted(hypotheses):
+        hyp_ids, hyp_xy = hypotheses[frame]
+        gt_ids, gt_xy = truth.get(frame, _points([]))
+        total_truth += len(gt_ids)
+        total_hypotheses += len(hyp_ids)
+        distances = _distances(gt_xy, hyp_xy) if len(gt_ids) and len(hyp_ids) else np.zeros((len(gt_ids), len(hyp_ids)))
+
+        for i, j in zip(*np.nonzero(distances <= radius)):
+            key = (gt_ids[i], hyp_ids[j])
+            overlap[key] = overlap.get(key, 0) + 1
+
+        pairs = []
+        gt_free = np.ones(len(gt_ids), dtype=bool)
+        hyp_free = np.ones(len(hyp_ids), dtype=bool)
+        hyp_index = {hyp_id: j for j, hyp_id in enumerate(hyp_ids)}
+        for i, gt_id in enumerate(gt_ids):
+            j = hyp_index.get(last_match.get(gt_id))
+            if j is not None and hyp_free[j] and distances[i, j] <= radius:
+                pairs.append((i, j))
+                gt_free[i] = hyp_free[j] = False
+
+        rows, cols = np.where(gt_free)[0], np.where(hyp_free)[0]
+        if len(rows) and len(cols):
+            cost = distances[np.ix_(rows, cols)]
+            cost = np.where(cost <= radius, cost, radius * 1e6)
+            for r, c in zip(*linear_sum_assignment(cost)):
+                if cost[r, c] <= radius:
+                    pairs.append((rows[r], cols[c]))
+
+        for i, j in pairs:
+            gt_id, hyp_id = gt_ids[i], hyp_ids[j]
+            if gt_id in last_match and last_match[gt_id] != hyp_id:
+                switches += 1
+            last_match[gt_id] = hyp_id
+        misses += len(gt_ids) - len(pairs)
+        false_positives += len(hyp_ids) - len(pairs)
+
+    id_true_positives = 0
+    if overlap:
+        gt_keys = sorted({key[0] for key in overlap}, key=str)
+        hyp_keys = sorted({key[1] for key in overlap}, key=str)
+        matrix = np.zeros((len(gt_keys), len(hyp_keys)))
+        gt_index = {key: i for i, key in enumerate(gt_keys)}
+        hyp_index = {key: j for j, key in enumerate(hyp_keys)}
+        for (gt_id, hyp_id), count in overlap.items():
+            matrix[gt_index[gt_id], hyp_index[hyp_id]] = count
+        rows, cols = linear_sum_assignment(matrix, maximize=True)
+        id_true_positives = int(matrix[rows, cols].sum())
+
+    return {
+        'mota': 1 - (misses + false_positives + switches) / total_truth if total_truth else float('nan'),
+        'idf1': 2 * id_true_positives / (total_truth + total_hypotheses) if total_truth + total_hypotheses else float('nan'),
+        'id_switches': switches,
+        'misses': misses,
+        'false_positives': false_positives,
+        'id_true_positives': id_true_positives,
+        'ground_truth_points': total_truth,
+        'tracked_points': total_hypotheses
+    }
+
+
+def analysis_casa(tracks: Dict[Any, List[Dict[str, Any]]],
+                  pixel_to_micron: float = DEFAULT_PIXEL_TO_MICRON) -> Dict[str, Any]:
+    """Population CASA metrics of ``process_video`` tracks, computed as the analysis pipeline does"""
+    kept = [points for points in tracks.values() if len(points) >= MIN_TRACK_POINTS]
+    calculator = CASACalculator(pixel_to_micron)
+    offsets = np.concatenate([[0], np.cumsum([len(points) for points in kept])]).astype(np.int64)
+    x = np.array([p['x'] for points in kept for p in points], dtype=np.float64)
+    y = np.array([p['y'] for points in kept for p in points], dtype=np.float64)
+    timestamps = np.array([p['timestamp'] for points in kept for p in points], dtype=np.float64)
+    metrics = calculator.calculate_track_metrics_vectorized(x, y, timestamps, offsets)
+    return calculator.calculate_population_metrics_vectorized(metrics).dict()
+
+
+def casa_errors(measured: Dict[str, Any], expected: Dict[str, Any]) -> Dict[str, float]:
+    """Relative error (%) of population velocities and absolute error (points) of motility percentages"""
+    errors = {}
+    for name in CASA_VELOCITY_METRICS:
+        reference = expected.get(name) or 0.0
+        difference = abs((measured.get(name) or 0.0) - reference)
+        errors[f'{name}_error_pct'] = difference / reference * 100 if reference else float('nan')
+    for name in CASA_PERCENT_METRICS:
+        errors[f'{name}_error_pp'] = abs((measured.get(name) or 0.0) - (expected.get(name) or 0.0))
+    return errors
@@ -0,0 +1,236 @@
+"""
+Benchmark detection, tracking, CASA and end-to-end analysis throughput
+
+All inputs are synthetic videos (services.synthetic_video), so runs are
+repeatable. Groups:
+  detection   ModelService.detect_sperm / detect_sperm_batch, frames/s
+  tracking    ModelService.update_tracker on ground-truth detections, frames/s
+  casa        CASACalculator scalar and vectorized track metrics, tracks/s
+  end_to_end  AnalysisService.process_analysis on written videos, frames/s
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_pipeline --only casa,tracking --save main
+    python -m benchmarks.bench_pipeline --compare main --fail-threshold 0.1
+
+Saved runs live in benchmarks/baselines/; ``--compare`` exits with status 1
+when any benchmark's mean time grew by more than the threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from benchmarks import harness
+from benchmarks.fixtures import (
+    synthetic_video, ground_truth_frame_detections, ground_truth_track_ids, ground_truth_tracks
+)
+from models.analysis_models import AnalysisRequest, AnalysisStatus
+from services.casa_calculator import CASACalculator
+from services.model_service import ModelService
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+GROUPS = ["detection", "tracking", "casa", "end_to_end"]
+
+# Appearance feature size handed to the tracker when running without an embedder
+EMBEDDING_SIZE = 128
+
+
+def bench_detection(model_service: ModelService, densities: List[float], frames: int,
+                    rounds: int) -> List[harness.BenchmarkResult]:
+    results = []
+    for density in densities:
+        images = list(synthetic_video(frames, density).frames())
+        params = {'density': density, 'frames': frames}
+        results.append(harness.measure(
+            f"detect_sperm[density={density:g}]", "detection",
+            lambda: [model_service.detect_sperm(image) for image in images],
+            rounds=rounds, units=len(images), unit="frames", params=params
+        ))
+        results.append(harness.measure(
+            f"detect_sperm_batch[density={density:g}]", "detection",
+            lambda: model_service.detect_sperm_batch(images),
+            rounds=rounds, units=len(images), unit="frames", params=params
+        ))
+    return results
+
+
+def bench_tracking(model_service: ModelService, densities: List[float], frames: int, rounds: int,
+                   embedder: Optional[str]) -> List[harness.BenchmarkResult]:
+    """
+    Per-frame tracker cost on ground-truth detections
+
+    With an embedder the tracker crops and embeds every detection, as in
+    analysis. Without one, each cell gets a fixed random feature vector, which
+    isolates the Kalman/association cost.
+    """
+    results = []
+    for density in densities:
+        video = synthetic_video(frames, density)
+        images = list(video.frames())
+        detections = ground_truth_frame_detections(video)
+        params = {'density': density, 'frames': frames, 'embedder': embedder or "none"}
+
+        if embedder:
+            def run(tracker):
+                for frame_detections, image in zip(detections, images):
+                    model_service.update_tracker(frame_detections, image, tracker)
+        else:
+            rng = np.random.default_rng(0)
+            features = rng.normal(size=(video.count, EMBEDDING_SIZE))
+            features /= np.linalg.norm(features, axis=1, keepdims=True)
+            embeds = [[features[cell] for cell in cells] for cells in ground_truth_track_ids(video)]
+
+            def run(tracker):
+                for frame_detections, frame_embeds in zip(detections, embeds):
+                    model_service.update_tracker(frame_detections, tracker=tracker, embeds=frame_embeds)
+
+        results.append(harness.measure(
+            f"update_tracker[density={density:g},embedder={embedder or 'none'}]", "tracking", run,
+            setup=lambda: model_service.create_tracker(embedder=embedder),
+            rounds=rounds, units=frames, unit="frames", params=params
+        ))
+    return results
+
+
+def bench_casa(track_counts: List[int], track_length: int, rounds: int) -> List[harness.BenchmarkResult]:
+    results = []
+    calculator = CASACalculator()
+    for count in track_counts:
+        video = synthetic_video(track_length, count=count)
+        tracks = ground_truth_tracks(video)
+        offsets = np.concatenate([[0], np.cumsum([len(track) for track in tracks])]).astype(np.int64)
+        x = np.array([det.x for track in tracks for det in track])
+        y = np.array([det.y for track in tracks for det in track])
+        timestamps = np.array([det.timestamp for track in tracks for det in track])
+        params = {'tracks': len(tracks), 'track_length': track_length}
+
+        results.append(harness.measure(
+            f"calculate_track_metrics[tracks={len(tracks)}]", "casa",
+            lambda: [calculator.calculate_track_metrics(track, video.fps) for track in tracks],
+            rounds=rounds, units=len(tracks), unit="tracks", params=params
+        ))
+        results.append(harness.measure(
+            f"calculate_track_metrics_vectorized[tracks={len(tracks)}]", "casa",
+            lambda: calculator.calculate_track_metrics_vectorized(x, y, timestamps, offsets),
+            rounds=rounds, units=len(tracks), unit="tracks", params=params
+        ))
+    return results
+
+
+def bench_end_to_end(model_service: ModelService, lengths: List[int], densities: List[float],
+                     rounds: int, workdir: Path) -> List[harness.BenchmarkResult]:
+    """
+    Wall time of ``process_analysis`` on written synthetic videos
+
+    Runs inside ``workdir`` because the analysis service keeps its results
+    and indexes relative to the working directory.
+    """
+    from services.analysis_service import AnalysisService
+
+    results = []
+    service = AnalysisService()
+    for frames in lengths:
+        for density in densities:
+            name = f"synthetic_{frames}f_{density:g}d"
+            paths = synthetic_video(frames, density).write(workdir / "videos", name)
+
+            def run():
+                request = AnalysisRequest(
+                    analysis_id=str(uuid.uuid4()),
+                    file_path=str(paths['video']),
+                    analysis_type="video",
+                    filename=f"{name}.mp4",
+                    parameters={}
+                )
+                asyncio.run(service.process_analysis(request, model_service))
+                result = service.get_analysis_results(request.analysis_id, include_tracks=False)
+                if result is None or result.status != AnalysisStatus.COMPLETED:
+                    raise RuntimeError(f"Benchmark analysis failed: {result.error_message if result else 'no result'}")
+                service.delete_analysis(request.analysis_id)
+
+            results.append(harness.measure(
+                f"process_analysis[frames={frames},density={density:g}]", "end_to_end", run,
+                rounds=rounds, units=frames, unit="frames", params={'frames': frames, 'density': density}
+            ))
+    return results
+
+
+def _numbers(value: str, cast=float) -> list:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection, tracking, CASA and end-to-end benchmarks")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"Comma-separated groups: {', '.join(GROUPS)}")
+    parser.add_argument("--frames", type=int, default=60, help="Frames per detection/tracking round")
+    parser.add_argument("--densities", default="50,200", help="Cells per megapixel")
+    parser.add_argument("--lengths", default="150,600", help="End-to-end video lengths in frames")
+    parser.add_argument("--tracks", default="100,1000", help="CASA track counts")
+    parser.add_argument("--track-length", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--model", help="Detector weights (default: the service's model path)")
+    parser.add_argument("--tracker-embedder", default="mobilenet", help="'none' benchmarks association only")
+    parser.add_argument("--json", help="Also write the report to this path")
+    parser.add_argument("--save", help="Save the run as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", help="Compare with a saved baseline (name or path)")
+    parser.add_argument("--fail-threshold", type=float, default=harness.DEFAULT_FAIL_THRESHOLD,
+                        help="Allowed mean-time increase before --compare fails (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"Unknown groups: {', '.join(sorted(unknown))}")
+    densities = _numbers(args.densities)
+    embedder = None if args.tracker_embedder.lower() == "none" else args.tracker_embedder
+
+    model_service = None
+    if set(groups) & {"detection", "tracking", "end_to_end"}:
+        model_service = ModelService()
+        if args.model:
+            model_service.model_path = args.model
+        model_service.load_for_inference()
+
+    results = []
+    if "detection" in groups:
+        results += bench_detection(model_service, densities, args.frames, args.rounds)
+    if "tracking" in groups:
+        results += bench_tracking(model_service, densities, args.frames, args.rounds, embedder)
+    if "casa" in groups:
+        results += bench_casa(_numbers(args.tracks, int), args.track_length, args.rounds)
+    if "end_to_end" in groups:
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory(prefix="sperm_bench_") as workdir:
+            os.chdir(workdir)
+            try:
+                results += bench_end_to_end(model_service, _numbers(args.lengths, int), densities,
+                                            args.rounds, Path(workdir))
+            finally:
+                os.chdir(cwd)
+
+    print(harness.format_table(results))
+    data = harness.report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(data, f, indent=2)
+    if args.save:
+        print(f"Saved baseline: {harness.save_baseline(data, args.save)}")
+    if args.compare:
+        rows = harness.compare(results, harness.load_baseline(args.compare), args.fail_threshold)
+        print(harness.format_comparison(rows, args.fail_threshold))
+        if any(row['regressed'] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark result serialization and response compression
+
+Compares the original ``.dict()`` + ``json.dumps`` path with pydantic's
+native serializer and orjson, and reports gzip/brotli sizes and times.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_serialization --tracks 200 --length 300
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, Dict
+
+from benchmarks.fixtures import make_result
+from utils import fast_json
+
+
+def _best_of(func: Callable, repeat: int) -> float:
+    """Best wall time of ``repeat`` runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(n_tracks: int, track_length: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    result = make_result(n_tracks=n_tracks, track_length=track_length)
+    report: Dict[str, Dict[str, float]] = {'serialize': {}, 'compress': {}}
+
+    encoders = {
+        'dict+json': lambda: json.dumps(result.dict(), default=str).encode(),
+        'model_dump_json': lambda: fast_json.model_json(result),
+    }
+    if fast_json.orjson is not None:
+        encoders['dict+orjson'] = lambda: fast_json.dumps(result.dict())
+
+    for name, encode in encoders.items():
+        report['serialize'][name] = _best_of(encode, repeat)
+
+    body = fast_json.model_json(result)
+    report['compress']['identity'] = {'bytes': len(body), 'seconds': 0.0}
+    for encoding in fast_json.supported_encodings():
+        compressed = fast_json.compress(body, encoding)
+        report['compress'][encoding] = {
+            'bytes': len(compressed),
+            'seconds': _best_of(lambda: fast_json.compress(body, encoding), repeat)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Result serialization/compression benchmark")
+    parser.add_argument("--tracks", type=int, default=200)
+    parser.add_argument("--length", type=int, default=300, help="Detections per track")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    report = run(args.tracks, args.length, args.repeat)
+
+    baseline = report['serialize']['dict+json']
+    print(f"Serialization ({args.tracks} tracks x {args.length} detections, best of {args.repeat})")
+    for name, seconds in report['serialize'].items():
+        print(f"  {name:<16} {seconds * 1000:9.1f} ms  {baseline / seconds:5.1f}x")
+
+    identity = report['compress']['identity']['bytes']
+    print("Compression")
+    for encoding, stats in report['compress'].items():
+        print(f"  {encoding:<16} {stats['bytes'] / 1e6:9.2f} MB  "
+              f"{identity / stats['bytes']:5.1f}x  {stats['seconds'] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Synthetic analysis results and videos for benchmarks
+"""
+
+from datetime import datetime
+from typing import List
+
+import numpy as np
+
+from models.analysis_models import (
+    AnalysisResult, AnalysisStatus, AnalysisType, CASAMetrics, SpermDetection,
+    SpermMotilityClass, SpermTrack, VideoAnalysisMetrics
+)
+from services.synthetic_video import SyntheticSpermVideo
+
+MOTILITY_CYCLE = [SpermMotilityClass.PROGRESSIVE, SpermMotilityClass.NON_PROGRESSIVE, SpermMotilityClass.IMMOTILE]
+
+
+def make_result(n_tracks: int = 200, track_length: int = 300, fps: float = 30.0,
+                seed: int = 0, analysis_id: str = "benchmark") -> AnalysisResult:
+    """Build a completed video result shaped like a long real analysis"""
+    rng = np.random.default_rng(seed)
+    total_frames = track_length
+    tracks = []
+    detection_id = 0
+    for track_id in range(n_tracks):
+        # Random walk with drift, in pixels
+        steps = rng.normal(0.0, 1.5, size=(track_length, 2)) + rng.normal(0.0, 1.0, size=2)
+        path = rng.uniform(0, 640, size=2) + np.cumsum(steps, axis=0)
+        confidence = rng.uniform(0.3, 0.99, size=track_length)
+        detections = []
+        for frame in range(track_length):
+            detections.append(SpermDetection(
+                id=detection_id,
+                x=float(path[frame, 0]),
+                y=float(path[frame, 1]),
+                confidence=float(confidence[frame]),
+                frame_number=frame,
+                timestamp=frame / fps
+            ))
+            detection_id += 1
+        vcl, vsl, vap = (float(v) for v in sorted(rng.uniform(5, 120, size=3), reverse=True))
+        tracks.append(SpermTrack(
+            track_id=track_id,
+            detections=detections,
+            start_frame=0,
+            end_frame=track_length - 1,
+            duration=(track_length - 1) / fps,
+            vcl=vcl, vsl=vsl, vap=vap,
+            lin=vsl / vcl * 100, str_metric=vsl / vap * 100, wob=vap / vcl * 100,
+            alh=float(rng.uniform(1, 6)), bcf=float(rng.uniform(5, 25)),
+            motility_class=MOTILITY_CYCLE[track_id % 3]
+        ))
+
+    counts = rng.integers(n_tracks // 2, n_tracks + 1, size=total_frames)
+    video_metrics = VideoAnalysisMetrics(
+        total_frames=total_frames,
+        fps=fps,
+        duration=total_frames / fps,
+        width=640,
+        height=480,
+        frame_counts=counts.tolist(),
+        frame_densities=(counts / (640 * 480) * 1e6).tolist(),
+        count_over_time=[{'time': frame / fps, 'count': float(count)} for frame, count in enumerate(counts)]
+    )
+    casa_metrics = CASAMetrics(
+        total_count=n_tracks, concentration=42.0,
+        progressive_motility=33.3, non_progressive_motility=33.3, total_motility=66.7, immotile=33.3,
+        vcl_mean=60.0, vcl_std=20.0, vsl_mean=30.0, vsl_std=10.0, vap_mean=40.0, vap_std=12.0,
+        lin_mean=50.0, str_mean=75.0, wob_mean=66.0, alh_mean=3.5, bcf_mean=15.0
+    )
+    now = datetime.now()
+    return AnalysisResult(
+        analysis_id=analysis_id,
+        status=AnalysisStatus.COMPLETED,
+        created_at=now,
+        completed_at=now,
+        processing_time=1.0,
+        filename="benchmark.mp4",
+        file_size=0,
+        analysis_type=AnalysisType.VIDEO,
+        tracks=tracks,
+        casa_metrics=casa_metrics,
+        video_metrics=video_metrics
+    )
+
+
+def synthetic_video(frame_count: int = 150, density: float = 100.0, seed: int = 0,
+                    width: int = 640, height: int = 480, **kwargs) -> SyntheticSpermVideo:
+    """Synthetic recording used as benchmark input (density in cells per megapixel)"""
+    return SyntheticSpermVideo(width=width, height=height, frame_count=frame_count,
+                               density=density, seed=seed, **kwargs)
+
+
+def ground_truth_frame_detections(video: SyntheticSpermVideo) -> List[List[SpermDetection]]:
+    """Ground-truth head positions per frame, as a perfect detector would return them"""
+    frames: List[List[SpermDetection]] = [[] for _ in range(video.frame_count)]
+    for track in video.ground_truth():
+        for frame, timestamp, x, y in zip(track['frames'], track['timestamps'], track['x'], track['y']):
+            frames[frame].append(SpermDetection(
+                id=len(frames[frame]), x=x, y=y, confidence=0.9, frame_number=frame, timestamp=timestamp
+            ))
+    return frames
+
+
+def ground_truth_track_ids(video: SyntheticSpermVideo) -> List[List[int]]:
+    """Cell id of every detection of ``ground_truth_frame_detections``, in the same order"""
+    frames: List[List[int]] = [[] for _ in range(video.frame_count)]
+    for track in video.ground_truth():
+        for frame in track['frames']:
+            frames[frame].append(track['track_id'])
+    return frames
+
+
+def ground_truth_tracks(video: SyntheticSpermVideo, min_length: int = 3) -> List[List[SpermDetection]]:
+    """Detections of every ground-truth track long enough for CASA"""
+    tracks = []
+    for track in video.ground_truth():
+        if len(track['frames']) < min_length:
+            continue
+        tracks.append([
+            SpermDetection(id=i, x=x, y=y, confidence=1.0, frame_number=frame, timestamp=timestamp)
+            for i, (frame, timestamp, x, y) in enumerate(zip(track['frames'], track['timestamps'],
+                                                             track['x'], track['y']))
+        ])
+    return tracks
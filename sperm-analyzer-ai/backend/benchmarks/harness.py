@@ -0,0 +1,201 @@
+"""
+Timing, reporting and baselines for the benchmark suite
+
+Output follows pytest-benchmark: a table of min/max/mean/stddev/median/IQR
+per benchmark and a JSON file of the same shape, so saved runs can be
+compared with ``--compare`` here or read by pytest-benchmark tooling.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any
+
+import numpy as np
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+# A benchmark regresses when its mean time grows by more than this fraction
+DEFAULT_FAIL_THRESHOLD = 0.10
+
+
+class BenchmarkResult:
+    """Round timings of one benchmark, plus the work done per round"""
+
+    def __init__(self, name: str, group: str, timings: List[float], units: float = 1,
+                 unit: str = "ops", params: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.group = group
+        self.timings = timings
+        self.units = units
+        self.unit = unit
+        self.params = params or {}
+
+    @property
+    def fullname(self) -> str:
+        return f"{self.group}::{self.name}"
+
+    def stats(self) -> Dict[str, float]:
+        data = np.asarray(self.timings)
+        q1, median, q3 = np.percentile(data, [25, 50, 75])
+        mean = float(data.mean())
+        return {
+            'min': float(data.min()),
+            'max': float(data.max()),
+            'mean': mean,
+            'stddev': float(statistics.stdev(self.timings)) if len(self.timings) > 1 else 0.0,
+            'median': float(median),
+            'iqr': float(q3 - q1),
+            'ops': 1 / mean if mean > 0 else 0.0,
+            'rounds': len(self.timings),
+            'total': float(data.sum())
+        }
+
+    def throughput(self) -> float:
+        """Units (frames, tracks, ...) per second at the mean round time"""
+        mean = float(np.mean(self.timings))
+        return self.units / mean if mean > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'group': self.group,
+            'name': self.name,
+            'fullname': self.fullname,
+            'params': self.params,
+            'stats': self.stats(),
+            'extra_info': {'units': self.units, 'unit': self.unit,
+                           f'{self.unit}_per_second': self.throughput()}
+        }
+
+
+def measure(name: str, group: str, func: Callable[[], Any], rounds: int = 5, warmup: int = 1,
+            units: float = 1, unit: str = "ops", params: Optional[Dict[str, Any]] = None,
+            setup: Optional[Callable[[], Any]] = None) -> BenchmarkResult:
+    """
+    Time ``rounds`` calls of ``func`` after ``warmup`` untimed calls
+
+    ``setup`` runs untimed before every call; when given, its return value
+    is passed to ``func``.
+    """
+    def call():
+        if setup is None:
+            return time.perf_counter(), func()
+        state = setup()
+        return time.perf_counter(), func(state)
+
+    for _ in range(warmup):
+        call()
+    timings = []
+    for _ in range(rounds):
+        start, _ = call()
+        timings.append(time.perf_counter() - start)
+    return BenchmarkResult(name, group, timings, units, unit, params)
+
+
+def _scale(seconds: float):
+    for factor, label in ((1, "s"), (1e3, "ms"), (1e6, "us")):
+        if seconds * factor >= 1:
+            return factor, label
+    return 1e9, "ns"
+
+
+def format_table(results: List[BenchmarkResult]) -> str:
+    """pytest-benchmark style table, one section per group, fastest first"""
+    lines = []
+    columns = ['min', 'max', 'mean', 'stddev', 'median', 'iqr']
+    for group in dict.fromkeys(r.group for r in results):
+        group_results = sorted((r for r in results if r.group == group), key=lambda r: r.stats()['mean'])
+        factor, label = _scale(min(r.stats()['min'] for r in group_results))
+        width = max(len(r.name) for r in group_results) + 2
+        header = (f"{'Name (time in ' + label + ')':<{width + 12}}"
+                  + "".join(f"{c.capitalize() if c != 'iqr' else 'IQR':>12}" for c in columns)
+                  + f"{'Rounds':>8}{'Throughput':>20}")
+        lines.append(f"{'-' * 20} benchmark '{group}': {len(group_results)} tests {'-' * 20}")
+        lines.append(header)
+        lines.append("-" * len(header))
+        for result in group_results:
+            stats = result.stats()
+            lines.append(
+                f"{result.name:<{width + 12}}"
+                + "".join(f"{stats[c] * factor:12.4f}" for c in columns)
+                + f"{stats['rounds']:8d}"
+                + f"{result.throughput():14.1f} {result.unit + '/s':<5}"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _commit_info() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5)
+        dirty = subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True, timeout=5)
+        return {'id': commit.stdout.strip() or None, 'dirty': bool(dirty.stdout.strip())}
+    except Exception:
+        return {'id': None, 'dirty': None}
+
+
+def environment() -> Dict[str, Any]:
+    """Machine, commit and time of a run"""
+    return {
+        'machine_info': {
+            'node': platform.node(),
+            'processor': platform.processor(),
+            'machine': platform.machine(),
+            'python_version': platform.python_version(),
+            'cpu_count': os.cpu_count()
+        },
+        'commit_info': _commit_info(),
+        'datetime': datetime.now().isoformat()
+    }
+
+
+def report(results: List[BenchmarkResult]) -> Dict[str, Any]:
+    """JSON report in the layout pytest-benchmark saves"""
+    return {
+        **environment(),
+        'benchmarks': [result.to_dict() for result in results],
+        'version': '1'
+    }
+
+
+def save_baseline(data: Dict[str, Any], name: str, directory: Path = BASELINE_DIR) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.json"
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def load_baseline(name: str, directory: Path = BASELINE_DIR) -> Dict[str, Any]:
+    path = Path(name) if name.endswith(".json") else directory / f"{name}.json"
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: List[BenchmarkResult], baseline: Dict[str, Any],
+            threshold: float = DEFAULT_FAIL_THRESHOLD) -> List[Dict[str, Any]]:
+    """Mean-time change of every benchmark also present in the baseline"""
+    previous = {b['fullname']: b['stats']['mean'] for b in baseline.get('benchmarks', [])}
+    rows = []
+    for result in results:
+        if result.fullname not in previous:
+            continue
+        before, now = previous[result.fullname], result.stats()['mean']
+        change = (now - before) / before if before > 0 else 0.0
+        rows.append({'fullname': result.fullname, 'baseline_mean': before, 'mean': now,
+                     'change': change, 'regressed': change > threshold})
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]], threshold: float) -> str:
+    lines = [f"Comparison with baseline (fail above +{threshold:.0%} mean time)"]
+    for row in rows:
+        flag = "REGRESSION" if row['regressed'] else ""
+        lines.append(f"  {row['fullname']:<60} {row['baseline_mean'] * 1000:10.2f} ms -> "
+                     f"{row['mean'] * 1000:10.2f} ms  {row['change']:+7.1%}  {flag}")
+    return "\n".join(lines)
@@ -0,0 +1,336 @@
+"""
+Accuracy-versus-speed sweep over inference settings
+
+Runs every combination of detector weights (any format YOLO loads: .pt,
+.onnx, .engine, OpenVINO directories), input size, target frame rate
+(frame skip), confidence threshold and tracker preset over videos with
+ground truth, and reports for each setting:
+  throughput  source video frames and analyzed frames per second of wall time
+  detection   mAP over center-distance radii, precision/recall at the threshold
+  tracking    MOTA and IDF1
+  casa        relative error of mean VCL/VSL/VAP, error of % progressive/motile
+followed by the Pareto front of throughput against each accuracy metric and
+against all of them at once (see benchmarks.accuracy for the definitions).
+
+Videos are synthetic (services.synthetic_video) and/or annotated recordings
+from ``--dataset``: each ``NAME.json`` in the ground-truth layout written by
+``SyntheticSpermVideo.write`` next to a recording ``NAME.<ext>``.
+
+Usage (from the backend directory):
+    python -m benchmarks.sweep --imgsz 320,640 --target-fps none,15 \\
+        --confidence 0.15,0.25,0.4 --trackers deepsort,responsive --output sweep
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from benchmarks import harness
+from benchmarks.accuracy import (
+    MATCH_RADIUS, analysis_casa, casa_errors, detection_accuracy, ground_truth_points,
+    tracked_points, tracking_accuracy
+)
+from benchmarks.fixtures import synthetic_video
+from services.casa_calculator import DEFAULT_PIXEL_TO_MICRON
+from services.model_service import ModelService
+from services.synthetic_video import expected_casa
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# ModelService.create_tracker arguments per tracker preset
+TRACKER_PRESETS = {
+    'deepsort': {},
+    'responsive': {'max_age': 10, 'n_init': 2},
+    'strict': {'max_cosine_distance': 0.1},
+    'persistent': {'max_age': 60, 'max_cosine_distance': 0.3},
+}
+
+RECORDING_SUFFIXES = ['.mp4', '.avi', '.mov', '.mkv', '.webm', '.tif', '.tiff']
+
+# Throughput is maximised; each accuracy metric has its own direction
+THROUGHPUT_METRIC = 'video_fps'
+ACCURACY_OBJECTIVES = {
+    'map': 'max',
+    'mota': 'max',
+    'idf1': 'max',
+    'vcl_mean_error_pct': 'min',
+    'vsl_mean_error_pct': 'min',
+    'progressive_motility_error_pp': 'min',
+}
+
+REPORT_COLUMNS = ['video_fps', 'analysis_fps', 'map', 'precision', 'recall', 'mota', 'idf1',
+                  'vcl_mean_error_pct', 'vsl_mean_error_pct', 'vap_mean_error_pct',
+                  'progressive_motility_error_pp', 'total_motility_error_pp']
+
+
+def synthetic_dataset(workdir: Path, frames: int, densities: List[float], videos: int) -> List[Dict[str, Any]]:
+    """Write ``videos`` synthetic recordings per density and return them with their ground truth"""
+    dataset = []
+    for density in densities:
+        for seed in range(videos):
+            name = f"synthetic_{frames}f_{density:g}d_s{seed}"
+            paths = synthetic_video(frames, density, seed=seed).write(workdir, name)
+            dataset.append(_dataset_entry(name, paths['video'], paths['ground_truth']))
+    return dataset
+
+
+def annotated_dataset(directory: Path) -> List[Dict[str, Any]]:
+    """Recordings in ``directory`` that have a ground-truth ``NAME.json`` beside them"""
+    dataset = []
+    for truth_path in sorted(directory.glob("*.json")):
+        recordings = [truth_path.with_suffix(suffix) for suffix in RECORDING_SUFFIXES]
+        recording = next((path for path in recordings if path.exists()), None)
+        if recording is None:
+            logger.warning(f"No recording found for ground truth {truth_path}")
+            continue
+        dataset.append(_dataset_entry(truth_path.stem, recording, truth_path))
+    return dataset
+
+
+def _dataset_entry(name: str, video: Path, truth_path: Path) -> Dict[str, Any]:
+    with open(truth_path) as f:
+        truth = json.load(f)
+    pixel_to_micron = truth.get('video', {}).get('pixel_to_micron', DEFAULT_PIXEL_TO_MICRON)
+    expected = truth.get('expected_casa') or expected_casa(truth['tracks'], pixel_to_micron)
+    return {
+        'name': name,
+        'video': str(video),
+        'tracks': truth['tracks'],
+        'pixel_to_micron': pixel_to_micron,
+        'expected_casa': expected['population']
+    }
+
+
+def settings_grid(models: List[Optional[str]], sizes: List[Optional[int]], target_fps: List[Optional[float]],
+                  confidences: List[float], trackers: List[str]) -> List[Dict[str, Any]]:
+    return [
+        {'model': model, 'imgsz': size, 'target_fps': fps, 'confidence': confidence, 'tracker': tracker}
+        for model, size, fps, confidence, tracker in itertools.product(models, sizes, target_fps, confidences, trackers)
+    ]
+
+
+def setting_label(setting: Dict[str, Any]) -> str:
+    model = Path(setting['model']).name if setting['model'] else "default"
+    return (f"model={model},imgsz={setting['imgsz'] or 'native'},fps={setting['target_fps'] or 'all'},"
+            f"conf={setting['confidence']:g},tracker={setting['tracker']}")
+
+
+def load_model(model: Optional[str]) -> ModelService:
+    """Model service for the given weights, warmed up so the first timed frame pays no setup cost"""
+    service = ModelService()
+    if model:
+        # load_for_inference falls back to stock weights for a missing path, which would mislabel the run
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"Model weights not found: {model}")
+        service.model_path = model
+    service.load_for_inference()
+    service.detect_sperm(np.zeros((480, 640, 3), dtype=np.uint8))
+    return service
+
+
+def evaluate_video(model_service: ModelService, setting: Dict[str, Any], entry: Dict[str, Any],
+                   tracker_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Analyze one recording with ``setting`` and score it against its ground truth"""
+    model_service.inference_size = setting['imgsz']
+    model_service.confidence_threshold = setting['confidence']
+    # Fresh tracker per recording so no track carries over between videos
+    model_service.tracker = model_service.create_tracker(**tracker_params)
+
+    started = time.perf_counter()
+    results = asyncio.run(model_service.process_video(entry['video'], None, setting['target_fps']))
+    wall = time.perf_counter() - started
+
+    pixel_to_micron = entry['pixel_to_micron']
+    frame_detections = results['frame_detections']
+    detections = {record['frame_number']: record['raw_detections'] for record in frame_detections}
+    # Frames skipped by the target frame rate are neither detections nor misses
+    truth = ground_truth_points(entry['tracks'], detections)
+    measured_casa = analysis_casa(results['tracks'], pixel_to_micron)
+    return {
+        'name': entry['name'],
+        'wall_time': wall,
+        'source_frames': results['video_properties']['total_frames'],
+        'analyzed_frames': len(frame_detections),
+        'frame_step': results['video_properties']['frame_step'],
+        'timings': results['timings'].summary(),
+        'detection': detection_accuracy(truth, detections, setting['confidence'], pixel_to_micron),
+        'tracking': tracking_accuracy(truth, tracked_points(frame_detections), MATCH_RADIUS / pixel_to_micron),
+        'casa': {'measured': measured_casa, **casa_errors(measured_casa, entry['expected_casa'])}
+    }
+
+
+def aggregate(videos: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Pool one setting's per-video results: throughput and MOT counts are summed, the rest averaged"""
+    wall = sum(v['wall_time'] for v in videos)
+    tracking = {key: sum(v['tracking'][key] for v in videos)
+                for key in ('misses', 'false_positives', 'id_switches', 'id_true_positives',
+                            'ground_truth_points', 'tracked_points')}
+    truth_points, tracked = tracking['ground_truth_points'], tracking['tracked_points']
+
+    def mean(section: str, key: str) -> float:
+        values = [v[section][key] for v in videos if not np.isnan(v[section][key])]
+        return float(np.mean(values)) if values else float('nan')
+
+    metrics = {
+        'video_fps': sum(v['source_frames'] for v in videos) / wall if wall > 0 else 0.0,
+        'analysis_fps': sum(v['analyzed_frames'] for v in videos) / wall if wall > 0 else 0.0,
+        'wall_time': wall,
+        'map': mean('detection', 'map'),
+        'precision': mean('detection', 'precision'),
+        'recall': mean('detection', 'recall'),
+        'mota': (1 - (tracking['misses'] + tracking['false_positives'] + tracking['id_switches']) / truth_points
+                 if truth_points else float('nan')),
+        'idf1': (2 * tracking['id_true_positives'] / (truth_points + tracked)
+                 if truth_points + tracked else float('nan')),
+        'id_switches': tracking['id_switches']
+    }
+    for key in videos[0]['casa']:
+        if key != 'measured':
+            metrics[key] = mean('casa', key)
+    return metrics
+
+
+def _dominates(a: Dict[str, float], b: Dict[str, float], objectives: Dict[str, str]) -> bool:
+    better = False
+    for key, direction in objectives.items():
+        x, y = (a[key], b[key]) if direction == 'max' else (-a[key], -b[key])
+        if x < y:
+            return False
+        better = better or x > y
+    return better
+
+
+def pareto_front(runs: List[Dict[str, Any]], objectives: Dict[str, str]) -> List[int]:
+    """Indices of runs no other run matches or beats on every objective (runs with NaN metrics are left out)"""
+    candidates = [i for i, run in enumerate(runs)
+                  if 'metrics' in run and not any(np.isnan(run['metrics'][key]) for key in objectives)]
+    return [i for i in candidates
+            if not any(_dominates(runs[j]['metrics'], runs[i]['metrics'], objectives) for j in candidates if j != i)]
+
+
+def pareto_fronts(runs: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """Front of throughput against each accuracy metric, and against all of them ('all')"""
+    fronts = {metric: pareto_front(runs, {THROUGHPUT_METRIC: 'max', metric: direction})
+              for metric, direction in ACCURACY_OBJECTIVES.items()}
+    fronts['all'] = pareto_front(runs, {THROUGHPUT_METRIC: 'max', **ACCURACY_OBJECTIVES})
+    return fronts
+
+
+def format_report(runs: List[Dict[str, Any]], fronts: Dict[str, List[int]]) -> str:
+    """Markdown table of every setting, fastest first, then each Pareto front"""
+    lines = ["| setting | " + " | ".join(REPORT_COLUMNS) + " | pareto |",
+             "|---" * (len(REPORT_COLUMNS) + 2) + "|"]
+    order = sorted(range(len(runs)), key=lambda i: -runs[i].get('metrics', {}).get(THROUGHPUT_METRIC, -1))
+    for i in order:
+        run = runs[i]
+        if 'metrics' not in run:
+            lines.append(f"| {run['label']} | failed: {run['error']} |")
+            continue
+        on_fronts = [metric for metric, front in fronts.items() if i in front]
+        lines.append(f"| {run['label']} | "
+                     + " | ".join(f"{run['metrics'][column]:.3f}" for column in REPORT_COLUMNS)
+                     + f" | {', '.join(on_fronts)} |")
+
+    for metric, front in fronts.items():
+        title = "all metrics" if metric == 'all' else metric
+        lines += ["", f"Pareto front, {THROUGHPUT_METRIC} vs {title}:"]
+        for i in sorted(front, key=lambda i: -runs[i]['metrics'][THROUGHPUT_METRIC]):
+            metrics = runs[i]['metrics']
+            value = "" if metric == 'all' else f"  {metric}={metrics[metric]:.3f}"
+            lines.append(f"  {metrics[THROUGHPUT_METRIC]:9.1f} fps{value}  {runs[i]['label']}")
+    return "\n".join(lines)
+
+
+def run_sweep(settings: List[Dict[str, Any]], dataset: List[Dict[str, Any]],
+              trackers: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Evaluate every setting on every recording; a setting that fails is reported, not fatal"""
+    runs = []
+    models: Dict[Optional[str], ModelService] = {}
+    for number, setting in enumerate(settings, 1):
+        label = setting_label(setting)
+        logger.info(f"Sweep setting {number}/{len(settings)}: {label}")
+        try:
+            if setting['model'] not in models:
+                models[setting['model']] = load_model(setting['model'])
+            videos = [evaluate_video(models[setting['model']], setting, entry, trackers[setting['tracker']])
+                      for entry in dataset]
+            runs.append({'label': label, 'setting': setting, 'metrics': aggregate(videos), 'videos': videos})
+        except Exception as e:
+            logger.error(f"Sweep setting {label} failed: {str(e)}")
+            runs.append({'label': label, 'setting': setting, 'error': str(e)})
+    return runs
+
+
+def _values(value: str, cast=float) -> list:
+    """Comma-separated values; 'none' stands for the service default"""
+    return [None if v.strip().lower() == "none" else cast(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy-versus-speed sweep over inference settings")
+    parser.add_argument("--models", default="none", help="Comma-separated detector weights ('none' = service default)")
+    parser.add_argument("--imgsz", default="none", help="Detector input sizes ('none' = the model's own)")
+    parser.add_argument("--target-fps", default="none", help="Analysis frame rates ('none' = every frame)")
+    parser.add_argument("--confidence", default="0.25", help="Detection confidence thresholds")
+    parser.add_argument("--trackers", default="deepsort", help=f"Tracker presets: {', '.join(TRACKER_PRESETS)}")
+    parser.add_argument("--tracker-config", help="JSON file of extra presets: name -> create_tracker arguments")
+    parser.add_argument("--synthetic", type=int, default=2, help="Synthetic videos per density (0 = none)")
+    parser.add_argument("--frames", type=int, default=150, help="Synthetic video length")
+    parser.add_argument("--densities", default="50,200", help="Synthetic cells per megapixel")
+    parser.add_argument("--dataset", help="Directory of annotated recordings with NAME.json ground truth")
+    parser.add_argument("--output", help="Write sweep.json and sweep.md to this directory")
+    args = parser.parse_args()
+
+    trackers = dict(TRACKER_PRESETS)
+    if args.tracker_config:
+        with open(args.tracker_config) as f:
+            trackers.update(json.load(f))
+    tracker_names = [name.strip() for name in args.trackers.split(",") if name.strip()]
+    unknown = set(tracker_names) - set(trackers)
+    if unknown:
+        parser.error(f"Unknown tracker presets: {', '.join(sorted(unknown))}")
+
+    settings = settings_grid(_values(args.models, str), _values(args.imgsz, int), _values(args.target_fps),
+                             _values(args.confidence), tracker_names)
+
+    with tempfile.TemporaryDirectory(prefix="sperm_sweep_") as workdir:
+        dataset = []
+        if args.synthetic:
+            dataset += synthetic_dataset(Path(workdir), args.frames, _values(args.densities), args.synthetic)
+        if args.dataset:
+            dataset += annotated_dataset(Path(args.dataset))
+        if not dataset:
+            parser.error("No videos to evaluate (use --synthetic and/or --dataset)")
+        logger.info(f"Sweeping {len(settings)} settings over {len(dataset)} videos")
+        runs = run_sweep(settings, dataset, trackers)
+
+    fronts = pareto_fronts(runs)
+    report = format_report(runs, fronts)
+    print(report)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        data = {
+            **harness.environment(),
+            'dataset': [entry['name'] for entry in dataset],
+            'trackers': {name: trackers[name] for name in tracker_names},
+            'runs': runs,
+            'pareto': {metric: [runs[i]['label'] for i in front] for metric, front in fronts.items()}
+        }
+        with open(Path(args.output) / "sweep.json", 'w') as f:
+            json.dump(data, f, indent=2, default=float)
+        with open(Path(args.output) / "sweep.md", 'w') as f:
+            f.write(report + "\n")
+        print(f"Sweep written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
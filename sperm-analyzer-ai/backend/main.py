@@ -10,10 +10,11 @@ from fastapi.staticfiles import StaticFiles
 import uvicorn
 import os
 import asyncio
+import time
 import uuid
 import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 import numpy as np
 import cv2
 from datetime import datetime
@@ -23,9 +24,14 @@ import shutil
 from ultralytics import YOLO
 import logging
 
-from routes import analysis, health, export
+from routes import health, metrics
 from utils.logger import setup_logger
 from services.model_service import ModelService
+from utils.http_cache import CachedStaticFiles
+from utils.metrics import (
+    RequestMetricsMiddleware, ANALYSES_STARTED, ANALYSES_COMPLETED, ANALYSES_FAILED, observe_analysis
+)
+from utils.stage_timer import StageTimer
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -45,6 +51,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request latency for /metrics
+app.add_middleware(RequestMetricsMiddleware)
+app.include_router(metrics.router)
+# Liveness/readiness probes; the router's startup hook starts background health sampling
+app.include_router(health.router)
+
 # Setup directories
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -55,7 +67,8 @@ MODELS_DIR.mkdir(exist_ok=True)
 
 # Setup static files
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-app.mount("/exports", StaticFiles(directory="exports"), name="exports")
+# Cached export artifacts live under exports/cache/{id}/{version}/ and never change
+app.mount("/exports", CachedStaticFiles(directory="exports", immutable_subdir="cache"), name="exports")
 
 # Setup logger
 logging.basicConfig(level=logging.INFO)
@@ -74,10 +87,38 @@ class AnalysisJob:
         self.progress = 0
         self.message = "Starting analysis..."
         self.created_at = datetime.now()
+        self.started_at = None  # Set when the background task picks the job up
+        self.megapixel_frames = 0.0  # Detection work, known once the file is opened
         self.casa_metrics = None
         self.video_metrics = None
         self.error = None
 
+class AnalysisJobQueue:
+    """Queue gauges over analysis_jobs, read by /metrics at scrape time"""
+    
+    def queue_stats(self) -> Dict[str, int]:
+        # Copy, so this is safe to call from a sampling thread
+        processing = [job for job in list(analysis_jobs.values()) if job.status == "processing"]
+        active = sum(1 for job in processing if job.started_at is not None)
+        return {'active': active, 'queued': len(processing) - active}
+    
+    def pending_work(self) -> float:
+        """Estimated megapixel-frames of jobs still processing"""
+        return sum(job.megapixel_frames for job in list(analysis_jobs.values()) if job.status == "processing")
+
+job_queue = AnalysisJobQueue()
+metrics.register_collector(job_queue)
+health.watch_queue(job_queue)
+
+def model_state() -> Dict[str, Any]:
+    """Whether the detection model is loaded, for the health probes"""
+    return {
+        "initialized": yolo_model is not None,
+        "model_path": str(MODELS_DIR / "sperm_detector.pt") if yolo_model is not None else None
+    }
+
+app.state.model_state = model_state
+
 def load_or_create_model():
     """Load existing model or create a simple detection model"""
     global yolo_model
@@ -97,11 +138,12 @@ def load_or_create_model():
     
     return yolo_model
 
-def detect_sperm_in_frame(frame):
-    """Detect sperm cells in a single frame"""
+def detect_sperm_in_frame(frame, timer: Optional[StageTimer] = None):
+    """Detect sperm cells in a single frame; ``timer`` records preprocess and inference time"""
     if yolo_model is None:
         return []
     
+    started = time.perf_counter()
     # Preprocess frame for better detection
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     
@@ -111,10 +153,14 @@ def detect_sperm_in_frame(frame):
     
     # Convert back to BGR for YOLO
     frame_processed = cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
+    preprocessed = time.perf_counter()
     
     try:
         # Run inference
         results = yolo_model(frame_processed, conf=0.25, verbose=False)
+        if timer is not None:
+            timer.record('preprocess', preprocessed - started)
+            timer.record('inference', time.perf_counter() - preprocessed)
         
         detections = []
         for result in results:
@@ -143,23 +189,30 @@ def detect_sperm_in_frame(frame):
 
 def analyze_image_file(file_path: Path, job: AnalysisJob):
     """Analyze a single image file"""
+    job.started_at = datetime.now()
+    ANALYSES_STARTED.labels(job.file_type).inc()
+    start_time = time.perf_counter()
+    timer = StageTimer()
     try:
         job.progress = 10
         job.message = "Loading image..."
         
         # Load image
-        image = cv2.imread(str(file_path))
+        with timer.stage('decode'):
+            image = cv2.imread(str(file_path))
         if image is None:
             raise ValueError("Could not load image file")
+        job.megapixel_frames = image.shape[0] * image.shape[1] / 1e6
         
         job.progress = 30
         job.message = "Detecting sperm cells..."
         
         # Detect sperm in image
-        detections = detect_sperm_in_frame(image)
+        detections = detect_sperm_in_frame(image, timer)
         
         job.progress = 80
         job.message = "Calculating metrics..."
+        casa_started = time.perf_counter()
         
         # Calculate basic metrics
         total_count = len(detections)
@@ -189,19 +242,28 @@ def analyze_image_file(file_path: Path, job: AnalysisJob):
             casa_metrics['non_progressive_motility'] *= factor
             casa_metrics['immotile'] *= factor
         
+        timer.record('casa', time.perf_counter() - casa_started)
+        
         job.casa_metrics = casa_metrics
         job.progress = 100
         job.message = "Analysis complete"
         job.status = "completed"
+        observe_analysis(timer, 1, time.perf_counter() - start_time, [total_count])
+        ANALYSES_COMPLETED.labels(job.file_type).inc()
         
     except Exception as e:
         job.status = "failed"
         job.error = str(e)
         job.message = f"Analysis failed: {e}"
+        ANALYSES_FAILED.labels(job.file_type).inc()
         logger.error(f"Image analysis error: {e}")
 
 def analyze_video_file(file_path: Path, job: AnalysisJob):
     """Analyze a video file"""
+    job.started_at = datetime.now()
+    ANALYSES_STARTED.labels(job.file_type).inc()
+    start_time = time.perf_counter()
+    timer = StageTimer()
     try:
         job.progress = 10
         job.message = "Loading video..."
@@ -215,23 +277,31 @@ def analyze_video_file(file_path: Path, job: AnalysisJob):
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         duration = total_frames / fps if fps > 0 else 0
         
+        # Process frames (sample every 5th frame for speed)
+        sample_rate = 5
+        megapixels = cap.get(cv2.CAP_PROP_FRAME_WIDTH) * cap.get(cv2.CAP_PROP_FRAME_HEIGHT) / 1e6
+        job.megapixel_frames = -(-total_frames // sample_rate) * megapixels
+        
         job.progress = 20
         job.message = "Analyzing frames..."
         
         all_detections = []
         count_over_time = []
         frame_count = 0
-        
-        # Process frames (sample every 5th frame for speed)
-        sample_rate = 5
+        decode_time = 0.0
         
         while True:
+            decode_started = time.perf_counter()
             ret, frame = cap.read()
+            # Skipped frames are decoded too; their time is charged to the next sampled frame
+            decode_time += time.perf_counter() - decode_started
             if not ret:
                 break
             
             if frame_count % sample_rate == 0:
-                detections = detect_sperm_in_frame(frame)
+                timer.record('decode', decode_time)
+                decode_time = 0.0
+                detections = detect_sperm_in_frame(frame, timer)
                 all_detections.extend(detections)
                 
                 count_over_time.append({
@@ -250,6 +320,7 @@ def analyze_video_file(file_path: Path, job: AnalysisJob):
         
         job.progress = 85
         job.message = "Calculating video metrics..."
+        casa_started = time.perf_counter()
         
         # Calculate video metrics
         total_detections = len(all_detections)
@@ -292,16 +363,22 @@ def analyze_video_file(file_path: Path, job: AnalysisJob):
             casa_metrics['non_progressive_motility'] *= factor
             casa_metrics['immotile'] *= factor
         
+        timer.record('casa', time.perf_counter() - casa_started)
+        
         job.casa_metrics = casa_metrics
         job.video_metrics = video_metrics
         job.progress = 100
         job.message = "Video analysis complete"
         job.status = "completed"
+        observe_analysis(timer, len(count_over_time), time.perf_counter() - start_time,
+                         [point['count'] for point in count_over_time])
+        ANALYSES_COMPLETED.labels(job.file_type).inc()
         
     except Exception as e:
         job.status = "failed"
         job.error = str(e)
         job.message = f"Video analysis failed: {e}"
+        ANALYSES_FAILED.labels(job.file_type).inc()
         logger.error(f"Video analysis error: {e}")
 
 @app.on_event("startup")
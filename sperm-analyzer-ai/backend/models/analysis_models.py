@@ -10,6 +10,7 @@ from enum import Enum
 class AnalysisType(str, Enum):
     VIDEO = "video"
     IMAGE = "image"
+    IMAGE_BATCH = "image_batch"
 
 class AnalysisStatus(str, Enum):
     PENDING = "pending"
@@ -22,6 +23,41 @@ class SpermMotilityClass(str, Enum):
     NON_PROGRESSIVE = "non_progressive"  # NP - Non-progressive motility
     IMMOTILE = "immotile"  # IM - Immotile
 
+# Motility classes as int8 codes in columnar storage, -1 for unclassified tracks
+MOTILITY_CODES = {
+    SpermMotilityClass.PROGRESSIVE: 0,
+    SpermMotilityClass.NON_PROGRESSIVE: 1,
+    SpermMotilityClass.IMMOTILE: 2,
+}
+MOTILITY_CLASSES = {code: motility for motility, code in MOTILITY_CODES.items()}
+
+class RegionOfInterest(BaseModel):
+    """Counting-chamber region analyzed in each frame (full-frame pixels)"""
+    x: Optional[int] = None
+    y: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    mask_path: Optional[str] = None  # Binary mask image in config/masks; non-zero pixels are analyzed
+
+class CalibrationProfile(BaseModel):
+    """Microscope calibration used to turn pixel tracks into CASA metrics"""
+    pixel_to_micron: Optional[float] = None  # μm per pixel
+    fps: Optional[float] = None  # True camera frame rate, if the file's is wrong
+    who_references: Optional[Dict[str, float]] = None  # Overrides of CASACalculator reference values
+
+class MediaInfo(BaseModel):
+    """Upload properties read by the pre-queue probe"""
+    kind: str  # video, stack or image
+    codec: Optional[str] = None
+    fps: Optional[float] = None
+    frame_count: int = 1
+    width: int
+    height: int
+    duration: Optional[float] = None
+    timestamp_source: Optional[str] = None  # TIFF stacks: where frame times come from
+    file_size: int = 0
+    probe_ms: float = 0.0
+
 class AnalysisRequest(BaseModel):
     analysis_id: str
     file_path: str
@@ -58,6 +94,9 @@ class SpermTrack(BaseModel):
     
     motility_class: Optional[SpermMotilityClass] = None
 
+# Per-track kinematic fields of SpermTrack, stored as float64 columns (NaN for missing values)
+TRACK_METRIC_COLUMNS = ['vcl', 'vsl', 'vap', 'lin', 'str_metric', 'wob', 'alh', 'bcf']
+
 class CASAMetrics(BaseModel):
     """Computer Assisted Sperm Analysis metrics"""
     total_count: int
@@ -92,6 +131,10 @@ class VideoAnalysisMetrics(BaseModel):
     width: int
     height: int
     
+    # Rate frames were actually analyzed at (fps / frame_step when subsampled)
+    effective_fps: Optional[float] = None
+    frame_step: int = 1
+    
     # Frame-by-frame counts
     frame_counts: List[int]
     frame_densities: List[float]
@@ -105,6 +148,45 @@ class ImageAnalysisMetrics(BaseModel):
     height: int
     detection_regions: List[Dict[str, Any]]  # Regions with high sperm density
 
+class ImageBatchEntry(BaseModel):
+    """Per-image breakdown of a batch image analysis"""
+    filename: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    detection_count: int = 0
+    concentration: float = 0.0  # per megapixel of analyzed area
+    error: Optional[str] = None  # Set when the image could not be analyzed
+
+class BatchImageMetrics(BaseModel):
+    """Batch-specific analysis metrics"""
+    image_count: int
+    failed_count: int
+    
+    # Spread of per-image counts across the fields of view
+    count_mean: float
+    count_std: float
+    count_cv: float  # Coefficient of variation %
+    
+    images: List[ImageBatchEntry]
+
+class StageTiming(BaseModel):
+    """Durations of one pipeline stage (per frame for decode/preprocess/inference/tracking)"""
+    count: int
+    total_ms: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+class PerformanceMetrics(BaseModel):
+    """Where an analysis spent its time"""
+    wall_time_ms: float
+    frames_analyzed: int
+    frames_per_second: float
+    # decode, preprocess, inference, tracking, casa, serialization, save
+    stages: Dict[str, StageTiming]
+
 class AnalysisResult(BaseModel):
     """Complete analysis results"""
     analysis_id: str
@@ -125,11 +207,15 @@ class AnalysisResult(BaseModel):
     # Type-specific metrics
     video_metrics: Optional[VideoAnalysisMetrics] = None
     image_metrics: Optional[ImageAnalysisMetrics] = None
+    batch_metrics: Optional[BatchImageMetrics] = None
     
     # Processing info
     model_version: str = "yolov8n"
     parameters_used: Dict[str, Any] = {}
     
+    # Per-stage timings
+    performance: Optional[PerformanceMetrics] = None
+    
     # Error info (if failed)
     error_message: Optional[str] = None
     error_details: Optional[Dict[str, Any]] = None
\ No newline at end of file
@@ -2,19 +2,31 @@
 Analysis endpoints for sperm video/image processing
 """
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks, Request
+from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks, Request, Response, Query
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import asyncio
 import os
+import re
+import shutil
 import uuid
 import json
-from datetime import datetime
+import zipfile
+from datetime import date, datetime
 from pathlib import Path
 
 from services.analysis_service import AnalysisService
-from models.analysis_models import AnalysisRequest, AnalysisResult
+from services.cohort_index import COHORT_METRICS
+from models.analysis_models import (
+    AnalysisRequest, AnalysisResult, SpermTrack, SpermMotilityClass, RegionOfInterest, CalibrationProfile,
+    MOTILITY_CLASSES, TRACK_METRIC_COLUMNS
+)
+from services.frame_roi import resolve_mask_path
+from services.media_probe import probe_media, estimate_cost, MediaProbeError
 from utils.logger import setup_logger
+from utils.http_cache import make_etag, etag_matches, not_modified, set_cache_headers, REVALIDATE_CACHE_CONTROL
+from utils.fast_json import json_response, model_json, dumps
 
 router = APIRouter()
 logger = setup_logger()
@@ -28,6 +40,56 @@ class AnalysisResponse(BaseModel):
     message: str
     results: Optional[Dict[str, Any]] = None
 
+class TrackPage(BaseModel):
+    analysis_id: str
+    total: int
+    page: int
+    page_size: int
+    tracks: List[SpermTrack]
+
+# Batch image uploads: accepted still-image suffixes and upper bound on images
+BATCH_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp"}
+MAX_BATCH_IMAGES = 1000
+
+# Fields whose data lives in the bulk track arrays
+BULK_RESULT_FIELDS = {"tracks"}
+
+def _parse_fields(value: Optional[str]) -> set:
+    """Parse a comma-separated field list and validate against AnalysisResult"""
+    if not value:
+        return set()
+    fields = {field.strip() for field in value.split(",") if field.strip()}
+    unknown = fields - set(AnalysisResult.__fields__)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown result fields: {', '.join(sorted(unknown))}")
+    return fields
+
+def _parse_roi(value: str) -> Dict[str, int]:
+    """Parse an 'x,y,width,height' rectangle"""
+    try:
+        x, y, width, height = (int(part) for part in value.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ROI must be 'x,y,width,height' integers")
+    if x < 0 or y < 0 or width <= 0 or height <= 0:
+        raise HTTPException(status_code=400, detail="ROI origin must be non-negative and size positive")
+    return {'x': x, 'y': y, 'width': width, 'height': height}
+
+class ReanalysisRequest(BaseModel):
+    """Tracking parameters for re-running an analysis from its cached detections"""
+    confidence_threshold: Optional[float] = None
+    max_age: Optional[int] = None
+    n_init: Optional[int] = None
+    max_step: Optional[float] = None  # Pixels a head may move from its predicted position between frames
+
+class RecomputeRequest(BaseModel):
+    """What-if CASA recomputation: a device's calibration profile plus overrides"""
+    device_id: Optional[str] = None
+    calibration_profile: Optional[str] = None
+    pixel_to_micron: Optional[float] = None
+    fps: Optional[float] = None
+    who_references: Optional[Dict[str, float]] = None
+    include_tracks: bool = False
+
 class AnalysisStatus(BaseModel):
     analysis_id: str
     status: str
@@ -41,22 +103,40 @@ async def analyze_sample(
     request: Request,
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    analysis_type: str = "video"
+    analysis_type: str = "video",
+    parallel_segments: int = Query(0, ge=0, le=64, description="Process a video as this many parallel segments (0 or 1: sequential)"),
+    roi: Optional[str] = Query(None, description="Region of interest as 'x,y,width,height' in pixels"),
+    device_id: Optional[str] = Query(None, description="Microscope id; its configured ROI applies unless roi is given"),
+    target_fps: Optional[float] = Query(None, gt=0, le=1000, description="Subsample high-frame-rate videos to about this rate"),
+    stack_fps: Optional[float] = Query(None, gt=0, le=10000, description="Frame rate of TIFF stacks without timing metadata")
 ):
     """
     Analyze sperm sample from uploaded video or image
     """
     try:
         # Validate file type
-        allowed_video_types = ["video/mp4", "video/avi", "video/mov", "video/quicktime"]
+        # Multi-page TIFF stacks are analyzed as videos
+        allowed_video_types = ["video/mp4", "video/avi", "video/mov", "video/quicktime", "image/tiff"]
         allowed_image_types = ["image/jpeg", "image/png", "image/tiff"]
         
         if analysis_type == "video" and file.content_type not in allowed_video_types:
-            raise HTTPException(status_code=400, detail="Invalid video file type. Supported: MP4, AVI, MOV")
+            raise HTTPException(status_code=400, detail="Invalid video file type. Supported: MP4, AVI, MOV, TIFF stack")
         
         if analysis_type == "image" and file.content_type not in allowed_image_types:
             raise HTTPException(status_code=400, detail="Invalid image file type. Supported: JPEG, PNG, TIFF")
         
+        parameters = {}
+        if parallel_segments > 1:
+            parameters['parallel_segments'] = parallel_segments
+        if roi:
+            parameters['roi'] = _parse_roi(roi)
+        if device_id:
+            parameters['device_id'] = device_id
+        if target_fps:
+            parameters['target_fps'] = target_fps
+        if stack_fps:
+            parameters['stack_fps'] = stack_fps
+        
         # Generate unique analysis ID
         analysis_id = str(uuid.uuid4())
         
@@ -75,6 +155,19 @@ async def analyze_sample(
         
         logger.info(f"File uploaded: {temp_filepath} for analysis {analysis_id}")
         
+        # Reject undecodable media now instead of after it has waited in the queue
+        try:
+            media = await asyncio.get_running_loop().run_in_executor(
+                None, probe_media, str(temp_filepath), analysis_type
+            )
+        except MediaProbeError as e:
+            temp_filepath.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail=f"Cannot analyze {file.filename}: {str(e)}")
+        cost = estimate_cost(media, parameters)
+        analysis_service.record_media_probe(analysis_id, media, cost)
+        logger.info(f"Probed {file.filename}: {media.kind} {media.codec} {media.width}x{media.height}, "
+                    f"{media.frame_count} frames in {media.probe_ms:.1f} ms")
+        
         # Get model service from app state
         model_service = request.app.state.model_service
         
@@ -83,7 +176,8 @@ async def analyze_sample(
             analysis_id=analysis_id,
             file_path=str(temp_filepath),
             analysis_type=analysis_type,
-            filename=file.filename
+            filename=file.filename,
+            parameters=parameters
         )
         
         # Start background analysis
@@ -96,37 +190,339 @@ async def analyze_sample(
         return AnalysisResponse(
             analysis_id=analysis_id,
             status="processing",
-            message="Analysis started. Use /analysis/{analysis_id}/status to check progress."
+            message="Analysis started. Use /analysis/{analysis_id}/status to check progress.",
+            results={'media': media.dict(), 'estimated_cost': cost}
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analysis failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+def _batch_upload_name(index: int, filename: str) -> str:
+    """Upload-order prefix plus a filesystem-safe version of the original name"""
+    safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", Path(filename).name) or "image"
+    return f"{index:05d}_{safe_name}"
+
+@router.post("/analyze/batch", response_model=AnalysisResponse)
+async def analyze_image_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    roi: Optional[str] = Query(None, description="Region of interest as 'x,y,width,height' in pixels"),
+    device_id: Optional[str] = Query(None, description="Microscope id; its configured ROI applies unless roi is given")
+):
+    """
+    Analyze many still images (or ZIP archives of images) as one sample
+    """
+    analysis_id = str(uuid.uuid4())
+    upload_dir = Path("uploads") / analysis_id
+    try:
+        parameters = {}
+        if roi:
+            parameters['roi'] = _parse_roi(roi)
+        if device_id:
+            parameters['device_id'] = device_id
+        
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        image_count = 0
+        
+        def add_image(filename: str, source):
+            nonlocal image_count
+            if image_count >= MAX_BATCH_IMAGES:
+                raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IMAGES} images per batch")
+            with open(upload_dir / _batch_upload_name(image_count, filename), "wb") as buffer:
+                shutil.copyfileobj(source, buffer)
+            image_count += 1
+        
+        for file in files:
+            if Path(file.filename or "").suffix.lower() == ".zip" or file.content_type in ("application/zip", "application/x-zip-compressed"):
+                try:
+                    with zipfile.ZipFile(file.file) as archive:
+                        for member in archive.infolist():
+                            name = Path(member.filename)
+                            if member.is_dir() or name.suffix.lower() not in BATCH_IMAGE_SUFFIXES or name.name.startswith("."):
+                                continue
+                            with archive.open(member) as source:
+                                add_image(name.name, source)
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"Invalid ZIP archive: {file.filename}")
+            elif Path(file.filename or "").suffix.lower() in BATCH_IMAGE_SUFFIXES:
+                add_image(file.filename, file.file)
+            else:
+                raise HTTPException(status_code=400, detail=f"Unsupported file in batch: {file.filename}")
+        
+        if image_count == 0:
+            raise HTTPException(status_code=400, detail="No images found in upload")
+        
+        logger.info(f"Batch of {image_count} images uploaded to {upload_dir} for analysis {analysis_id}")
+        
+        analysis_request = AnalysisRequest(
+            analysis_id=analysis_id,
+            file_path=str(upload_dir),
+            analysis_type="image_batch",
+            filename=files[0].filename if len(files) == 1 else f"{image_count} images",
+            parameters=parameters
+        )
+        
+        background_tasks.add_task(
+            analysis_service.process_analysis,
+            analysis_request,
+            request.app.state.model_service
+        )
+        
+        return AnalysisResponse(
+            analysis_id=analysis_id,
+            status="processing",
+            message=f"Batch analysis of {image_count} images started. Use /analysis/{{analysis_id}}/status to check progress."
+        )
+        
+    except HTTPException:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
+    except Exception as e:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        logger.error(f"Batch analysis failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
+
 @router.get("/analysis/{analysis_id}/status", response_model=AnalysisStatus)
-async def get_analysis_status(analysis_id: str):
+async def get_analysis_status(analysis_id: str, request: Request, response: Response):
     """Get analysis status and progress"""
     try:
         status = analysis_service.get_analysis_status(analysis_id)
         if not status:
             raise HTTPException(status_code=404, detail="Analysis not found")
+        
+        etag = make_etag(
+            analysis_id, status['status'], status['progress'], status['message'], status.get('completed_at')
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag, "no-cache")
+        set_cache_headers(response, etag, "no-cache")
         return status
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get analysis status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/analysis/{analysis_id}/results")
-async def get_analysis_results(analysis_id: str):
-    """Get analysis results"""
+async def get_analysis_results(
+    analysis_id: str,
+    request: Request,
+    include: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    exclude: Optional[str] = Query(None, description="Comma-separated fields to omit")
+):
+    """Get analysis results, optionally restricted to a subset of fields"""
     try:
-        results = analysis_service.get_analysis_results(analysis_id)
+        include_fields = _parse_fields(include)
+        exclude_fields = _parse_fields(exclude)
+        selected = (include_fields or set(AnalysisResult.__fields__)) - exclude_fields
+
+        # Stored results only change when rewritten, which changes their version
+        version = analysis_service.get_result_version(analysis_id)
+        etag = make_etag(analysis_id, version, *sorted(selected)) if version else None
+        if etag and etag_matches(request, etag):
+            return not_modified(etag)
+
+        # Bulk arrays are only read from disk when a field that needs them is selected
+        results = analysis_service.get_analysis_results(
+            analysis_id, include_tracks=bool(selected & BULK_RESULT_FIELDS)
+        )
         if not results:
             raise HTTPException(status_code=404, detail="Analysis results not found")
-        return results
+        # Serialized natively and compressed per Accept-Encoding; full results run to several MB
+        body = model_json(results, include=selected if include_fields or exclude_fields else None)
+        return json_response(request, body, etag=etag, cache_control=REVALIDATE_CACHE_CONTROL if etag else None)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get analysis results: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/analysis/{analysis_id}/tracks", response_model=TrackPage)
+async def get_analysis_tracks(
+    analysis_id: str,
+    request: Request,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
+    motility_class: Optional[SpermMotilityClass] = None,
+    min_vcl: Optional[float] = Query(None, ge=0, description="Minimum VCL (μm/s)"),
+    max_vcl: Optional[float] = Query(None, ge=0, description="Maximum VCL (μm/s)"),
+    include_detections: bool = True
+):
+    """Get a paginated, filtered list of tracks"""
+    try:
+        version = analysis_service.get_result_version(analysis_id)
+        etag = make_etag(analysis_id, version, *sorted(request.query_params.multi_items())) if version else None
+        if etag and etag_matches(request, etag):
+            return not_modified(etag)
+        
+        track_page = analysis_service.get_tracks(
+            analysis_id,
+            offset=(page - 1) * page_size,
+            limit=page_size,
+            motility_class=motility_class,
+            min_vcl=min_vcl,
+            max_vcl=max_vcl,
+            include_detections=include_detections
+        )
+        if track_page is None:
+            raise HTTPException(status_code=404, detail="Analysis results not found")
+        body = model_json(TrackPage(
+            analysis_id=analysis_id,
+            total=track_page['total'],
+            page=page,
+            page_size=page_size,
+            tracks=track_page['tracks']
+        ))
+        return json_response(request, body, etag=etag, cache_control=REVALIDATE_CACHE_CONTROL if etag else None)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get analysis tracks: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/analysis/{analysis_id}/reanalyze", response_model=AnalysisResponse)
+async def reanalyze(analysis_id: str, reanalysis: ReanalysisRequest, request: Request, background_tasks: BackgroundTasks):
+    """
+    Re-track a video analysis with new parameters from its cached detections
+    """
+    try:
+        parameters: Dict[str, Any] = {}
+        if reanalysis.confidence_threshold is not None:
+            parameters['confidence_threshold'] = reanalysis.confidence_threshold
+        tracker = reanalysis.dict(include={'max_age', 'n_init', 'max_step'}, exclude_none=True)
+        if tracker:
+            parameters['tracker'] = tracker
+        
+        try:
+            analysis_request = analysis_service.prepare_reanalysis(analysis_id, parameters)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        background_tasks.add_task(
+            analysis_service.process_reanalysis,
+            analysis_request,
+            request.app.state.model_service
+        )
+        
+        return AnalysisResponse(
+            analysis_id=analysis_request.analysis_id,
+            status="processing",
+            message="Re-analysis started. Use /analysis/{analysis_id}/status to check progress."
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Re-analysis failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Re-analysis failed: {str(e)}")
+
+@router.post("/analysis/{analysis_id}/recompute")
+async def recompute_casa(analysis_id: str, recompute: RecomputeRequest, request: Request):
+    """
+    Recompute CASA metrics and the WHO assessment of stored tracks under a
+    different calibration or reference values (not saved)
+    """
+    try:
+        overrides = recompute.dict(include={'pixel_to_micron', 'fps', 'who_references'}, exclude_none=True)
+        try:
+            calibration = analysis_service.resolve_calibration(
+                recompute.device_id, recompute.calibration_profile, overrides
+            )
+            recomputed = analysis_service.recompute_casa(analysis_id, calibration)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if recomputed is None:
+            raise HTTPException(status_code=404, detail="Analysis results not found")
+        
+        body = {
+            'analysis_id': analysis_id,
+            'calibration': calibration,
+            'casa_metrics': recomputed['casa_metrics'].dict(),
+            'who_assessment': recomputed['who_assessment']
+        }
+        if recompute.include_tracks:
+            # Columnar: one list per metric, aligned with track_id
+            track_metrics = recomputed['track_metrics']
+            body['tracks'] = {
+                'track_id': recomputed['track_ids'].tolist(),
+                **{
+                    name: [None if value != value else value for value in track_metrics[name].tolist()]
+                    for name in TRACK_METRIC_COLUMNS
+                },
+                'motility_class': [
+                    MOTILITY_CLASSES[code].value if code in MOTILITY_CLASSES else None
+                    for code in track_metrics['motility_class'].tolist()
+                ]
+            }
+        return json_response(request, dumps(body))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"CASA recomputation failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/analysis/cohort/aggregate")
+async def aggregate_cohort(
+    metrics: str = Query("progressive_motility,total_motility,vcl_mean", description="Comma-separated CASA metrics"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    analysis_type: Optional[str] = None,
+    percentiles: Optional[str] = Query(None, description="Comma-separated percentiles, e.g. 10,50,90"),
+    bins: int = Query(0, ge=0, le=200, description="Histogram bins (0 disables)")
+):
+    """Aggregate CASA metrics across stored analyses"""
+    try:
+        metric_list = [m.strip() for m in metrics.split(",") if m.strip()]
+        unknown = set(metric_list) - set(COHORT_METRICS)
+        if unknown or not metric_list:
+            raise HTTPException(status_code=400, detail=f"Unknown metrics: {', '.join(sorted(unknown))}")
+        try:
+            percentile_list = [float(p) for p in percentiles.split(",")] if percentiles else []
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Percentiles must be numbers")
+        if any(p < 0 or p > 100 for p in percentile_list):
+            raise HTTPException(status_code=400, detail="Percentiles must be between 0 and 100")
+        
+        aggregates = analysis_service.aggregate_cohort(
+            metric_list,
+            date_from=date_from,
+            date_to=date_to,
+            analysis_type=analysis_type,
+            percentiles=percentile_list,
+            bins=bins
+        )
+        return {
+            "filters": {
+                "date_from": date_from,
+                "date_to": date_to,
+                "analysis_type": analysis_type
+            },
+            **aggregates
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Cohort aggregation failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/analysis/performance")
+async def get_performance_summary():
+    """Per-stage pipeline timings aggregated over completed analyses"""
+    try:
+        return analysis_service.get_performance_summary()
+    except Exception as e:
+        logger.error(f"Failed to get performance summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/analysis/{analysis_id}")
 async def delete_analysis(analysis_id: str):
     """Delete analysis and associated files"""
@@ -147,4 +543,50 @@ async def list_analyses():
         return {"analyses": analyses}
     except Exception as e:
         logger.error(f"Failed to list analyses: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/devices")
+async def list_devices():
+    """List per-device analysis settings"""
+    return {"devices": analysis_service.device_profiles.list_devices()}
+
+@router.put("/devices/{device_id}/roi")
+async def set_device_roi(device_id: str, roi: RegionOfInterest):
+    """Set the counting-chamber ROI applied to analyses from a device"""
+    if roi.mask_path is None and (roi.width is None or roi.height is None):
+        raise HTTPException(status_code=400, detail="ROI needs width and height, or a mask_path")
+    if roi.mask_path is not None and resolve_mask_path(roi.mask_path) is None:
+        raise HTTPException(status_code=400, detail="ROI mask_path must name an image file in config/masks")
+    
+    roi_spec = roi.dict(exclude_none=True)
+    analysis_service.device_profiles.set_section(device_id, "roi", roi_spec)
+    return {"device_id": device_id, "roi": roi_spec}
+
+@router.put("/devices/{device_id}/calibration/{profile}")
+async def set_device_calibration(device_id: str, profile: str, calibration: CalibrationProfile):
+    """Save a named calibration profile for a device ("default" applies when none is named)"""
+    try:
+        spec = calibration.dict(exclude_none=True)
+        analysis_service.resolve_calibration(overrides=spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    profiles = dict(analysis_service.device_profiles.get_section(device_id, "calibration") or {})
+    profiles[profile] = spec
+    analysis_service.device_profiles.set_section(device_id, "calibration", profiles)
+    return {"device_id": device_id, "profile": profile, "calibration": spec}
+
+@router.delete("/devices/{device_id}/calibration/{profile}")
+async def delete_device_calibration(device_id: str, profile: str):
+    """Remove a named calibration profile from a device"""
+    profiles = dict(analysis_service.device_profiles.get_section(device_id, "calibration") or {})
+    if profiles.pop(profile, None) is None:
+        raise HTTPException(status_code=404, detail="Calibration profile not found")
+    analysis_service.device_profiles.set_section(device_id, "calibration", profiles or None)
+    return {"message": "Calibration profile removed"}
+
+@router.delete("/devices/{device_id}/roi")
+async def delete_device_roi(device_id: str):
+    """Remove a device's ROI so its analyses use the full frame"""
+    analysis_service.device_profiles.set_section(device_id, "roi", None)
+    return {"message": "Device ROI removed"}
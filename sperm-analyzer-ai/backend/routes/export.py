@@ -2,64 +2,251 @@
 Export endpoints for downloading analysis results
 """
 
-from fastapi import APIRouter, HTTPException, Response
-from fastapi.responses import FileResponse
-from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Response, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
 import os
 import json
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
 
+from models.analysis_models import AnalysisStatus as StatusEnum
 from services.export_service import ExportService
+from services.chart_renderer import CHART_FORMATS
+from services.bulk_export import BulkExporter, BULK_EXPORT_FORMATS
+from routes.analysis import analysis_service
 from utils.logger import setup_logger
+from utils.http_cache import make_etag, etag_matches, not_modified, set_cache_headers, REVALIDATE_CACHE_CONTROL
 
 router = APIRouter()
 logger = setup_logger()
 
-export_service = ExportService()
+# Share the analysis router's service so exports reuse its result cache
+export_service = ExportService(analysis_service)
+
+bulk_exporter = BulkExporter(export_service)
+
+@router.on_event("shutdown")
+def stop_chart_workers():
+    export_service.shutdown()
+
+def _export_etag(analysis_id: str, *variant) -> Optional[str]:
+    """ETag for an export of the current result version (None if no results are stored)"""
+    version = analysis_service.get_result_version(analysis_id)
+    if version is None:
+        return None
+    return make_etag(analysis_id, version, *variant)
+
+class OverlayJobStatus(BaseModel):
+    job_id: str
+    analysis_id: str
+    status: str
+    progress: float
+    message: str
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
+def _overlay_job_status(job: dict) -> OverlayJobStatus:
+    download_url = f"/export/overlay/{job['job_id']}/download" if job['output_path'] else None
+    return OverlayJobStatus(
+        job_id=job['job_id'],
+        analysis_id=job['analysis_id'],
+        status=job['status'],
+        progress=job['progress'],
+        message=job['message'],
+        created_at=job['created_at'],
+        completed_at=job['completed_at'],
+        download_url=download_url
+    )
+
+class ParquetDatasetRequest(BaseModel):
+    analysis_ids: List[str]
+    table: str = "tracks"
+
+class BulkExportRequest(BaseModel):
+    # Either explicit IDs or an index query over stored analyses
+    analysis_ids: Optional[List[str]] = None
+    status: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    filename_contains: Optional[str] = None
+    formats: List[str] = ["csv", "json"]
 
 @router.get("/export/{analysis_id}/csv")
-async def export_csv(analysis_id: str):
+async def export_csv(analysis_id: str, request: Request):
     """Export analysis results as CSV"""
     try:
+        etag = _export_etag(analysis_id, "csv")
+        if etag and etag_matches(request, etag):
+            return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+        
         csv_path = export_service.export_to_csv(analysis_id)
         if not csv_path or not os.path.exists(csv_path):
             raise HTTPException(status_code=404, detail="CSV export not found")
         
-        return FileResponse(
+        response = FileResponse(
             path=csv_path,
             media_type='text/csv',
             filename=f"sperm_analysis_{analysis_id}.csv"
         )
+        if etag:
+            set_cache_headers(response, etag)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"CSV export failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/export/{analysis_id}/json")
-async def export_json(analysis_id: str):
+async def export_json(analysis_id: str, request: Request):
     """Export analysis results as JSON"""
     try:
+        etag = _export_etag(analysis_id, "json")
+        if etag and etag_matches(request, etag):
+            return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+        
         json_path = export_service.export_to_json(analysis_id)
         if not json_path or not os.path.exists(json_path):
             raise HTTPException(status_code=404, detail="JSON export not found")
         
-        return FileResponse(
+        response = FileResponse(
             path=json_path,
             media_type='application/json',
             filename=f"sperm_analysis_{analysis_id}.json"
         )
+        if etag:
+            set_cache_headers(response, etag)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"JSON export failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/export/{analysis_id}/stream/{table}")
+async def export_stream(analysis_id: str, table: str, request: Request, format: str = "csv"):
+    """Stream track or per-detection point rows as CSV or NDJSON"""
+    if table not in ["tracks", "points"]:
+        raise HTTPException(status_code=400, detail="Table must be 'tracks' or 'points'")
+    if format not in ["csv", "ndjson"]:
+        raise HTTPException(status_code=400, detail="Format must be 'csv' or 'ndjson'")
+    if not export_service.has_results(analysis_id):
+        raise HTTPException(status_code=404, detail="Analysis results not found")
+    
+    etag = _export_etag(analysis_id, "stream", table, format)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"sperm_analysis_{analysis_id}_{table}.{format}"
+    response = StreamingResponse(
+        export_service.stream_rows(analysis_id, table, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+    if etag:
+        set_cache_headers(response, etag)
+    return response
+
+@router.get("/export/{analysis_id}/parquet")
+async def export_parquet(analysis_id: str, request: Request, table: str = "tracks"):
+    """Export tracks or per-detection points as a Parquet table"""
+    try:
+        if table not in ["tracks", "points"]:
+            raise HTTPException(status_code=400, detail="Table must be 'tracks' or 'points'")
+        
+        etag = _export_etag(analysis_id, "parquet", table)
+        if etag and etag_matches(request, etag):
+            return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+        
+        parquet_path = export_service.export_to_parquet(analysis_id, table)
+        if not parquet_path or not os.path.exists(parquet_path):
+            raise HTTPException(status_code=404, detail="Parquet export not found")
+        
+        response = FileResponse(
+            path=parquet_path,
+            media_type='application/vnd.apache.parquet',
+            filename=f"sperm_analysis_{analysis_id}_{table}.parquet"
+        )
+        if etag:
+            set_cache_headers(response, etag)
+        return response
+    except HTTPException:
+        raise
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    except Exception as e:
+        logger.error(f"Parquet export failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/export/parquet")
+async def export_parquet_dataset(request: ParquetDatasetRequest):
+    """Export several analyses as a date-partitioned Parquet dataset (zip)"""
+    try:
+        if request.table not in ["tracks", "points"]:
+            raise HTTPException(status_code=400, detail="Table must be 'tracks' or 'points'")
+        if not request.analysis_ids:
+            raise HTTPException(status_code=400, detail="No analysis IDs given")
+        
+        dataset_path = await run_in_threadpool(export_service.export_parquet_dataset,
+                                               request.analysis_ids, request.table)
+        if not dataset_path or not os.path.exists(dataset_path):
+            raise HTTPException(status_code=404, detail="No analysis results found")
+        
+        return FileResponse(
+            path=dataset_path,
+            media_type='application/zip',
+            filename=f"sperm_analysis_{request.table}_dataset.zip"
+        )
+    except HTTPException:
+        raise
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    except Exception as e:
+        logger.error(f"Parquet dataset export failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/export/bulk")
+async def export_bulk(request: BulkExportRequest):
+    """Stream a ZIP archive with exports of many analyses"""
+    unknown = set(request.formats) - set(BULK_EXPORT_FORMATS)
+    if unknown or not request.formats:
+        raise HTTPException(status_code=400, detail=f"Formats must be a subset of {BULK_EXPORT_FORMATS}")
+    
+    analysis_ids = request.analysis_ids
+    if analysis_ids is None:
+        analysis_ids = bulk_exporter.select_analyses(
+            status=request.status,
+            created_after=request.created_after,
+            created_before=request.created_before,
+            filename_contains=request.filename_contains
+        )
+    if not analysis_ids:
+        raise HTTPException(status_code=404, detail="No analyses matched")
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return StreamingResponse(
+        bulk_exporter.stream_zip(list(dict.fromkeys(analysis_ids)), request.formats),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="sperm_analysis_bulk_{timestamp}.zip"'}
+    )
+
 @router.get("/export/{analysis_id}/report")
-async def export_report(analysis_id: str, format: str = "pdf"):
+async def export_report(analysis_id: str, request: Request, format: str = "pdf"):
     """Export comprehensive analysis report"""
     try:
         if format not in ["pdf", "html"]:
             raise HTTPException(status_code=400, detail="Format must be 'pdf' or 'html'")
         
+        etag = _export_etag(analysis_id, "report", format)
+        if etag and etag_matches(request, etag):
+            return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+        
         report_path = export_service.generate_report(analysis_id, format)
         if not report_path or not os.path.exists(report_path):
             raise HTTPException(status_code=404, detail="Report generation failed")
@@ -67,28 +254,97 @@ async def export_report(analysis_id: str, format: str = "pdf"):
         media_type = "application/pdf" if format == "pdf" else "text/html"
         filename = f"sperm_analysis_report_{analysis_id}.{format}"
         
-        return FileResponse(
+        response = FileResponse(
             path=report_path,
             media_type=media_type,
             filename=filename
         )
+        if etag:
+            set_cache_headers(response, etag)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Report export failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/export/{analysis_id}/charts")
-async def export_charts(analysis_id: str):
+async def export_charts(analysis_id: str, request: Request,
+                        dpi: int = Query(300, ge=72, le=600), format: str = "png"):
     """Export visualization charts as images"""
     try:
-        charts_archive = export_service.export_charts(analysis_id)
+        if format not in CHART_FORMATS:
+            raise HTTPException(status_code=400, detail="Format must be 'png' or 'svg'")
+        
+        etag = _export_etag(analysis_id, "charts", dpi, format)
+        if etag and etag_matches(request, etag):
+            return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+        
+        charts_archive = await run_in_threadpool(export_service.export_charts, analysis_id, dpi, format)
         if not charts_archive or not os.path.exists(charts_archive):
             raise HTTPException(status_code=404, detail="Charts export not found")
         
-        return FileResponse(
+        response = FileResponse(
             path=charts_archive,
             media_type='application/zip',
             filename=f"sperm_analysis_charts_{analysis_id}.zip"
         )
+        if etag:
+            set_cache_headers(response, etag)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Charts export failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/export/{analysis_id}/overlay", response_model=OverlayJobStatus)
+async def export_overlay_video(analysis_id: str, background_tasks: BackgroundTasks):
+    """Start rendering a video with tracks drawn over it, colored by motility class"""
+    try:
+        job = export_service.overlay_videos.start_job(analysis_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Analysis results not found")
+        if job['status'] == StatusEnum.PENDING:
+            job['status'] = StatusEnum.PROCESSING
+            background_tasks.add_task(export_service.overlay_videos.run_job, job['job_id'])
+        return _overlay_job_status(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Overlay export failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/export/overlay/{job_id}/status", response_model=OverlayJobStatus)
+async def get_overlay_status(job_id: str, request: Request, response: Response):
+    """Get overlay rendering status and progress"""
+    job = export_service.overlay_videos.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Overlay job not found")
+    
+    etag = make_etag(job_id, job['status'], job['progress'], job['message'], job['completed_at'])
+    if etag_matches(request, etag):
+        return not_modified(etag, "no-cache")
+    set_cache_headers(response, etag, "no-cache")
+    return _overlay_job_status(job)
+
+@router.get("/export/overlay/{job_id}/download")
+async def download_overlay_video(job_id: str, request: Request):
+    """Download a rendered overlay video"""
+    job = export_service.overlay_videos.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Overlay job not found")
+    if not job['output_path'] or not os.path.exists(job['output_path']):
+        raise HTTPException(status_code=409, detail=f"Overlay video not ready: {job['message']}")
+    
+    etag = make_etag(job['analysis_id'], job['version'], "overlay")
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+    
+    response = FileResponse(
+        path=job['output_path'],
+        media_type='video/mp4',
+        filename=f"sperm_analysis_overlay_{job['analysis_id']}.mp4"
+    )
+    set_cache_headers(response, etag)
+    return response
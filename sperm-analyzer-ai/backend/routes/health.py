@@ -2,20 +2,31 @@
 Health check endpoints
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-import psutil
-import torch
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from services.health_monitor import HealthMonitor
 
 router = APIRouter()
 
+# System stats are sampled in the background; probes only read the snapshot
+health_monitor = HealthMonitor()
+
+def watch_queue(analysis_service):
+    """Include the queue stats of the app's analysis pipeline (queue_stats/pending_work) in health samples"""
+    health_monitor.analysis_service = analysis_service
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: datetime
     version: str
     system_info: Dict[str, Any]
+    sampled_at: Optional[datetime] = None
+    model: Optional[Dict[str, Any]] = None
+    queue: Optional[Dict[str, Any]] = None
 
 class SystemInfo(BaseModel):
     cpu_percent: float
@@ -24,43 +35,47 @@ class SystemInfo(BaseModel):
     gpu_available: bool
     gpu_memory: Dict[str, Any] = None
 
+@router.on_event("startup")
+async def start_health_monitor():
+    health_monitor.start()
+
+@router.on_event("shutdown")
+async def stop_health_monitor():
+    await health_monitor.stop()
+
+def _model_state(request: Request) -> Dict[str, Any]:
+    """State of the app's detection model, published as the callable ``app.state.model_state``"""
+    model_state = getattr(request.app.state, 'model_state', None)
+    return model_state() if model_state is not None else {"initialized": False, "model_path": None}
+
 @router.get("/status", response_model=HealthResponse)
-async def health_check():
-    """Health check endpoint"""
-    
-    # System metrics
-    cpu_percent = psutil.cpu_percent(interval=1)
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
-    
-    # GPU info
-    gpu_available = torch.cuda.is_available()
-    gpu_memory = None
-    
-    if gpu_available:
-        gpu_memory = {
-            "total": torch.cuda.get_device_properties(0).total_memory,
-            "allocated": torch.cuda.memory_allocated(),
-            "cached": torch.cuda.memory_reserved()
-        }
-    
-    system_info = {
-        "cpu_percent": cpu_percent,
-        "memory_percent": memory.percent,
-        "disk_percent": disk.percent,
-        "gpu_available": gpu_available,
-        "gpu_memory": gpu_memory
-    }
-    
+async def health_check(request: Request):
+    """Health check endpoint (latest background sample, never blocks)"""
+    snapshot = health_monitor.snapshot or {}
+
     return HealthResponse(
-        status="healthy",
+        status="degraded" if health_monitor.is_stale() else "healthy",
         timestamp=datetime.now(),
         version="1.0.0",
-        system_info=system_info
+        system_info=snapshot.get("system_info", {}),
+        sampled_at=snapshot.get("sampled_at"),
+        model=_model_state(request),
+        queue=snapshot.get("queue")
     )
 
+@router.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and its event loop responds"""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness(request: Request):
+    """Readiness probe: 503 while the model is not loaded, sampling stalled or the disk is full"""
+    readiness = health_monitor.readiness(_model_state(request))
+    status_code = 200 if readiness["ready"] else 503
+    return JSONResponse(status_code=status_code, content=readiness)
+
 @router.get("/model-status")
-async def model_status():
+async def model_status(request: Request):
     """Check model loading status"""
-    # This will be implemented after model service is created
-    return {"status": "model_service_pending"}
\ No newline at end of file
+    return _model_state(request)
@@ -0,0 +1,19 @@
+"""
+Prometheus metrics endpoint
+"""
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+from utils.metrics import AnalysisServiceCollector
+
+router = APIRouter()
+
+def register_collector(analysis_service, export_service=None, body_cache_stats=None):
+    """Report the queue gauges and cache counters of the app's analysis pipeline (see AnalysisServiceCollector)"""
+    REGISTRY.register(AnalysisServiceCollector(analysis_service, export_service, body_cache_stats))
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Metrics in the Prometheus text exposition format"""
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
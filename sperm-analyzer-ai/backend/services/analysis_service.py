@@ -3,12 +3,16 @@ Analysis service for processing sperm samples and calculating CASA metrics
 """
 
 import asyncio
+import functools
 import json
 import os
+import shutil
+import threading
 import time
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 import numpy as np
 import pandas as pd
 from scipy import stats
@@ -17,10 +21,19 @@ import cv2
 from models.analysis_models import (
     AnalysisRequest, AnalysisResult, AnalysisStatus as StatusEnum,
     SpermTrack, SpermDetection, CASAMetrics, VideoAnalysisMetrics, 
-    ImageAnalysisMetrics, SpermMotilityClass
+    ImageAnalysisMetrics, SpermMotilityClass, ImageBatchEntry, BatchImageMetrics, MediaInfo,
+    PerformanceMetrics, MOTILITY_CODES
 )
-from services.casa_calculator import CASACalculator
+from services.casa_calculator import CASACalculator, WHO_REFERENCES
+from services.result_storage import ResultStorage
+from services.cohort_index import CohortIndex
+from services.device_profiles import DeviceProfileStore
+from services.detection_cache import DetectionCache
 from utils.logger import setup_logger
+from utils.stage_timer import StageTimer, PerformanceStats
+from utils.metrics import (
+    ANALYSES_STARTED, ANALYSES_COMPLETED, ANALYSES_FAILED, observe_analysis, analysis_type_label
+)
 
 logger = setup_logger()
 
@@ -30,11 +43,38 @@ class AnalysisService:
     def __init__(self):
         self.active_analyses: Dict[str, Dict] = {}
         self.results_cache: Dict[str, AnalysisResult] = {}
+        # Summary-only results (no bulk track/frame arrays) loaded from disk
+        self.summary_cache: Dict[str, AnalysisResult] = {}
+        self.result_cache_hits = 0
+        self.result_cache_misses = 0
         self.casa_calculator = CASACalculator()
         
         # Create necessary directories
         self.results_dir = Path("results")
         self.results_dir.mkdir(exist_ok=True)
+        self.storage = ResultStorage(self.results_dir)
+        # Raw per-frame detections of video analyses, for re-tracking
+        self.detection_cache = DetectionCache(self.results_dir / "detections")
+        
+        # Stage timings aggregated over all completed analyses
+        self.performance_stats = PerformanceStats()
+        
+        # Upload probe metadata and cost estimates, by analysis id
+        self.media_probes: Dict[str, Dict[str, Any]] = {}
+        
+        # Callbacks notified with the analysis id whenever stored results change
+        self.invalidation_listeners: List[Callable[[str], None]] = []
+        
+        # Per-microscope settings (e.g. chamber ROI) applied to their analyses
+        self.device_profiles = DeviceProfileStore(Path("config") / "device_profiles.json")
+        
+        # Per-analysis summary rows for cohort aggregation
+        self.cohort_index = CohortIndex(
+            self.results_dir / "cohort_index.sqlite3", self.casa_calculator.who_references
+        )
+        # An empty index is backfilled from stored results on the first cohort query
+        self._cohort_backfill_pending = self.cohort_index.count() == 0
+        self._cohort_backfill_lock = threading.Lock()
     
     async def process_analysis(self, request: AnalysisRequest, model_service):
         """Process analysis request asynchronously"""
@@ -49,44 +89,190 @@ class AnalysisService:
                 'created_at': datetime.now(),
                 'request': request
             }
+            ANALYSES_STARTED.labels(analysis_type_label(request.analysis_type)).inc()
             
             logger.info(f"Starting analysis {analysis_id}")
             start_time = time.time()
+            timer = StageTimer()
             
             # Update progress
             await self._update_analysis_progress(analysis_id, 10, "Loading file...")
             
+            roi = self._resolve_roi(request)
+            
             # Process based on type
             if request.analysis_type == "video":
-                raw_results = await model_service.process_video(request.file_path)
+                segments = int(request.parameters.get('parallel_segments') or 0)
+                target_fps = request.parameters.get('target_fps')
+                stack_fps = request.parameters.get('stack_fps')
+                if segments > 1:
+                    raw_results = await model_service.process_video_segmented(
+                        request.file_path, segments, roi, target_fps, stack_fps
+                    )
+                else:
+                    raw_results = await model_service.process_video(request.file_path, roi, target_fps, stack_fps)
+                timer.merge(raw_results.pop('timings', None))
+                self._save_detection_cache(analysis_id, raw_results)
                 await self._update_analysis_progress(analysis_id, 60, "Calculating CASA metrics...")
-                analysis_result = await self._process_video_results(request, raw_results)
+                with timer.stage('casa'):
+                    analysis_result = await self._process_video_results(request, raw_results)
+            elif request.analysis_type == "image_batch":
+                image_paths = self._batch_image_paths(request)
+                
+                def batch_progress(done: int, total: int):
+                    self.active_analyses[analysis_id].update({
+                        'progress': 10 + 50 * done / total,
+                        'message': f"Analyzed {done}/{total} images..."
+                    })
+                
+                raw_results = await model_service.process_image_batch(image_paths, roi, batch_progress)
+                timer.merge(raw_results.pop('timings', None))
+                await self._update_analysis_progress(analysis_id, 60, "Calculating metrics...")
+                with timer.stage('casa'):
+                    analysis_result = await self._process_image_batch_results(request, raw_results['images'])
             else:
-                raw_results = await model_service.process_image(request.file_path)
+                raw_results = await model_service.process_image(request.file_path, roi)
+                timer.merge(raw_results.pop('timings', None))
                 await self._update_analysis_progress(analysis_id, 60, "Calculating metrics...")
-                analysis_result = await self._process_image_results(request, raw_results)
+                with timer.stage('casa'):
+                    analysis_result = await self._process_image_results(request, raw_results)
             
-            # Calculate processing time
-            processing_time = time.time() - start_time
-            analysis_result.processing_time = processing_time
-            analysis_result.completed_at = datetime.now()
-            analysis_result.status = StatusEnum.COMPLETED
+            await self._complete_analysis(analysis_id, analysis_result, start_time, timer)
+            
+        except Exception as e:
+            logger.error(f"Analysis {analysis_id} failed: {str(e)}")
+            await self._handle_analysis_error(analysis_id, str(e))
+    
+    async def _complete_analysis(self, analysis_id: str, analysis_result: AnalysisResult, start_time: float,
+                                 timer: Optional[StageTimer] = None):
+        """Mark a processed analysis completed, save it and cache it"""
+        # Calculate processing time
+        processing_time = time.time() - start_time
+        analysis_result.processing_time = processing_time
+        analysis_result.completed_at = datetime.now()
+        analysis_result.status = StatusEnum.COMPLETED
+        
+        # Save results
+        await self._save_analysis_results(analysis_id, analysis_result, timer, start_time)
+        if analysis_result.performance is not None:
+            frames = analysis_result.performance.frames_analyzed
+            wall_seconds = analysis_result.performance.wall_time_ms / 1000
+            self.performance_stats.add(timer, frames, wall_seconds)
+            observe_analysis(timer, frames, wall_seconds, self._detections_per_frame(analysis_result))
+        ANALYSES_COMPLETED.labels(analysis_type_label(analysis_result.analysis_type)).inc()
+        
+        # Update progress
+        await self._update_analysis_progress(analysis_id, 100, "Analysis complete!")
+        if analysis_id in self.active_analyses:
+            self.active_analyses[analysis_id].update({
+                'status': StatusEnum.COMPLETED,
+                'completed_at': analysis_result.completed_at
+            })
+        self.media_probes.pop(analysis_id, None)
+
+        # Store in cache
+        self.results_cache[analysis_id] = analysis_result
+        
+        logger.info(f"Analysis {analysis_id} completed in {processing_time:.2f}s")
+    
+    def _save_detection_cache(self, analysis_id: str, raw_results: Dict):
+        """Persist raw detections; a failure here never fails the analysis"""
+        try:
+            self.detection_cache.save(analysis_id, raw_results)
+        except Exception as e:
+            logger.error(f"Failed to write detection cache for {analysis_id}: {str(e)}")
+    
+    def prepare_reanalysis(self, source_id: str, parameters: Dict[str, Any]) -> AnalysisRequest:
+        """
+        Build the request for re-tracking a stored video analysis
+
+        ``parameters`` may set ``confidence_threshold`` and ``tracker``
+        (``max_age``, ``n_init``, ``max_step`` of the motion-only tracker).
+        Raises LookupError if the analysis or its detection cache is missing,
+        ValueError if the threshold is below what was cached.
+        """
+        source = self.get_analysis_results(source_id, include_tracks=False)
+        if source is None:
+            raise LookupError(f"Analysis results not found: {source_id}")
+        # Re-analyses share the detection cache of the original analysis
+        cache_id = (source.parameters_used or {}).get('reanalysis_of', source_id)
+        cached = self.detection_cache.load(cache_id)
+        if cached is None:
+            raise LookupError(f"No cached detections for analysis {source_id}")
+        
+        threshold = parameters.get('confidence_threshold')
+        floor = cached['meta']['confidence_floor']
+        if threshold is not None and threshold < floor:
+            raise ValueError(f"Confidence threshold {threshold} is below the cached floor {floor}")
+        
+        return AnalysisRequest(
+            analysis_id=str(uuid.uuid4()),
+            file_path=self.get_source_path(cache_id) or "",
+            analysis_type="video",
+            filename=source.filename,
+            parameters={**(source.parameters_used or {}), **parameters, 'reanalysis_of': cache_id}
+        )
+    
+    async def process_reanalysis(self, request: AnalysisRequest, model_service):
+        """Re-run tracking and CASA from cached detections (no decoding or inference)"""
+        analysis_id = request.analysis_id
+        
+        try:
+            self.active_analyses[analysis_id] = {
+                'status': StatusEnum.PROCESSING,
+                'progress': 0.0,
+                'message': 'Loading cached detections...',
+                'created_at': datetime.now(),
+                'request': request
+            }
+            ANALYSES_STARTED.labels(analysis_type_label(request.analysis_type)).inc()
+            start_time = time.time()
             
-            # Save results
-            await self._save_analysis_results(analysis_id, analysis_result)
+            cache_id = request.parameters['reanalysis_of']
+            cached = self.detection_cache.load(cache_id)
+            if cached is None:
+                raise ValueError(f"No cached detections for analysis {cache_id}")
             
-            # Update progress
-            await self._update_analysis_progress(analysis_id, 100, "Analysis complete!")
+            await self._update_analysis_progress(analysis_id, 10, "Re-tracking cached detections...")
+            timer = StageTimer()
+            threshold = request.parameters.get('confidence_threshold') or model_service.confidence_threshold
+            retrack = functools.partial(
+                model_service.retrack_detections, cached, threshold, timer, **request.parameters.get('tracker', {})
+            )
+            frame_detections, tracks = await asyncio.get_running_loop().run_in_executor(None, retrack)
             
-            # Store in cache
-            self.results_cache[analysis_id] = analysis_result
+            await self._update_analysis_progress(analysis_id, 60, "Calculating CASA metrics...")
+            raw_results = {
+                'video_properties': cached['meta']['video_properties'],
+                'frame_detections': frame_detections,
+                'tracks': tracks
+            }
+            with timer.stage('casa'):
+                analysis_result = await self._process_video_results(request, raw_results)
+            source = self.get_analysis_results(cache_id, include_tracks=False)
+            if source is not None:
+                analysis_result.file_size = source.file_size
             
-            logger.info(f"Analysis {analysis_id} completed in {processing_time:.2f}s")
+            await self._complete_analysis(analysis_id, analysis_result, start_time, timer)
             
         except Exception as e:
-            logger.error(f"Analysis {analysis_id} failed: {str(e)}")
+            logger.error(f"Re-analysis {analysis_id} failed: {str(e)}")
             await self._handle_analysis_error(analysis_id, str(e))
     
+    def _resolve_roi(self, request: AnalysisRequest) -> Optional[Dict[str, Any]]:
+        """
+        ROI for an analysis: the request's own ``roi`` parameter, else the
+        ROI configured for its ``device_id``. The resolved ROI is recorded in
+        the request parameters so it ends up in ``parameters_used``.
+        """
+        parameters = request.parameters or {}
+        roi = parameters.get('roi')
+        if roi is None and parameters.get('device_id'):
+            roi = self.device_profiles.get_section(parameters['device_id'], 'roi')
+        if roi is not None:
+            request.parameters = {**parameters, 'roi': roi}
+        return roi
+    
     async def _process_video_results(self, request: AnalysisRequest, raw_results: Dict) -> AnalysisResult:
         """Process video analysis results and calculate CASA metrics"""
         
@@ -114,9 +300,9 @@ class AnalysisService:
                 )
                 detections.append(detection)
             
-            # Calculate CASA metrics for this track
+            # Calculate CASA metrics for this track at the rate it was sampled
             casa_metrics = self.casa_calculator.calculate_track_metrics(
-                detections, video_props['fps']
+                detections, video_props.get('effective_fps') or video_props['fps']
             )
             
             # Create track object
@@ -141,10 +327,11 @@ class AnalysisService:
         # Calculate overall CASA metrics
         overall_casa = self.casa_calculator.calculate_population_metrics(tracks)
         
-        # Prepare video-specific metrics
+        # Prepare video-specific metrics; densities are per analyzed (ROI) pixel area
         frame_counts = [fd['detection_count'] for fd in frame_detections]
+        analyzed_area = (video_props.get('roi') or {}).get('area') or video_props['width'] * video_props['height']
         frame_densities = [
-            count / (video_props['width'] * video_props['height']) * 1000000
+            count / analyzed_area * 1000000
             for count in frame_counts
         ]
         
@@ -157,6 +344,8 @@ class AnalysisService:
             total_frames=video_props['total_frames'],
             fps=video_props['fps'],
             duration=video_props['duration'],
+            effective_fps=video_props.get('effective_fps'),
+            frame_step=video_props.get('frame_step', 1),
             width=video_props['width'],
             height=video_props['height'],
             frame_counts=frame_counts,
@@ -164,8 +353,8 @@ class AnalysisService:
             count_over_time=count_over_time
         )
         
-        # Get file size
-        file_size = os.path.getsize(request.file_path)
+        # Get file size (re-analyses may no longer have the upload)
+        file_size = os.path.getsize(request.file_path) if os.path.exists(request.file_path) else 0
         
         # Create analysis result
         result = AnalysisResult(
@@ -199,28 +388,11 @@ class AnalysisService:
         
         # For images, we can only calculate basic metrics
         total_count = len(detections)
-        concentration = total_count / (image_props['width'] * image_props['height']) * 1000000  # per megapixel
+        analyzed_area = (image_props.get('roi') or {}).get('area') or image_props['width'] * image_props['height']
+        concentration = total_count / analyzed_area * 1000000  # per megapixel
         
         # Basic CASA metrics for image (limited without motion data)
-        casa_metrics = CASAMetrics(
-            total_count=total_count,
-            concentration=concentration,
-            progressive_motility=0.0,  # Cannot determine from static image
-            non_progressive_motility=0.0,
-            total_motility=0.0,
-            immotile=100.0,  # Assume all immotile in static image
-            vcl_mean=0.0,
-            vcl_std=0.0,
-            vsl_mean=0.0,
-            vsl_std=0.0,
-            vap_mean=0.0,
-            vap_std=0.0,
-            lin_mean=0.0,
-            str_mean=0.0,
-            wob_mean=0.0,
-            alh_mean=0.0,
-            bcf_mean=0.0
-        )
+        casa_metrics = self._static_casa_metrics(total_count, concentration)
         
         # Analyze detection regions (density clusters)
         detection_regions = self._analyze_detection_regions(
@@ -252,6 +424,88 @@ class AnalysisService:
         
         return result
     
+    def _static_casa_metrics(self, total_count: int, concentration: float) -> CASAMetrics:
+        """CASA metrics of still images: counts only, no motion data"""
+        return CASAMetrics(
+            total_count=total_count,
+            concentration=concentration,
+            progressive_motility=0.0,  # Cannot determine from static image
+            non_progressive_motility=0.0,
+            total_motility=0.0,
+            immotile=100.0,  # Assume all immotile in static image
+            vcl_mean=0.0,
+            vcl_std=0.0,
+            vsl_mean=0.0,
+            vsl_std=0.0,
+            vap_mean=0.0,
+            vap_std=0.0,
+            lin_mean=0.0,
+            str_mean=0.0,
+            wob_mean=0.0,
+            alh_mean=0.0,
+            bcf_mean=0.0
+        )
+    
+    def _batch_image_paths(self, request: AnalysisRequest) -> List[str]:
+        """Images of a batch upload directory, in upload order"""
+        return [str(path) for path in sorted(Path(request.file_path).iterdir()) if path.is_file()]
+    
+    async def _process_image_batch_results(self, request: AnalysisRequest, raw_results: List[Dict]) -> AnalysisResult:
+        """Aggregate batch image results, keeping a per-image breakdown"""
+        entries = []
+        total_count = 0
+        total_area = 0
+        for image_result in raw_results:
+            # Upload names are prefixed with their position in the batch
+            filename = Path(image_result['image_path']).name.split("_", 1)[-1]
+            if image_result.get('error'):
+                entries.append(ImageBatchEntry(filename=filename, error=image_result['error']))
+                continue
+            
+            image_props = image_result['image_properties']
+            count = image_result['summary']['total_detections']
+            total_count += count
+            total_area += (image_props.get('roi') or {}).get('area') or image_props['width'] * image_props['height']
+            entries.append(ImageBatchEntry(
+                filename=filename,
+                width=image_props['width'],
+                height=image_props['height'],
+                detection_count=count,
+                concentration=image_result['summary']['detection_density']
+            ))
+        
+        analyzed = [entry for entry in entries if entry.error is None]
+        if not analyzed:
+            raise ValueError("None of the batch images could be analyzed")
+        counts = np.array([entry.detection_count for entry in analyzed], dtype=np.float64)
+        count_mean = float(counts.mean())
+        count_std = float(counts.std())
+        
+        batch_metrics = BatchImageMetrics(
+            image_count=len(entries),
+            failed_count=len(entries) - len(analyzed),
+            count_mean=count_mean,
+            count_std=count_std,
+            count_cv=count_std / count_mean * 100 if count_mean > 0 else 0.0,
+            images=entries
+        )
+        
+        file_size = sum(os.path.getsize(result['image_path']) for result in raw_results
+                        if os.path.exists(result['image_path']))
+        
+        return AnalysisResult(
+            analysis_id=request.analysis_id,
+            status=StatusEnum.PROCESSING,  # Will be updated later
+            created_at=self.active_analyses[request.analysis_id]['created_at'],
+            filename=request.filename,
+            file_size=file_size,
+            analysis_type=request.analysis_type,
+            casa_metrics=self._static_casa_metrics(total_count, total_count / total_area * 1000000),
+            batch_metrics=batch_metrics,
+            model_version="yolov8n",
+            parameters_used=request.parameters
+        )
+    
     def _analyze_detection_regions(self, detections: List[SpermDetection], width: int, height: int) -> List[Dict]:
         """Analyze regions of high sperm density"""
         if not detections:
@@ -302,9 +556,11 @@ class AnalysisService:
                 'message': f'Analysis failed: {error_message}',
                 'error': error_message
             })
+        self.media_probes.pop(analysis_id, None)
         
         # Create error result
         request = self.active_analyses[analysis_id]['request']
+        ANALYSES_FAILED.labels(analysis_type_label(request.analysis_type)).inc()
         error_result = AnalysisResult(
             analysis_id=analysis_id,
             status=StatusEnum.FAILED,
@@ -319,16 +575,215 @@ class AnalysisService:
         self.results_cache[analysis_id] = error_result
         await self._save_analysis_results(analysis_id, error_result)
     
-    async def _save_analysis_results(self, analysis_id: str, result: AnalysisResult):
-        """Save analysis results to file"""
+    async def _save_analysis_results(self, analysis_id: str, result: AnalysisResult,
+                                     timer: Optional[StageTimer] = None, start_time: Optional[float] = None):
+        """
+        Save analysis results as summary JSON plus columnar track arrays
+
+        With a ``timer``, serialization and array writes are timed and the
+        stage timings are stored in ``result.performance`` with the summary.
+        """
         try:
-            result_file = self.results_dir / f"{analysis_id}.json"
-            with open(result_file, 'w') as f:
-                json.dump(result.dict(), f, indent=2, default=str)
-            logger.info(f"Results saved to {result_file}")
+            if timer is None:
+                self.storage.save(result)
+            else:
+                with timer.stage('serialization'):
+                    columns = self.storage.result_to_columns(result)
+                with timer.stage('save'):
+                    arrays = self.storage.write_columns(analysis_id, columns)
+                result.performance = self._performance_metrics(timer, start_time)
+                self.storage.write_summary(result, columns, arrays)
+            self.cohort_index.upsert(result)
+            self.summary_cache.pop(analysis_id, None)
+            self._notify_invalidation(analysis_id)
+            logger.info(f"Results saved to {self.storage.summary_path(analysis_id)}")
         except Exception as e:
             logger.error(f"Failed to save results: {str(e)}")
     
+    def _performance_metrics(self, timer: StageTimer, start_time: Optional[float]) -> PerformanceMetrics:
+        """Per-stage summary of a run; frames are counted by the per-frame stage that ran"""
+        wall_time = time.time() - start_time if start_time is not None else 0.0
+        frames = len(timer.samples.get('inference') or timer.samples.get('tracking') or [])
+        return PerformanceMetrics(
+            wall_time_ms=wall_time * 1000,
+            frames_analyzed=frames,
+            frames_per_second=frames / wall_time if wall_time > 0 else 0.0,
+            stages=timer.summary()
+        )
+    
+    @staticmethod
+    def _detections_per_frame(result: AnalysisResult) -> List[int]:
+        """Detection count of every analyzed frame (or image) of a result"""
+        if result.video_metrics is not None:
+            return result.video_metrics.frame_counts
+        if result.batch_metrics is not None:
+            return [entry.detection_count for entry in result.batch_metrics.images if entry.error is None]
+        if result.casa_metrics is not None:
+            return [result.casa_metrics.total_count]
+        return []
+    
+    def get_performance_summary(self) -> Dict[str, Any]:
+        """Service-wide stage timings over completed analyses"""
+        return self.performance_stats.summary()
+    
+    def _backfill_cohort_index(self):
+        """Index results that were stored before the cohort index existed (once, on first use)"""
+        # Concurrent first queries wait here rather than read a half-filled index
+        with self._cohort_backfill_lock:
+            if not self._cohort_backfill_pending:
+                return
+            indexed = 0
+            for result_file in self.results_dir.glob("*.json"):
+                try:
+                    result = self.storage.load_result(result_file.stem, include_tracks=False)
+                    if result:
+                        self.cohort_index.upsert(result)
+                        indexed += 1
+                except Exception as e:
+                    logger.error(f"Failed to index result file {result_file}: {str(e)}")
+            self._cohort_backfill_pending = False
+            if indexed:
+                logger.info(f"Cohort index backfilled with {indexed} analyses")
+    
+    def aggregate_cohort(self, metrics: List[str], **filters) -> Dict[str, Any]:
+        """Aggregate CASA metrics across stored analyses (see CohortIndex.aggregate)"""
+        self._backfill_cohort_index()
+        return self.cohort_index.aggregate(metrics, **filters)
+    
+    def add_invalidation_listener(self, listener: Callable[[str], None]):
+        """Register a callback invoked when an analysis' results change or are deleted"""
+        self.invalidation_listeners.append(listener)
+    
+    def _notify_invalidation(self, analysis_id: str):
+        for listener in self.invalidation_listeners:
+            try:
+                listener(analysis_id)
+            except Exception as e:
+                logger.error(f"Invalidation listener failed for {analysis_id}: {str(e)}")
+    
+    def get_result_version(self, analysis_id: str) -> Optional[str]:
+        """Get the version of the stored results (None if nothing is stored)"""
+        return self.storage.version(analysis_id)
+    
+    def resolve_calibration(self, device_id: Optional[str] = None, profile: Optional[str] = None,
+                            overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Merge the default calibration, a device's named calibration profile
+        and explicit overrides (later wins)
+
+        Without ``profile`` a device's ``default`` profile applies if it has one.
+        Raises LookupError for an unknown profile and ValueError for unknown
+        WHO reference keys.
+        """
+        calibration = {
+            'pixel_to_micron': self.casa_calculator.pixel_to_micron,
+            'fps': None,
+            'who_references': dict(self.casa_calculator.who_references)
+        }
+        layers = []
+        if device_id:
+            profiles = self.device_profiles.get_section(device_id, "calibration") or {}
+            if profile is not None and profile not in profiles:
+                raise LookupError(f"Calibration profile '{profile}' not found for device {device_id}")
+            if (profile or "default") in profiles:
+                layers.append(profiles[profile or "default"])
+        elif profile is not None:
+            raise LookupError("A calibration profile needs a device_id")
+        if overrides:
+            layers.append(overrides)
+        
+        for layer in layers:
+            for key in ('pixel_to_micron', 'fps'):
+                if layer.get(key) is not None:
+                    calibration[key] = layer[key]
+            unknown = set(layer.get('who_references') or {}) - set(WHO_REFERENCES)
+            if unknown:
+                raise ValueError(f"Unknown WHO reference values: {', '.join(sorted(unknown))}")
+            calibration['who_references'].update(layer.get('who_references') or {})
+        
+        if calibration['pixel_to_micron'] <= 0 or (calibration['fps'] is not None and calibration['fps'] <= 0):
+            raise ValueError("pixel_to_micron and fps must be positive")
+        return calibration
+    
+    def recompute_casa(self, analysis_id: str, calibration: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Recompute track kinematics, motility classes, population metrics and
+        the WHO assessment of a stored video analysis under another calibration
+
+        Works on the memory-mapped track columns; nothing is saved. Returns
+        None if the analysis does not exist.
+        """
+        summary = self.storage.load_summary(analysis_id)
+        if summary is None:
+            return None
+        if summary.get('analysis_type') != 'video':
+            raise ValueError("Only video analyses have tracks to recompute")
+        
+        names = ['track_id', 'point_offsets', 'point_x', 'point_y', 'point_frame', 'point_timestamp']
+        if self.storage.is_columnar(summary):
+            columns = self.storage.load_columns(analysis_id, names)
+        else:
+            columns = self.storage.result_to_columns(AnalysisResult(**summary))
+        
+        # A corrected frame rate re-times every point from its frame number
+        fps = calibration.get('fps')
+        timestamps = columns['point_frame'] / fps if fps else columns['point_timestamp']
+        
+        calculator = CASACalculator(calibration['pixel_to_micron'], calibration['who_references'])
+        track_metrics = calculator.calculate_track_metrics_vectorized(
+            columns['point_x'], columns['point_y'], timestamps, columns['point_offsets']
+        )
+        casa_metrics = calculator.calculate_population_metrics_vectorized(track_metrics)
+        
+        return {
+            'analysis_id': analysis_id,
+            'calibration': calibration,
+            'casa_metrics': casa_metrics,
+            'who_assessment': calculator.generate_who_assessment(casa_metrics),
+            'track_ids': columns['track_id'],
+            'track_metrics': track_metrics
+        }
+    
+    def get_source_path(self, analysis_id: str) -> Optional[str]:
+        """Get the path of the uploaded file an analysis was run on"""
+        if analysis_id in self.active_analyses:
+            file_path = self.active_analyses[analysis_id]['request'].file_path
+            if os.path.exists(file_path):
+                return file_path
+        upload_files = sorted(Path("uploads").glob(f"{analysis_id}.*"))
+        if upload_files:
+            return str(upload_files[0])
+        # Re-analyses were run on the upload of their original analysis
+        summary = self.storage.load_summary(analysis_id) or {}
+        source_id = (summary.get('parameters_used') or {}).get('reanalysis_of')
+        return self.get_source_path(source_id) if source_id and source_id != analysis_id else None
+    
+    def record_media_probe(self, analysis_id: str, media: MediaInfo, cost: Dict[str, Any]):
+        """Keep an upload's probe result until its analysis completes or fails"""
+        self.media_probes[analysis_id] = {'media': media, 'cost': cost}
+    
+    def get_media_probe(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        return self.media_probes.get(analysis_id)
+    
+    def queue_stats(self) -> Dict[str, int]:
+        """Analyses processing now, and accepted uploads whose analysis has not started"""
+        # Copies, so this is safe to call from a sampling thread
+        active = sum(
+            1 for analysis in list(self.active_analyses.values())
+            if analysis['status'] == StatusEnum.PROCESSING
+        )
+        queued = sum(1 for analysis_id in list(self.media_probes) if analysis_id not in self.active_analyses)
+        return {'active': active, 'queued': queued}
+    
+    def result_cache_stats(self) -> Dict[str, int]:
+        """Hit/miss counts of the in-memory result caches"""
+        return {'hits': self.result_cache_hits, 'misses': self.result_cache_misses}
+    
+    def pending_work(self) -> float:
+        """Estimated megapixel-frames of analyses that have not finished yet"""
+        # Probes are dropped when their analysis completes or fails
+        return sum(probe['cost']['megapixel_frames'] for probe in list(self.media_probes.values()))
+    
     def get_analysis_status(self, analysis_id: str) -> Optional[Dict]:
         """Get analysis status"""
         if analysis_id in self.active_analyses:
@@ -343,26 +798,86 @@ class AnalysisService:
             }
         return None
     
-    def get_analysis_results(self, analysis_id: str) -> Optional[AnalysisResult]:
-        """Get analysis results"""
+    def get_analysis_results(self, analysis_id: str, include_tracks: bool = True,
+                             cache: bool = True) -> Optional[AnalysisResult]:
+        """
+        Get analysis results
+
+        With ``include_tracks=False`` only the summary is loaded and ``tracks``
+        is empty. With ``cache=False`` a result loaded from disk is not kept
+        in memory (for one-off readers such as exports).
+        """
         # Check cache first
         if analysis_id in self.results_cache:
+            self.result_cache_hits += 1
             return self.results_cache[analysis_id]
+        if not include_tracks and analysis_id in self.summary_cache:
+            self.result_cache_hits += 1
+            return self.summary_cache[analysis_id]
+        self.result_cache_misses += 1
         
         # Try loading from file
         try:
-            result_file = self.results_dir / f"{analysis_id}.json"
-            if result_file.exists():
-                with open(result_file, 'r') as f:
-                    data = json.load(f)
-                result = AnalysisResult(**data)
-                self.results_cache[analysis_id] = result
+            result = self.storage.load_result(analysis_id, include_tracks=include_tracks)
+            if result is not None:
+                if not cache:
+                    return result
+                if include_tracks:
+                    self.results_cache[analysis_id] = result
+                    self.summary_cache.pop(analysis_id, None)
+                else:
+                    self.summary_cache[analysis_id] = result
                 return result
         except Exception as e:
             logger.error(f"Failed to load results: {str(e)}")
         
         return None
     
+    def get_tracks(self, analysis_id: str, offset: int = 0, limit: int = 50,
+                   motility_class: Optional[SpermMotilityClass] = None,
+                   min_vcl: Optional[float] = None, max_vcl: Optional[float] = None,
+                   include_detections: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Get a filtered page of tracks
+
+        Filtering runs on the memory-mapped track columns, so only the tracks
+        on the requested page are materialised.
+        """
+        summary = self.get_analysis_results(analysis_id, include_tracks=False)
+        if summary is None:
+            return None
+
+        if analysis_id in self.results_cache or not self.storage.has_columns(analysis_id):
+            tracks = self.get_analysis_results(analysis_id).tracks
+            selected = [
+                t for t in tracks
+                if (motility_class is None or t.motility_class == motility_class)
+                and (min_vcl is None or (t.vcl is not None and t.vcl >= min_vcl))
+                and (max_vcl is None or (t.vcl is not None and t.vcl <= max_vcl))
+            ]
+            page = selected[offset:offset + limit]
+            total = len(selected)
+        else:
+            columns = self.storage.load_columns(analysis_id)
+            if 'track_id' not in columns:
+                return {'total': 0, 'tracks': []}
+            mask = np.ones(len(columns['track_id']), dtype=bool)
+            if motility_class is not None:
+                mask &= columns['motility_class'] == MOTILITY_CODES[motility_class]
+            vcl = np.asarray(columns['vcl'])
+            if min_vcl is not None:
+                mask &= vcl >= min_vcl
+            if max_vcl is not None:
+                mask &= vcl <= max_vcl
+            indices = np.flatnonzero(mask)
+            page = self.storage.tracks_from_columns(columns, indices[offset:offset + limit])
+            total = int(len(indices))
+
+        if not include_detections:
+            page = [t.copy(update={'detections': []}) for t in page]
+
+        return {'total': total, 'tracks': page}
+    
     def delete_analysis(self, analysis_id: str) -> bool:
         """Delete analysis and associated files"""
         try:
@@ -373,16 +888,21 @@ class AnalysisService:
             # Remove from cache
             if analysis_id in self.results_cache:
                 del self.results_cache[analysis_id]
+            self.summary_cache.pop(analysis_id, None)
+            self.media_probes.pop(analysis_id, None)
             
-            # Delete result file
-            result_file = self.results_dir / f"{analysis_id}.json"
-            if result_file.exists():
-                result_file.unlink()
+            # Delete result files
+            self.storage.delete(analysis_id)
+            self.detection_cache.delete(analysis_id)
+            self.cohort_index.remove(analysis_id)
+            self._notify_invalidation(analysis_id)
             
             # Delete uploaded file
             upload_files = Path("uploads").glob(f"{analysis_id}.*")
             for file in upload_files:
                 file.unlink()
+            # Batch image uploads are a directory
+            shutil.rmtree(Path("uploads") / analysis_id, ignore_errors=True)
             
             return True
             
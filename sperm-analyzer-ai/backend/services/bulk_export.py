@@ -0,0 +1,177 @@
+"""
+Bulk export of many analyses as a ZIP archive streamed on the fly
+"""
+
+import io
+import json
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from services.export_service import ExportService
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+BULK_EXPORT_FORMATS = ["csv", "json", "parquet"]
+
+# Bytes copied from an artifact into the archive per read
+COPY_CHUNK_SIZE = 256 * 1024
+
+
+class _StreamBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable sink for ``zipfile``
+
+    ``zipfile`` falls back to data descriptors when the output cannot seek,
+    so the archive can be emitted front to back while it is being built.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _local_naive(value: datetime) -> datetime:
+    """Stored ``created_at`` values are naive local times; bring aware bounds onto that clock"""
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+class BulkExporter:
+    """Builds multi-analysis ZIP archives from cached export artifacts"""
+
+    def __init__(self, export_service: ExportService, max_workers: int = 4):
+        self.export_service = export_service
+        self.analysis_service = export_service.analysis_service
+        self.max_workers = max_workers
+
+    def select_analyses(self, status: Optional[str] = None,
+                        created_after: Optional[datetime] = None,
+                        created_before: Optional[datetime] = None,
+                        filename_contains: Optional[str] = None) -> List[str]:
+        """Resolve an index query to a list of analysis IDs"""
+        created_after = _local_naive(created_after) if created_after else None
+        created_before = _local_naive(created_before) if created_before else None
+        selected = []
+        for analysis in self.analysis_service.list_analyses():
+            if status and str(getattr(analysis['status'], 'value', analysis['status'])) != status:
+                continue
+            if created_after or created_before:
+                created_at = analysis.get('created_at')
+                if not created_at:
+                    continue
+                if not isinstance(created_at, datetime):
+                    created_at = datetime.fromisoformat(str(created_at))
+                created_at = _local_naive(created_at)
+                if created_after and created_at < created_after:
+                    continue
+                if created_before and created_at > created_before:
+                    continue
+            if filename_contains and filename_contains.lower() not in str(analysis.get('filename', '')).lower():
+                continue
+            selected.append(analysis['analysis_id'])
+        return selected
+
+    def stream_zip(self, analysis_ids: List[str], formats: List[str]) -> Iterator[bytes]:
+        """
+        Yield a ZIP archive containing ``{analysis_id}/{artifact}`` entries
+
+        Artifacts are produced (or fetched from the export cache) by a worker
+        pool, at most ``max_workers`` analyses ahead of the one being written.
+        Each artifact is copied into the archive in chunks, so neither the
+        archive nor a whole artifact is ever held in memory or staged on disk.
+        """
+        sink = _StreamBuffer()
+        manifest = {'generated_at': datetime.now().isoformat(), 'formats': formats,
+                    'exported': [], 'skipped': []}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool, \
+                zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
+            pending = deque()
+            ids = iter(analysis_ids)
+
+            def submit_next():
+                analysis_id = next(ids, None)
+                if analysis_id is not None:
+                    pending.append((analysis_id, pool.submit(self._build_artifacts, analysis_id, formats)))
+
+            for _ in range(self.max_workers):
+                submit_next()
+
+            while pending:
+                analysis_id, future = pending.popleft()
+                submit_next()
+                try:
+                    artifacts = future.result()
+                except Exception as e:
+                    logger.error(f"Bulk export of {analysis_id} failed: {str(e)}")
+                    artifacts = {}
+
+                if not artifacts:
+                    manifest['skipped'].append(analysis_id)
+                    continue
+
+                for arcname, path in artifacts.items():
+                    # Parquet is already compressed
+                    compress = zipfile.ZIP_STORED if arcname.endswith('.parquet') else zipfile.ZIP_DEFLATED
+                    info = zipfile.ZipInfo(f"{analysis_id}/{arcname}", date_time=datetime.now().timetuple()[:6])
+                    info.compress_type = compress
+                    # The sink cannot seek back to patch sizes, so large artifacts need ZIP64 up front
+                    with open(path, 'rb') as src, zipf.open(info, 'w', force_zip64=True) as dst:
+                        while True:
+                            chunk = src.read(COPY_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            dst.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+                    yield sink.drain()
+                manifest['exported'].append(analysis_id)
+
+            zipf.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+        yield sink.drain()
+        logger.info(f"Bulk export streamed: {len(manifest['exported'])} analyses, "
+                    f"{len(manifest['skipped'])} skipped")
+
+    def _build_artifacts(self, analysis_id: str, formats: List[str]) -> Dict[str, str]:
+        """Produce (or reuse cached) export files for one analysis"""
+        artifacts = {}
+        if "csv" in formats:
+            results_csv = self.export_service.export_to_csv(analysis_id)
+            if results_csv:
+                artifacts['results.csv'] = results_csv
+                tracks_csv = os.path.join(os.path.dirname(results_csv), "tracks.csv")
+                if os.path.exists(tracks_csv):
+                    artifacts['tracks.csv'] = tracks_csv
+        if "json" in formats:
+            results_json = self.export_service.export_to_json(analysis_id)
+            if results_json:
+                artifacts['results.json'] = results_json
+        if "parquet" in formats:
+            tracks_parquet = self.export_service.export_to_parquet(analysis_id, "tracks")
+            if tracks_parquet:
+                artifacts['tracks.parquet'] = tracks_parquet
+        return artifacts
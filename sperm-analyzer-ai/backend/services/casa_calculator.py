@@ -9,30 +9,40 @@ from scipy import stats
 from typing import List, Dict, Optional, Any
 import math
 
-from models.analysis_models import SpermDetection, SpermTrack, CASAMetrics, SpermMotilityClass
+from models.analysis_models import (
+    SpermDetection, SpermTrack, CASAMetrics, SpermMotilityClass, MOTILITY_CODES, TRACK_METRIC_COLUMNS
+)
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# WHO reference values (5th edition)
+WHO_REFERENCES = {
+    'concentration_lower_limit': 15,  # million/ml
+    'progressive_motility_lower_limit': 32,  # %
+    'total_motility_lower_limit': 40,  # %
+    'vcl_threshold_progressive': 25,  # μm/s
+    'vsl_threshold_progressive': 5,   # μm/s
+    'linearity_threshold_progressive': 0.45,  # %
+    'vcl_threshold_motile': 5,  # μm/s, below this a track counts as immotile
+}
+
+# Pixel to micrometer conversion (depends on microscope settings)
+# Override per microscope with a calibration profile
+DEFAULT_PIXEL_TO_MICRON = 0.2  # 0.2 μm per pixel (example)
+
 class CASACalculator:
     """
     Calculator for CASA metrics following WHO Laboratory Manual standards
     """
     
-    def __init__(self):
-        # WHO reference values (5th edition)
-        self.who_references = {
-            'concentration_lower_limit': 15,  # million/ml
-            'progressive_motility_lower_limit': 32,  # %
-            'total_motility_lower_limit': 40,  # %
-            'vcl_threshold_progressive': 25,  # μm/s
-            'vsl_threshold_progressive': 5,   # μm/s
-            'linearity_threshold_progressive': 0.45,  # %
-        }
+    def __init__(self, pixel_to_micron: float = DEFAULT_PIXEL_TO_MICRON,
+                 who_references: Optional[Dict[str, float]] = None):
+        self.who_references = dict(WHO_REFERENCES)
+        if who_references:
+            self.who_references.update(who_references)
         
-        # Pixel to micrometer conversion (depends on microscope settings)
-        # This would need calibration in real implementation
-        self.pixel_to_micron = 0.2  # 0.2 μm per pixel (example)
+        self.pixel_to_micron = pixel_to_micron
         
     def calculate_track_metrics(self, detections: List[SpermDetection], fps: float) -> Dict[str, Any]:
         """Calculate CASA metrics for a single sperm track"""
@@ -163,6 +173,8 @@ class CASACalculator:
             # Project points onto perpendicular axis
             perpendicular = np.array([-overall_direction[1], overall_direction[0]])
             lateral_positions = np.dot(path_points - path_points[0], perpendicular)
+            # The end point is on the axis by construction; rounding must not add a crossing
+            lateral_positions[-1] = 0.0
             
             # Count zero crossings of the lateral displacement
             zero_crossings = 0
@@ -193,13 +205,162 @@ class CASACalculator:
             return SpermMotilityClass.PROGRESSIVE
         
         # Non-progressive motility (moving but not progressive)
-        elif vcl > 5:  # Some movement threshold
+        elif vcl > self.who_references['vcl_threshold_motile']:
             return SpermMotilityClass.NON_PROGRESSIVE
         
         # Immotile
         else:
             return SpermMotilityClass.IMMOTILE
     
+    def calculate_track_metrics_vectorized(self, x: np.ndarray, y: np.ndarray, timestamps: np.ndarray,
+                                           offsets: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        ``calculate_track_metrics`` for many tracks at once
+
+        Points of track i are rows ``[offsets[i], offsets[i + 1])`` of the
+        pixel coordinates and timestamps (the columnar result layout). Returns
+        one float64 array per TRACK_METRIC_COLUMNS name, NaN where the scalar
+        version returns no metrics, and ``motility_class`` as MOTILITY_CODES
+        (-1 when unclassified).
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        n_tracks = len(offsets) - 1
+        n_points = int(offsets[-1]) if n_tracks > 0 else 0
+        metrics = {name: np.full(n_tracks, np.nan) for name in TRACK_METRIC_COLUMNS}
+        metrics['motility_class'] = np.full(n_tracks, -1, dtype=np.int8)
+        if n_points == 0:
+            return metrics
+        
+        lengths = np.diff(offsets)
+        px = np.asarray(x[:n_points], dtype=np.float64) * self.pixel_to_micron
+        py = np.asarray(y[:n_points], dtype=np.float64) * self.pixel_to_micron
+        t = np.asarray(timestamps[:n_points], dtype=np.float64)
+        
+        # Track index of every point, and which consecutive point pairs are steps within a track
+        owner = np.repeat(np.arange(n_tracks), lengths)
+        same = owner[1:] == owner[:-1]
+        step_owner = owner[:-1][same]
+        
+        def per_track(weights: np.ndarray, index: np.ndarray = step_owner) -> np.ndarray:
+            return np.bincount(index, weights=weights, minlength=n_tracks)
+        
+        step_dt = np.diff(t)[same]
+        valid = (lengths >= 3) & (per_track((step_dt <= 0).astype(np.float64)) == 0)
+        if not valid.any():
+            return metrics
+        
+        first = np.minimum(offsets[:-1], n_points - 1)
+        last = np.maximum(offsets[1:] - 1, 0)
+        total_time = np.where(valid, t[last] - t[first], 1.0)
+        
+        # VCL / VSL
+        step_distance = np.hypot(np.diff(px), np.diff(py))[same]
+        vcl = per_track(step_distance) / total_time
+        vsl = np.hypot(px[last] - px[first], py[last] - py[first]) / total_time
+        
+        # VAP over the 3-point moving average, truncated at track ends
+        neighbours = np.ones(n_points)
+        sx, sy = px.copy(), py.copy()
+        sx[1:] += np.where(same, px[:-1], 0.0)
+        sy[1:] += np.where(same, py[:-1], 0.0)
+        neighbours[1:] += same
+        sx[:-1] += np.where(same, px[1:], 0.0)
+        sy[:-1] += np.where(same, py[1:], 0.0)
+        neighbours[:-1] += same
+        sx /= neighbours
+        sy /= neighbours
+        smoothed_distance = np.hypot(np.diff(sx), np.diff(sy))[same]
+        vap = np.where(lengths >= 5, per_track(smoothed_distance) / total_time, vsl)
+        
+        def percent(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+            return np.divide(numerator * 100, denominator, out=np.zeros(n_tracks), where=denominator > 0)
+        
+        # ALH: mean distance from the least-squares line y = slope * x + intercept
+        counts = np.maximum(lengths, 1)
+        mean_x = per_track(px, owner) / counts
+        mean_y = per_track(py, owner) / counts
+        dx = px - mean_x[owner]
+        dy = py - mean_y[owner]
+        sxx = per_track(dx * dx, owner)
+        has_slope = sxx > 0
+        slope = np.divide(per_track(dx * dy, owner), sxx, out=np.zeros(n_tracks), where=has_slope)
+        intercept = mean_y - slope * mean_x
+        line_distance = np.abs(slope[owner] * px - py + intercept[owner]) / np.sqrt(slope ** 2 + 1)[owner]
+        alh = np.where(has_slope, per_track(line_distance, owner) / counts, 0.0)
+        
+        # BCF: crossings of the start-to-end axis, half per second
+        direction_x = px[last] - px[first]
+        direction_y = py[last] - py[first]
+        norm = np.sqrt(direction_x ** 2 + direction_y ** 2)
+        safe_norm = np.where(norm > 0, norm, 1.0)
+        lateral = ((px - px[first][owner]) * -(direction_y / safe_norm)[owner] +
+                   (py - py[first][owner]) * (direction_x / safe_norm)[owner])
+        lateral[last] = 0.0
+        crossings = per_track(((lateral[:-1] * lateral[1:]) < 0)[same].astype(np.float64))
+        bcf = np.where((lengths >= 5) & (norm > 0), crossings / 2 / total_time, 0.0)
+        
+        computed = {
+            'vcl': vcl, 'vsl': vsl, 'vap': vap,
+            'lin': percent(vsl, vcl), 'str_metric': percent(vsl, vap), 'wob': percent(vap, vcl),
+            'alh': alh, 'bcf': bcf
+        }
+        for name, values in computed.items():
+            metrics[name] = np.where(valid, values, np.nan)
+        
+        # Motility classes, same criteria as _classify_motility
+        progressive = ((vcl >= self.who_references['vcl_threshold_progressive']) &
+                       (vsl >= self.who_references['vsl_threshold_progressive']))
+        motile = vcl > self.who_references['vcl_threshold_motile']
+        codes = np.select(
+            [progressive, motile],
+            [MOTILITY_CODES[SpermMotilityClass.PROGRESSIVE], MOTILITY_CODES[SpermMotilityClass.NON_PROGRESSIVE]],
+            MOTILITY_CODES[SpermMotilityClass.IMMOTILE]
+        )
+        metrics['motility_class'] = np.where(valid, codes, -1).astype(np.int8)
+        return metrics
+    
+    def calculate_population_metrics_vectorized(self, metrics: Dict[str, np.ndarray]) -> CASAMetrics:
+        """``calculate_population_metrics`` from ``calculate_track_metrics_vectorized`` output"""
+        codes = metrics['motility_class']
+        total_count = len(codes)
+        if total_count == 0:
+            return self.calculate_population_metrics([])
+        
+        def pct(motility: SpermMotilityClass) -> float:
+            return float(np.count_nonzero(codes == MOTILITY_CODES[motility]) / total_count * 100)
+        
+        def safe_mean_std(name):
+            values = metrics[name][~np.isnan(metrics[name])]
+            if len(values):
+                return float(np.mean(values)), float(np.std(values))
+            return 0.0, 0.0
+        
+        progressive_pct = pct(SpermMotilityClass.PROGRESSIVE)
+        non_progressive_pct = pct(SpermMotilityClass.NON_PROGRESSIVE)
+        vcl_mean, vcl_std = safe_mean_std('vcl')
+        vsl_mean, vsl_std = safe_mean_std('vsl')
+        vap_mean, vap_std = safe_mean_std('vap')
+        
+        return CASAMetrics(
+            total_count=total_count,
+            concentration=total_count * 1000000,  # Same placeholder conversion as calculate_population_metrics
+            progressive_motility=progressive_pct,
+            non_progressive_motility=non_progressive_pct,
+            total_motility=progressive_pct + non_progressive_pct,
+            immotile=pct(SpermMotilityClass.IMMOTILE),
+            vcl_mean=vcl_mean,
+            vcl_std=vcl_std,
+            vsl_mean=vsl_mean,
+            vsl_std=vsl_std,
+            vap_mean=vap_mean,
+            vap_std=vap_std,
+            lin_mean=safe_mean_std('lin')[0],
+            str_mean=safe_mean_std('str_metric')[0],
+            wob_mean=safe_mean_std('wob')[0],
+            alh_mean=safe_mean_std('alh')[0],
+            bcf_mean=safe_mean_std('bcf')[0]
+        )
+    
     def calculate_population_metrics(self, tracks: List[SpermTrack]) -> CASAMetrics:
         """Calculate population-level CASA metrics"""
         
@@ -0,0 +1,143 @@
+"""
+Chart rendering for analysis exports
+Figures are drawn with the Agg backend in a pool of worker processes
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Any
+
+import matplotlib
+from matplotlib.figure import Figure
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+CHART_FORMATS = ["png", "svg"]
+
+
+def _init_worker():
+    """Force the non-interactive backend in worker processes"""
+    matplotlib.use("Agg")
+
+
+def _motility_pie_chart(data: Dict[str, Any]) -> Figure:
+    """Create motility distribution pie chart"""
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+
+    labels = ['Progressive', 'Non-Progressive', 'Immotile']
+    sizes = [data['progressive'], data['non_progressive'], data['immotile']]
+    colors = ['#2ecc71', '#f39c12', '#e74c3c']
+
+    ax.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
+    ax.set_title('Sperm Motility Distribution', fontsize=14, fontweight='bold')
+    return fig
+
+
+def _velocity_histogram(data: Dict[str, Any]) -> Figure:
+    """Create velocity distribution histogram"""
+    fig = Figure(figsize=(12, 5))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # VCL distribution
+    if data['vcl']:
+        ax1.hist(data['vcl'], bins=20, alpha=0.7, color='#3498db', edgecolor='black')
+        ax1.set_xlabel('VCL (μm/s)')
+        ax1.set_ylabel('Frequency')
+        ax1.set_title('Curvilinear Velocity Distribution')
+
+    # VSL distribution
+    if data['vsl']:
+        ax2.hist(data['vsl'], bins=20, alpha=0.7, color='#e74c3c', edgecolor='black')
+        ax2.set_xlabel('VSL (μm/s)')
+        ax2.set_ylabel('Frequency')
+        ax2.set_title('Straight Line Velocity Distribution')
+
+    fig.tight_layout()
+    return fig
+
+
+def _count_over_time_chart(data: Dict[str, Any]) -> Figure:
+    """Create sperm count over time chart"""
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+
+    ax.plot(data['times'], data['counts'], linewidth=2, color='#2c3e50')
+    ax.fill_between(data['times'], data['counts'], alpha=0.3, color='#3498db')
+    ax.set_xlabel('Time (seconds)')
+    ax.set_ylabel('Sperm Count')
+    ax.set_title('Sperm Count Over Time')
+    ax.grid(True, alpha=0.3)
+    return fig
+
+
+CHART_BUILDERS = {
+    'motility_distribution': _motility_pie_chart,
+    'velocity_distribution': _velocity_histogram,
+    'count_over_time': _count_over_time_chart,
+}
+
+
+def render_chart(chart: str, data: Dict[str, Any], output_path: str, dpi: int, format: str) -> str:
+    """
+    Render one chart to ``output_path``
+
+    Runs in a worker process. Figures are created through ``Figure`` rather
+    than ``pyplot`` so nothing is registered globally, and are cleared after
+    saving.
+    """
+    fig = CHART_BUILDERS[chart](data)
+    try:
+        fig.savefig(output_path, dpi=dpi, format=format, bbox_inches='tight')
+    finally:
+        fig.clear()
+    return output_path
+
+
+class ChartRenderer:
+    """Renders export charts in parallel worker processes"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # render() runs on several threads at once; only one may create the pool
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the server's threads or locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def render(self, chart: str, data: Dict[str, Any], output_path: str,
+               dpi: int = 300, format: str = "png") -> str:
+        """Render a single chart in a worker process and wait for it"""
+        executor = self.executor
+        try:
+            return executor.submit(render_chart, chart, data, output_path, dpi, format).result()
+        except BrokenProcessPool:
+            # A crashed worker poisons the whole pool; start a fresh one next time
+            logger.error("Chart worker pool crashed, restarting on next render")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+    def shutdown(self):
+        """Stop the worker processes (the pool is recreated if rendering resumes)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,286 @@
+"""
+Cohort index over stored analyses
+Keeps one summary row per analysis plus incrementally maintained daily aggregates
+"""
+
+import sqlite3
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+import numpy as np
+
+from models.analysis_models import AnalysisResult, AnalysisStatus, AnalysisType
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# CASAMetrics fields indexed per analysis
+COHORT_METRICS = [
+    'total_count', 'concentration', 'progressive_motility', 'non_progressive_motility',
+    'total_motility', 'immotile', 'vcl_mean', 'vsl_mean', 'vap_mean',
+    'lin_mean', 'str_mean', 'wob_mean', 'alh_mean', 'bcf_mean'
+]
+
+# Metrics that need motion; image analyses report placeholders for them (0% progressive,
+# VCL 0), so they are indexed for video analyses only
+MOTION_METRICS = set(COHORT_METRICS) - {'total_count', 'concentration'}
+MOTION_ANALYSIS_TYPES = {AnalysisType.VIDEO.value}
+
+# Metrics with a WHO lower reference limit, keyed to CASACalculator.who_references
+WHO_REFERENCE_KEYS = {
+    'concentration': 'concentration_lower_limit',
+    'progressive_motility': 'progressive_motility_lower_limit',
+    'total_motility': 'total_motility_lower_limit',
+}
+
+
+class CohortIndex:
+    """
+    SQLite-backed index of per-analysis CASA summary rows.
+
+    Two access paths:
+
+    * ``daily_aggregates`` holds count / sum / sum of squares / below-reference
+      counts per day and metric, updated on every upsert and delete, so
+      count, mean and std over a date range are a single indexed SUM.
+    * An in-memory columnar snapshot of all rows, loaded once and updated in
+      place on writes, answers percentiles, histograms and other filters with
+      numpy.
+    """
+
+    def __init__(self, db_path: Path, who_references: Dict[str, float]):
+        self.db_path = Path(db_path)
+        self.who_limits = {
+            metric: float(who_references[key]) for metric, key in WHO_REFERENCE_KEYS.items()
+        }
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._create_schema()
+        # Columnar snapshot for percentile/histogram queries, loaded on first use
+        # and then kept current in place by upsert/remove
+        self._snapshot: Optional[Dict[str, np.ndarray]] = None
+        self._snapshot_index: Dict[str, int] = {}
+        self._snapshot_size = 0
+
+    def _create_schema(self):
+        metric_columns = ", ".join(f"{m} REAL" for m in COHORT_METRICS)
+        with self._conn:
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS analysis_summary (
+                    analysis_id TEXT PRIMARY KEY,
+                    created_at TEXT NOT NULL,
+                    analysis_date TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    analysis_type TEXT NOT NULL,
+                    {metric_columns}
+                )""")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_summary_date ON analysis_summary (analysis_date)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_aggregates (
+                    analysis_date TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    n INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    total_sq REAL NOT NULL,
+                    below_reference INTEGER NOT NULL,
+                    PRIMARY KEY (analysis_date, metric)
+                )""")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analysis_summary").fetchone()[0]
+
+    def upsert(self, result: AnalysisResult):
+        """Insert or replace the summary row of an analysis"""
+        row = {
+            'analysis_id': result.analysis_id,
+            'created_at': result.created_at.isoformat(),
+            'analysis_date': result.created_at.date().isoformat(),
+            'status': getattr(result.status, 'value', result.status),
+            'analysis_type': getattr(result.analysis_type, 'value', result.analysis_type),
+        }
+        has_motion = row['analysis_type'] in MOTION_ANALYSIS_TYPES
+        for metric in COHORT_METRICS:
+            if result.casa_metrics is None or (metric in MOTION_METRICS and not has_motion):
+                # NULL metrics are skipped by the daily aggregates and the snapshot alike
+                row[metric] = None
+            else:
+                row[metric] = float(getattr(result.casa_metrics, metric))
+
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{name}" for name in row)
+        with self._lock, self._conn:
+            self._remove_locked(result.analysis_id)
+            self._conn.execute(f"INSERT INTO analysis_summary ({columns}) VALUES ({placeholders})", row)
+            self._apply_daily_locked(row, sign=1)
+            if self._snapshot is not None:
+                self._snapshot_put_locked(row)
+
+    def remove(self, analysis_id: str):
+        """Remove an analysis from the index"""
+        with self._lock, self._conn:
+            self._remove_locked(analysis_id)
+            if self._snapshot is not None and analysis_id in self._snapshot_index:
+                # Leave a tombstone; the slot is excluded from every query
+                self._snapshot['completed'][self._snapshot_index[analysis_id]] = False
+
+    def _remove_locked(self, analysis_id: str):
+        cursor = self._conn.execute(
+            "SELECT * FROM analysis_summary WHERE analysis_id = ?", (analysis_id,)
+        )
+        existing = cursor.fetchone()
+        if existing is None:
+            return
+        old_row = dict(zip([d[0] for d in cursor.description], existing))
+        self._apply_daily_locked(old_row, sign=-1)
+        self._conn.execute("DELETE FROM analysis_summary WHERE analysis_id = ?", (analysis_id,))
+
+    def _apply_daily_locked(self, row: Dict[str, Any], sign: int):
+        """Add (sign=1) or subtract (sign=-1) a completed row from the daily aggregates"""
+        if row['status'] != AnalysisStatus.COMPLETED.value:
+            return
+        for metric in COHORT_METRICS:
+            value = row.get(metric)
+            if value is None:
+                continue
+            below = int(metric in self.who_limits and value < self.who_limits[metric])
+            self._conn.execute("""
+                INSERT INTO daily_aggregates (analysis_date, metric, n, total, total_sq, below_reference)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (analysis_date, metric) DO UPDATE SET
+                    n = n + excluded.n,
+                    total = total + excluded.total,
+                    total_sq = total_sq + excluded.total_sq,
+                    below_reference = below_reference + excluded.below_reference
+                """, (row['analysis_date'], metric, sign, sign * value, sign * value * value, sign * below))
+
+    def aggregate(self, metrics: List[str], date_from: Optional[date] = None,
+                  date_to: Optional[date] = None, analysis_type: Optional[str] = None,
+                  percentiles: Optional[List[float]] = None, bins: int = 0) -> Dict[str, Any]:
+        """
+        Aggregate CASA metrics over completed analyses
+
+        Counts, means, standard deviations and below-reference fractions over
+        a date range come straight from the daily aggregates. Percentiles,
+        histograms and the ``analysis_type`` filter use the columnar snapshot.
+        """
+        if not percentiles and not bins and analysis_type is None:
+            return self._aggregate_daily(metrics, date_from, date_to)
+        return self._aggregate_snapshot(metrics, date_from, date_to, analysis_type, percentiles or [], bins)
+
+    def _aggregate_daily(self, metrics: List[str], date_from: Optional[date],
+                         date_to: Optional[date]) -> Dict[str, Any]:
+        placeholders = ", ".join("?" for _ in metrics)
+        query = f"""
+            SELECT metric, SUM(n), SUM(total), SUM(total_sq), SUM(below_reference)
+            FROM daily_aggregates
+            WHERE metric IN ({placeholders}) AND analysis_date >= ? AND analysis_date <= ?
+            GROUP BY metric"""
+        params = [*metrics, (date_from or date.min).isoformat(), (date_to or date.max).isoformat()]
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        by_metric = {row[0]: row[1:] for row in rows}
+        aggregates = {}
+        for metric in metrics:
+            n, total, total_sq, below = by_metric.get(metric, (0, 0.0, 0.0, 0))
+            stats = {'count': int(n or 0)}
+            if n:
+                mean = total / n
+                stats['mean'] = mean
+                stats['std'] = float(np.sqrt(max(total_sq / n - mean * mean, 0.0)))
+                if metric in self.who_limits:
+                    stats['below_reference_fraction'] = below / n
+            aggregates[metric] = stats
+        return {'source': 'daily_aggregates', 'metrics': aggregates}
+
+    def _aggregate_snapshot(self, metrics: List[str], date_from: Optional[date], date_to: Optional[date],
+                            analysis_type: Optional[str], percentiles: List[float], bins: int) -> Dict[str, Any]:
+        snapshot = self._get_snapshot()
+        mask = snapshot['completed'].copy()
+        if date_from:
+            mask &= snapshot['analysis_date'] >= np.datetime64(date_from)
+        if date_to:
+            mask &= snapshot['analysis_date'] <= np.datetime64(date_to)
+        if analysis_type:
+            mask &= snapshot['analysis_type'] == analysis_type
+
+        aggregates = {}
+        for metric in metrics:
+            values = snapshot[metric][mask]
+            values = values[~np.isnan(values)]
+            stats: Dict[str, Any] = {'count': int(len(values))}
+            if len(values):
+                stats.update({
+                    'mean': float(values.mean()),
+                    'std': float(values.std()),
+                    'min': float(values.min()),
+                    'max': float(values.max()),
+                })
+                if percentiles:
+                    stats['percentiles'] = {
+                        str(p): float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))
+                    }
+                if bins:
+                    counts, edges = np.histogram(values, bins=bins)
+                    stats['histogram'] = {'bin_edges': edges.tolist(), 'counts': counts.tolist()}
+                if metric in self.who_limits:
+                    stats['below_reference_fraction'] = float((values < self.who_limits[metric]).mean())
+            aggregates[metric] = stats
+        return {'source': 'snapshot', 'metrics': aggregates}
+
+    def _get_snapshot(self) -> Dict[str, np.ndarray]:
+        """Columnar view of the summary table, trimmed to the live rows"""
+        with self._lock:
+            if self._snapshot is None:
+                self._load_snapshot_locked()
+            return {name: values[:self._snapshot_size] for name, values in self._snapshot.items()}
+
+    def _load_snapshot_locked(self):
+        rows = self._conn.execute(
+            f"SELECT analysis_id, analysis_date, status, analysis_type, {', '.join(COHORT_METRICS)} "
+            f"FROM analysis_summary"
+        ).fetchall()
+        columns = list(zip(*rows)) if rows else [() for _ in range(4 + len(COHORT_METRICS))]
+        self._snapshot_index = {analysis_id: i for i, analysis_id in enumerate(columns[0])}
+        self._snapshot_size = len(rows)
+        self._snapshot = {
+            'analysis_date': np.array(columns[1], dtype='datetime64[D]'),
+            'completed': np.array(columns[2], dtype=object) == AnalysisStatus.COMPLETED.value,
+            'analysis_type': np.array(columns[3], dtype=object),
+        }
+        for i, metric in enumerate(COHORT_METRICS):
+            # None becomes NaN
+            self._snapshot[metric] = np.array(columns[4 + i], dtype=np.float64)
+
+    def _snapshot_put_locked(self, row: Dict[str, Any]):
+        """Write one row into the loaded snapshot in place (append or overwrite)"""
+        index = self._snapshot_index.get(row['analysis_id'])
+        if index is None:
+            index = self._snapshot_size
+            if index == len(self._snapshot['completed']):
+                self._grow_snapshot_locked()
+            self._snapshot_index[row['analysis_id']] = index
+            self._snapshot_size += 1
+
+        self._snapshot['analysis_date'][index] = np.datetime64(row['analysis_date'])
+        self._snapshot['completed'][index] = row['status'] == AnalysisStatus.COMPLETED.value
+        self._snapshot['analysis_type'][index] = row['analysis_type']
+        for metric in COHORT_METRICS:
+            self._snapshot[metric][index] = np.nan if row[metric] is None else row[metric]
+
+    def _grow_snapshot_locked(self):
+        capacity = max(1024, 2 * len(self._snapshot['completed']))
+        for name, values in self._snapshot.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:len(values)] = values
+            if name == 'completed':
+                grown[len(values):] = False
+            self._snapshot[name] = grown
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
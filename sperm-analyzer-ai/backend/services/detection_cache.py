@@ -0,0 +1,108 @@
+"""
+Persistent cache of raw per-frame detections
+Lets an analysis be re-tracked with new parameters without decoding or inference
+"""
+
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+DETECTION_CACHE_FORMAT = "detections-v1"
+
+# Columns stored per cache, one .npy file each
+DETECTION_COLUMNS = ['frame_numbers', 'frame_timestamps', 'frame_offsets', 'x', 'y', 'confidence']
+
+
+class DetectionCache:
+    """
+    Raw detections of analyzed video frames, stored columnar
+
+    Layout of ``{cache_dir}/{analysis_id}/``::
+
+        meta.json           video properties and the confidence floor
+        frame_numbers.npy   int32, analyzed frame numbers (frames without detections included)
+        frame_timestamps.npy  float64, seconds; recorded times for frame stacks
+        frame_offsets.npy   int64, detections of frame i are rows [offsets[i], offsets[i + 1])
+        x.npy, y.npy        float32, full-frame head centers
+        confidence.npy      float32
+
+    At 12 bytes per detection, a 10-minute recording with 50 detections per
+    frame at 30 fps takes about 11 MB.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, analysis_id: str) -> Path:
+        return self.cache_dir / analysis_id
+
+    def exists(self, analysis_id: str) -> bool:
+        return (self.path_for(analysis_id) / "meta.json").exists()
+
+    def save(self, analysis_id: str, raw_results: Dict[str, Any]):
+        """
+        Persist the raw detections of a ``process_video`` result
+
+        The bulky ``raw_detections`` arrays are removed from the frame records
+        as they are collected.
+        """
+        frame_detections: List[Dict] = raw_results['frame_detections']
+        raw = [record.pop('raw_detections', None) for record in frame_detections]
+        if any(r is None for r in raw):
+            logger.warning(f"No raw detections recorded for {analysis_id}; detection cache not written")
+            return
+
+        counts = np.array([len(r) for r in raw], dtype=np.int64)
+        stacked = np.concatenate(raw) if raw else np.empty((0, 3), dtype=np.float32)
+        columns = {
+            'frame_numbers': np.array([record['frame_number'] for record in frame_detections], dtype=np.int32),
+            'frame_timestamps': np.array([record['timestamp'] for record in frame_detections], dtype=np.float64),
+            'frame_offsets': np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+            'x': stacked[:, 0].astype(np.float32),
+            'y': stacked[:, 1].astype(np.float32),
+            'confidence': stacked[:, 2].astype(np.float32),
+        }
+        video_properties = raw_results['video_properties']
+        meta = {
+            'format': DETECTION_CACHE_FORMAT,
+            'video_properties': video_properties,
+            'confidence_floor': video_properties.get('detection_confidence_floor', 0.0),
+            'frame_count': len(frame_detections),
+            'detection_count': int(counts.sum())
+        }
+
+        target = self.path_for(analysis_id)
+        tmp_dir = target.with_name(f".{target.name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        for name, values in columns.items():
+            np.save(tmp_dir / f"{name}.npy", values)
+        with open(tmp_dir / "meta.json", 'w') as f:
+            json.dump(meta, f, default=str)
+        shutil.rmtree(target, ignore_errors=True)
+        tmp_dir.rename(target)
+        logger.info(f"Detection cache written: {target} ({meta['detection_count']} detections)")
+
+    def load(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """Load the cached columns (memory-mapped) and metadata"""
+        target = self.path_for(analysis_id)
+        if not self.exists(analysis_id):
+            return None
+        with open(target / "meta.json", 'r') as f:
+            cached: Dict[str, Any] = {'meta': json.load(f)}
+        for name in DETECTION_COLUMNS:
+            # Caches written before timestamps were stored fall back to frame_number / fps
+            if (target / f"{name}.npy").exists():
+                cached[name] = np.load(target / f"{name}.npy", mmap_mode='r')
+        return cached
+
+    def delete(self, analysis_id: str):
+        shutil.rmtree(self.path_for(analysis_id), ignore_errors=True)
@@ -0,0 +1,60 @@
+"""
+Per-device (microscope) analysis settings
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class DeviceProfileStore:
+    """
+    Settings keyed by device id, persisted as a single JSON file
+
+    A profile is a dict of named sections, e.g. ``{"roi": {...}}``, which
+    analyses from that device use unless the request overrides them.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    self._profiles = json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to load device profiles from {self.path}: {str(e)}")
+
+    def get(self, device_id: str) -> Dict[str, Any]:
+        return dict(self._profiles.get(device_id, {}))
+
+    def get_section(self, device_id: str, section: str) -> Optional[Any]:
+        return self._profiles.get(device_id, {}).get(section)
+
+    def set_section(self, device_id: str, section: str, value: Optional[Any]):
+        """Set (or with ``None`` remove) one section of a device profile"""
+        with self._lock:
+            profile = self._profiles.setdefault(device_id, {})
+            if value is None:
+                profile.pop(section, None)
+            else:
+                profile[section] = value
+            if not profile:
+                del self._profiles[device_id]
+            self._save_locked()
+
+    def list_devices(self) -> Dict[str, Dict[str, Any]]:
+        return {device_id: dict(profile) for device_id, profile in self._profiles.items()}
+
+    def _save_locked(self):
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self._profiles, f, indent=2)
+        tmp_path.replace(self.path)
@@ -0,0 +1,132 @@
+"""
+Export artifact cache keyed by analysis id, result version and format
+"""
+
+import hashlib
+import json
+import shutil
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Artifacts built from several analyses (e.g. Parquet datasets) live under this subdirectory
+DATASETS_DIR = "_datasets"
+
+
+class ExportArtifactCache:
+    """
+    On-disk cache of generated export files.
+
+    Artifacts live at ``{cache_dir}/{analysis_id}/{version}/{artifact}``. A new
+    result version simply misses the cache; older version directories are
+    removed when the new artifact is written or when the analysis is
+    invalidated.
+
+    Artifacts of several analyses live at ``{cache_dir}/_datasets/{key}/``
+    next to a ``members.json`` of the analysis versions they were built
+    from, and are removed once any member is invalidated.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, analysis_id: str, version: str, artifact: str) -> Path:
+        return self.cache_dir / analysis_id / version / artifact
+
+    def get(self, analysis_id: str, version: str, artifact: str) -> Optional[Path]:
+        """Return the cached artifact path, or None on a miss"""
+        path = self.path_for(analysis_id, version, artifact)
+        return path if path.exists() else None
+
+    def get_or_build(self, analysis_id: str, version: str, artifact: str,
+                     builder: Callable[[Path], None]) -> Path:
+        """
+        Return the cached artifact, building it with ``builder(tmp_path)`` on a
+        miss. Concurrent requests for the same artifact build it only once.
+        """
+        path = self.path_for(analysis_id, version, artifact)
+        if self._build(path, builder):
+            self._prune_versions(analysis_id, keep=version)
+        return path
+
+    def get_or_build_dataset(self, members: Dict[str, str], artifact: str,
+                             builder: Callable[[Path], None]) -> Path:
+        """
+        Return the cached artifact built from several analyses, keyed by their
+        ``{analysis_id: version}``, building it with ``builder(tmp_path)`` on a miss
+        """
+        key = "\n".join(f"{analysis_id}@{version}" for analysis_id, version in sorted(members.items()))
+        dataset_dir = self.cache_dir / DATASETS_DIR / hashlib.sha1(f"{key}\n{artifact}".encode()).hexdigest()[:16]
+        manifest = dataset_dir / "members.json"
+        if not manifest.exists():
+            dataset_dir.mkdir(parents=True, exist_ok=True)
+            manifest.write_text(json.dumps(members))
+        path = dataset_dir / artifact
+        self._build(path, builder)
+        return path
+
+    def _build(self, path: Path, builder: Callable[[Path], None]) -> bool:
+        """Build ``path`` unless it exists; whether it was built"""
+        if path.exists():
+            self.hits += 1
+            return False
+
+        with self._lock_for(str(path)):
+            if path.exists():
+                self.hits += 1
+                return False
+
+            self.misses += 1
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            try:
+                builder(tmp_path)
+                tmp_path.replace(path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
+            logger.info(f"Export artifact cached: {path}")
+            return True
+
+    def invalidate(self, analysis_id: str):
+        """Drop every cached artifact for an analysis, including datasets it is part of"""
+        analysis_dir = self.cache_dir / analysis_id
+        if analysis_dir.exists():
+            shutil.rmtree(analysis_dir, ignore_errors=True)
+        self._prune_datasets(analysis_id)
+
+    def _prune_versions(self, analysis_id: str, keep: str):
+        analysis_dir = self.cache_dir / analysis_id
+        for version_dir in analysis_dir.iterdir():
+            if version_dir.is_dir() and version_dir.name != keep:
+                shutil.rmtree(version_dir, ignore_errors=True)
+        self._prune_datasets(analysis_id, keep=keep)
+
+    def _prune_datasets(self, analysis_id: str, keep: Optional[str] = None):
+        """Remove datasets built from ``analysis_id`` at any version other than ``keep``"""
+        datasets_dir = self.cache_dir / DATASETS_DIR
+        if not datasets_dir.exists():
+            return
+        for manifest in datasets_dir.glob("*/members.json"):
+            try:
+                version = json.loads(manifest.read_text()).get(analysis_id)
+            except (OSError, ValueError):
+                continue
+            if version is not None and version != keep:
+                shutil.rmtree(manifest.parent, ignore_errors=True)
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
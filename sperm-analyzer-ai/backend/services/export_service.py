@@ -3,160 +3,395 @@ Export service for generating reports and data exports
 """
 
 import os
+import csv
 import json
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Callable, Iterator, List, Optional, Dict, Any
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from io import BytesIO
+from io import BytesIO, StringIO
 import base64
 
-from models.analysis_models import AnalysisResult
+from models.analysis_models import AnalysisResult, MOTILITY_CLASSES, MOTILITY_CODES, TRACK_METRIC_COLUMNS
 from services.analysis_service import AnalysisService
+from services.chart_renderer import ChartRenderer
+from services.export_cache import ExportArtifactCache
+from services.overlay_video import OverlayVideoService
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+TRACK_CSV_COLUMNS = [
+    'track_id', 'start_frame', 'end_frame', 'duration', 'vcl', 'vsl', 'vap',
+    'lin', 'str', 'wob', 'alh', 'bcf', 'motility_class'
+]
+
+POINT_CSV_COLUMNS = ['track_id', 'point_id', 'frame_number', 'timestamp', 'x', 'y', 'confidence']
+
+# Rows read from the memory-mapped columns per streamed chunk
+STREAM_CHUNK_ROWS = 2048
+
 class ExportService:
     """Service for exporting analysis results in various formats"""
     
-    def __init__(self):
+    def __init__(self, analysis_service: Optional[AnalysisService] = None):
         self.exports_dir = Path("exports")
         self.exports_dir.mkdir(exist_ok=True)
-        self.analysis_service = AnalysisService()
+        # Share the caller's analysis service so exports see its result cache
+        self.analysis_service = analysis_service or AnalysisService()
+        self.artifact_cache = ExportArtifactCache(self.exports_dir / "cache")
+        self.analysis_service.add_invalidation_listener(self.artifact_cache.invalidate)
+        self.chart_renderer = ChartRenderer()
+        self.overlay_videos = OverlayVideoService(self.analysis_service, self.artifact_cache)
+    
+    def shutdown(self):
+        """Stop the chart worker processes"""
+        self.chart_renderer.shutdown()
+    
+    def _cached_artifact(self, analysis_id: str, artifact: str,
+                         builder: Callable[[Path], None]) -> Optional[str]:
+        """Return a cached export artifact for the current result version, building it on a miss"""
+        version = self.analysis_service.get_result_version(analysis_id)
+        if version is None:
+            return None
+        return str(self.artifact_cache.get_or_build(analysis_id, version, artifact, builder))
+    
+    def _load_results(self, analysis_id: str) -> AnalysisResult:
+        # Exports run over many analyses; keep their full track data out of the results cache
+        results = self.analysis_service.get_analysis_results(analysis_id, cache=False)
+        if not results:
+            raise ValueError(f"Analysis results not found: {analysis_id}")
+        return results
     
     def export_to_csv(self, analysis_id: str) -> Optional[str]:
         """Export analysis results to CSV format"""
         try:
-            results = self.analysis_service.get_analysis_results(analysis_id)
-            if not results:
+            csv_path = self._cached_artifact(
+                analysis_id, "results.csv",
+                lambda path: self._write_results_csv(self._load_results(analysis_id), path)
+            )
+            if not csv_path:
                 return None
             
-            # Prepare data for CSV
-            data_rows = []
-            
-            # Add basic info
-            basic_info = {
-                'analysis_id': results.analysis_id,
-                'filename': results.filename,
-                'analysis_type': results.analysis_type,
-                'created_at': results.created_at,
-                'processing_time': results.processing_time
-            }
-            
-            # Add CASA metrics if available
-            if results.casa_metrics:
-                casa_data = {
-                    'total_count': results.casa_metrics.total_count,
-                    'concentration': results.casa_metrics.concentration,
-                    'progressive_motility_pct': results.casa_metrics.progressive_motility,
-                    'non_progressive_motility_pct': results.casa_metrics.non_progressive_motility,
-                    'total_motility_pct': results.casa_metrics.total_motility,
-                    'immotile_pct': results.casa_metrics.immotile,
-                    'vcl_mean': results.casa_metrics.vcl_mean,
-                    'vcl_std': results.casa_metrics.vcl_std,
-                    'vsl_mean': results.casa_metrics.vsl_mean,
-                    'vsl_std': results.casa_metrics.vsl_std,
-                    'vap_mean': results.casa_metrics.vap_mean,
-                    'vap_std': results.casa_metrics.vap_std,
-                    'lin_mean': results.casa_metrics.lin_mean,
-                    'str_mean': results.casa_metrics.str_mean,
-                    'wob_mean': results.casa_metrics.wob_mean,
-                    'alh_mean': results.casa_metrics.alh_mean,
-                    'bcf_mean': results.casa_metrics.bcf_mean
-                }
-                basic_info.update(casa_data)
-            
-            data_rows.append(basic_info)
-            
-            # Create separate CSV for individual track data
-            if results.tracks:
-                track_data = []
-                for track in results.tracks:
-                    track_row = {
-                        'track_id': track.track_id,
-                        'start_frame': track.start_frame,
-                        'end_frame': track.end_frame,
-                        'duration': track.duration,
-                        'vcl': track.vcl,
-                        'vsl': track.vsl,
-                        'vap': track.vap,
-                        'lin': track.lin,
-                        'str': track.str_metric,
-                        'wob': track.wob,
-                        'alh': track.alh,
-                        'bcf': track.bcf,
-                        'motility_class': track.motility_class
-                    }
-                    track_data.append(track_row)
-                
-                # Save track data
-                track_df = pd.DataFrame(track_data)
-                track_csv_path = self.exports_dir / f"{analysis_id}_tracks.csv"
-                track_df.to_csv(track_csv_path, index=False)
-            
-            # Save main results
-            main_df = pd.DataFrame(data_rows)
-            csv_path = self.exports_dir / f"{analysis_id}_results.csv"
-            main_df.to_csv(csv_path, index=False)
+            # Per-track data is exported alongside the summary CSV
+            self._cached_artifact(
+                analysis_id, "tracks.csv",
+                lambda path: self._write_tracks_csv(self._load_results(analysis_id), path)
+            )
             
             logger.info(f"CSV export completed: {csv_path}")
-            return str(csv_path)
+            return csv_path
             
         except Exception as e:
             logger.error(f"CSV export failed: {str(e)}")
             return None
     
+    def _write_results_csv(self, results: AnalysisResult, csv_path: Path):
+        """Write the one-row summary CSV"""
+        # Add basic info
+        basic_info = {
+            'analysis_id': results.analysis_id,
+            'filename': results.filename,
+            'analysis_type': results.analysis_type,
+            'created_at': results.created_at,
+            'processing_time': results.processing_time
+        }
+        
+        # Add CASA metrics if available
+        if results.casa_metrics:
+            casa_data = {
+                'total_count': results.casa_metrics.total_count,
+                'concentration': results.casa_metrics.concentration,
+                'progressive_motility_pct': results.casa_metrics.progressive_motility,
+                'non_progressive_motility_pct': results.casa_metrics.non_progressive_motility,
+                'total_motility_pct': results.casa_metrics.total_motility,
+                'immotile_pct': results.casa_metrics.immotile,
+                'vcl_mean': results.casa_metrics.vcl_mean,
+                'vcl_std': results.casa_metrics.vcl_std,
+                'vsl_mean': results.casa_metrics.vsl_mean,
+                'vsl_std': results.casa_metrics.vsl_std,
+                'vap_mean': results.casa_metrics.vap_mean,
+                'vap_std': results.casa_metrics.vap_std,
+                'lin_mean': results.casa_metrics.lin_mean,
+                'str_mean': results.casa_metrics.str_mean,
+                'wob_mean': results.casa_metrics.wob_mean,
+                'alh_mean': results.casa_metrics.alh_mean,
+                'bcf_mean': results.casa_metrics.bcf_mean
+            }
+            basic_info.update(casa_data)
+        
+        pd.DataFrame([basic_info]).to_csv(csv_path, index=False)
+    
+    def _write_tracks_csv(self, results: AnalysisResult, csv_path: Path):
+        """Write one CSV row per track"""
+        track_data = []
+        for track in results.tracks:
+            track_row = {
+                'track_id': track.track_id,
+                'start_frame': track.start_frame,
+                'end_frame': track.end_frame,
+                'duration': track.duration,
+                'vcl': track.vcl,
+                'vsl': track.vsl,
+                'vap': track.vap,
+                'lin': track.lin,
+                'str': track.str_metric,
+                'wob': track.wob,
+                'alh': track.alh,
+                'bcf': track.bcf,
+                'motility_class': track.motility_class
+            }
+            track_data.append(track_row)
+        
+        pd.DataFrame(track_data, columns=TRACK_CSV_COLUMNS).to_csv(csv_path, index=False)
+    
     def export_to_json(self, analysis_id: str) -> Optional[str]:
         """Export analysis results to JSON format"""
         try:
-            results = self.analysis_service.get_analysis_results(analysis_id)
-            if not results:
+            json_path = self._cached_artifact(
+                analysis_id, "results.json",
+                lambda path: self._write_json(self._load_results(analysis_id), path)
+            )
+            if not json_path:
                 return None
             
-            # Convert to dictionary and save
-            json_path = self.exports_dir / f"{analysis_id}_results.json"
-            with open(json_path, 'w') as f:
-                json.dump(results.dict(), f, indent=2, default=str)
-            
             logger.info(f"JSON export completed: {json_path}")
-            return str(json_path)
+            return json_path
             
         except Exception as e:
             logger.error(f"JSON export failed: {str(e)}")
             return None
     
+    def _write_json(self, results: AnalysisResult, json_path: Path):
+        with open(json_path, 'w') as f:
+            json.dump(results.dict(), f, indent=2, default=str)
+    
+    def _load_summary(self, analysis_id: str) -> AnalysisResult:
+        results = self.analysis_service.get_analysis_results(analysis_id, include_tracks=False)
+        if not results:
+            raise ValueError(f"Analysis results not found: {analysis_id}")
+        return results
+    
+    def has_results(self, analysis_id: str) -> bool:
+        """Whether results exist for an analysis (without loading tracks)"""
+        return self.analysis_service.get_analysis_results(analysis_id, include_tracks=False) is not None
+    
+    def stream_rows(self, analysis_id: str, table: str = "tracks", format: str = "csv") -> Iterator[str]:
+        """
+        Stream track or per-detection point rows as CSV or NDJSON text chunks
+
+        Rows are read chunk by chunk from the memory-mapped result columns, so
+        memory use does not grow with the size of the analysis.
+        """
+        columns = POINT_CSV_COLUMNS if table == "points" else TRACK_CSV_COLUMNS
+        row_chunks = self._iter_point_chunks(analysis_id) if table == "points" else self._iter_track_chunks(analysis_id)
+        
+        if format == "ndjson":
+            for rows in row_chunks:
+                yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+            return
+        
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        for rows in row_chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+    
+    def _iter_track_chunks(self, analysis_id: str) -> Iterator[List[list]]:
+        storage = self.analysis_service.storage
+        if analysis_id in self.analysis_service.results_cache or not storage.has_columns(analysis_id):
+            tracks = self._load_results(analysis_id).tracks
+            for start in range(0, len(tracks), STREAM_CHUNK_ROWS):
+                yield [
+                    [t.track_id, t.start_frame, t.end_frame, t.duration, t.vcl, t.vsl, t.vap,
+                     t.lin, t.str_metric, t.wob, t.alh, t.bcf,
+                     t.motility_class.value if t.motility_class else None]
+                    for t in tracks[start:start + STREAM_CHUNK_ROWS]
+                ]
+            return
+        
+        cols = storage.load_columns(analysis_id)
+        if 'track_id' not in cols:
+            return
+        for start in range(0, len(cols['track_id']), STREAM_CHUNK_ROWS):
+            chunk = slice(start, start + STREAM_CHUNK_ROWS)
+            metrics = [
+                [None if np.isnan(v) else v for v in cols[name][chunk].tolist()]
+                for name in TRACK_METRIC_COLUMNS
+            ]
+            motility = [
+                MOTILITY_CLASSES[code].value if code in MOTILITY_CLASSES else None
+                for code in cols['motility_class'][chunk].tolist()
+            ]
+            yield [list(row) for row in zip(
+                cols['track_id'][chunk].tolist(), cols['start_frame'][chunk].tolist(),
+                cols['end_frame'][chunk].tolist(), cols['duration'][chunk].tolist(),
+                *metrics, motility
+            )]
+    
+    def _iter_point_chunks(self, analysis_id: str) -> Iterator[List[list]]:
+        storage = self.analysis_service.storage
+        if analysis_id in self.analysis_service.results_cache or not storage.has_columns(analysis_id):
+            rows = []
+            for track in self._load_results(analysis_id).tracks:
+                for det in track.detections:
+                    rows.append([track.track_id, det.id, det.frame_number, det.timestamp,
+                                 *self._point_values(np.array([det.x, det.y, det.confidence]))])
+                    if len(rows) == STREAM_CHUNK_ROWS:
+                        yield rows
+                        rows = []
+            if rows:
+                yield rows
+            return
+        
+        cols = storage.load_columns(analysis_id)
+        if 'point_offsets' not in cols:
+            return
+        offsets = cols['point_offsets']
+        total_points = int(offsets[-1])
+        for start in range(0, total_points, STREAM_CHUNK_ROWS):
+            stop = min(start + STREAM_CHUNK_ROWS, total_points)
+            # Map each point index back to its track via the offsets array
+            track_index = np.searchsorted(offsets, np.arange(start, stop), side='right') - 1
+            yield [list(row) for row in zip(
+                cols['track_id'][track_index].tolist(),
+                cols['point_id'][start:stop].tolist(),
+                cols['point_frame'][start:stop].tolist(),
+                cols['point_timestamp'][start:stop].tolist(),
+                *(self._point_values(cols[name][start:stop])
+                  for name in ('point_x', 'point_y', 'point_confidence'))
+            )]
+    
+    def _point_values(self, values: np.ndarray) -> List[float]:
+        """Point coordinates/confidences as exported: Python floats rounded to 4 decimals"""
+        return np.round(values.astype(np.float64), 4).tolist()
+    
+    def export_to_parquet(self, analysis_id: str, table: str = "tracks",
+                          partitioned: bool = False) -> Optional[str]:
+        """
+        Export tracks (one row per track) or points (one row per detection) as Parquet
+
+        ``partitioned=True`` omits the ``analysis_date`` column, which is then
+        carried by the dataset partition directory instead.
+        """
+        try:
+            artifact = f"{table}.partition.parquet" if partitioned else f"{table}.parquet"
+            return self._cached_artifact(
+                analysis_id, artifact,
+                lambda path: self._write_parquet(analysis_id, table, path, include_date=not partitioned)
+            )
+        except ImportError:
+            raise
+        except Exception as e:
+            logger.error(f"Parquet export failed: {str(e)}")
+            return None
+    
+    def export_parquet_dataset(self, analysis_ids: List[str], table: str = "tracks") -> Optional[str]:
+        """
+        Export several analyses as a Hive-partitioned Parquet dataset in a zip archive
+
+        Files are laid out as ``{table}/analysis_date=YYYY-MM-DD/{analysis_id}.parquet``
+        so ``pyarrow.dataset`` / Polars can prune partitions by date.
+        """
+        entries, members = [], {}
+        for analysis_id in dict.fromkeys(analysis_ids):
+            summary = self.analysis_service.get_analysis_results(analysis_id, include_tracks=False)
+            parquet_path = self.export_to_parquet(analysis_id, table, partitioned=True) if summary else None
+            if not parquet_path:
+                logger.warning(f"Skipping analysis {analysis_id} in Parquet dataset export")
+                continue
+            analysis_date = summary.created_at.date().isoformat()
+            entries.append((parquet_path, f"{table}/analysis_date={analysis_date}/{analysis_id}.parquet"))
+            members[analysis_id] = self.analysis_service.get_result_version(analysis_id)
+        
+        if not entries:
+            return None
+        
+        def write_dataset(zip_path: Path):
+            # Parquet pages are already compressed, so entries are stored as-is
+            with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED) as zipf:
+                for parquet_path, arcname in entries:
+                    zipf.write(parquet_path, arcname)
+        
+        # Cached per member result version and dropped when any member is rewritten or deleted
+        zip_path = self.artifact_cache.get_or_build_dataset(members, f"dataset_{table}.zip", write_dataset)
+        logger.info(f"Parquet dataset exported: {zip_path} ({len(entries)} analyses)")
+        return str(zip_path)
+    
+    def _result_columns(self, analysis_id: str) -> Dict[str, np.ndarray]:
+        """Columnar track/point arrays for an analysis, memory-mapped when stored columnar"""
+        storage = self.analysis_service.storage
+        if analysis_id not in self.analysis_service.results_cache and storage.has_columns(analysis_id):
+            return storage.load_columns(analysis_id)
+        return storage.result_to_columns(self._load_results(analysis_id))
+    
+    def _write_parquet(self, analysis_id: str, table: str, parquet_path: Path, include_date: bool = True):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        summary = self.analysis_service.get_analysis_results(analysis_id, include_tracks=False)
+        cols = self._result_columns(analysis_id)
+        offsets = np.asarray(cols['point_offsets'])
+        num_tracks = len(offsets) - 1
+        num_rows = num_tracks if table == "tracks" else int(offsets[-1])
+        
+        arrays = {
+            'analysis_id': pa.DictionaryArray.from_arrays(
+                pa.array(np.zeros(num_rows, dtype=np.int32)), pa.array([analysis_id])
+            )
+        }
+        if include_date:
+            arrays['analysis_date'] = pa.array([summary.created_at.date()] * num_rows, type=pa.date32())
+        if table == "tracks":
+            arrays['track_id'] = pa.array(cols['track_id'])
+            arrays['start_frame'] = pa.array(cols['start_frame'])
+            arrays['end_frame'] = pa.array(cols['end_frame'])
+            arrays['duration'] = pa.array(cols['duration'])
+            for name in TRACK_METRIC_COLUMNS:
+                values = np.asarray(cols[name])
+                arrays['str' if name == 'str_metric' else name] = pa.array(values, mask=np.isnan(values))
+            codes = np.asarray(cols['motility_class'], dtype=np.int8)
+            arrays['motility_class'] = pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=codes < 0),
+                pa.array([motility.value for motility in sorted(MOTILITY_CODES, key=MOTILITY_CODES.get)])
+            )
+        else:
+            arrays['track_id'] = pa.array(np.repeat(np.asarray(cols['track_id']), np.diff(offsets)))
+            arrays['point_id'] = pa.array(cols['point_id'])
+            arrays['frame_number'] = pa.array(cols['point_frame'])
+            arrays['timestamp'] = pa.array(cols['point_timestamp'])
+            arrays['x'] = pa.array(cols['point_x'])
+            arrays['y'] = pa.array(cols['point_y'])
+            arrays['confidence'] = pa.array(cols['point_confidence'])
+        
+        pq.write_table(pa.table(arrays), parquet_path, compression='zstd')
+    
     def generate_report(self, analysis_id: str, format: str = "html") -> Optional[str]:
         """Generate comprehensive analysis report"""
         try:
-            results = self.analysis_service.get_analysis_results(analysis_id)
-            if not results:
-                return None
-            
-            # Generate HTML report
-            html_content = self._generate_html_report(results)
-            
-            if format == "html":
-                report_path = self.exports_dir / f"{analysis_id}_report.html"
-                with open(report_path, 'w', encoding='utf-8') as f:
-                    f.write(html_content)
-                return str(report_path)
-            
-            elif format == "pdf":
-                # For PDF generation, you would need additional libraries like weasyprint
-                # For now, return HTML version
-                report_path = self.exports_dir / f"{analysis_id}_report.html"
-                with open(report_path, 'w', encoding='utf-8') as f:
-                    f.write(html_content)
-                return str(report_path)
+            # For PDF generation, you would need additional libraries like weasyprint
+            # For now, both formats return the HTML version
+            return self._cached_artifact(
+                analysis_id, "report.html",
+                lambda path: self._write_html_report(self._load_results(analysis_id), path)
+            )
             
         except Exception as e:
             logger.error(f"Report generation failed: {str(e)}")
             return None
     
+    def _write_html_report(self, results: AnalysisResult, report_path: Path):
+        html_content = self._generate_html_report(results)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+    
     def _generate_html_report(self, results: AnalysisResult) -> str:
         """Generate HTML report content"""
         
@@ -356,46 +591,34 @@ class ExportService:
             """)
         return "".join(rows)
     
-    def export_charts(self, analysis_id: str) -> Optional[str]:
-        """Export visualization charts as images"""
+    def export_charts(self, analysis_id: str, dpi: int = 300, format: str = "png") -> Optional[str]:
+        """
+        Export visualization charts as images
+
+        Each chart is cached per result version, resolution and format, and
+        missing charts are rendered in parallel in the chart worker pool.
+        """
         try:
-            results = self.analysis_service.get_analysis_results(analysis_id)
-            if not results:
+            version = self.analysis_service.get_result_version(analysis_id)
+            if version is None:
                 return None
             
-            # Create charts directory
-            charts_dir = self.exports_dir / f"{analysis_id}_charts"
-            charts_dir.mkdir(exist_ok=True)
+            chart_data = self._chart_data(analysis_id)
+            suffix = f"{dpi}dpi.{format}"
             
-            # Generate charts
-            chart_files = []
+            def render(chart: str) -> Path:
+                return self.artifact_cache.get_or_build(
+                    analysis_id, version, f"charts/{chart}_{suffix}",
+                    lambda path: self.chart_renderer.render(chart, chart_data[chart], str(path), dpi, format)
+                )
             
-            if results.casa_metrics:
-                # Motility pie chart
-                pie_chart = self._create_motility_pie_chart(results.casa_metrics)
-                pie_path = charts_dir / "motility_distribution.png"
-                pie_chart.savefig(pie_path, dpi=300, bbox_inches='tight')
-                chart_files.append(pie_path)
-                
-                # Velocity histogram
-                if results.tracks:
-                    hist_chart = self._create_velocity_histogram(results.tracks)
-                    hist_path = charts_dir / "velocity_distribution.png"
-                    hist_chart.savefig(hist_path, dpi=300, bbox_inches='tight')
-                    chart_files.append(hist_path)
+            with ThreadPoolExecutor(max_workers=max(1, len(chart_data))) as pool:
+                chart_files = list(pool.map(render, chart_data))
             
-            if results.video_metrics:
-                # Count over time
-                time_chart = self._create_count_over_time_chart(results.video_metrics)
-                time_path = charts_dir / "count_over_time.png"
-                time_chart.savefig(time_path, dpi=300, bbox_inches='tight')
-                chart_files.append(time_path)
-            
-            # Create zip archive
-            zip_path = self.exports_dir / f"{analysis_id}_charts.zip"
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for chart_file in chart_files:
-                    zipf.write(chart_file, chart_file.name)
+            zip_path = self.artifact_cache.get_or_build(
+                analysis_id, version, f"charts_{suffix}.zip",
+                lambda path: self._write_charts_archive(chart_files, format, path)
+            )
             
             logger.info(f"Charts exported: {zip_path}")
             return str(zip_path)
@@ -404,58 +627,35 @@ class ExportService:
             logger.error(f"Charts export failed: {str(e)}")
             return None
     
-    def _create_motility_pie_chart(self, casa_metrics):
-        """Create motility distribution pie chart"""
-        fig, ax = plt.subplots(figsize=(8, 6))
-        
-        labels = ['Progressive', 'Non-Progressive', 'Immotile']
-        sizes = [
-            casa_metrics.progressive_motility,
-            casa_metrics.non_progressive_motility,
-            casa_metrics.immotile
-        ]
-        colors = ['#2ecc71', '#f39c12', '#e74c3c']
+    def _chart_data(self, analysis_id: str) -> Dict[str, Dict[str, Any]]:
+        """Collect the plain data each chart needs (no detections are loaded)"""
+        summary = self._load_summary(analysis_id)
+        cols = self._result_columns(analysis_id)
+        chart_data = {}
         
-        ax.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-        ax.set_title('Sperm Motility Distribution', fontsize=14, fontweight='bold')
-        
-        return fig
-    
-    def _create_velocity_histogram(self, tracks):
-        """Create velocity distribution histogram"""
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-        
-        # VCL distribution
-        vcl_values = [t.vcl for t in tracks if t.vcl is not None]
-        if vcl_values:
-            ax1.hist(vcl_values, bins=20, alpha=0.7, color='#3498db', edgecolor='black')
-            ax1.set_xlabel('VCL (μm/s)')
-            ax1.set_ylabel('Frequency')
-            ax1.set_title('Curvilinear Velocity Distribution')
+        if summary.casa_metrics:
+            chart_data['motility_distribution'] = {
+                'progressive': summary.casa_metrics.progressive_motility,
+                'non_progressive': summary.casa_metrics.non_progressive_motility,
+                'immotile': summary.casa_metrics.immotile
+            }
+            if len(cols.get('track_id', [])):
+                chart_data['velocity_distribution'] = {
+                    name: [v for v in np.asarray(cols[name]).tolist() if not np.isnan(v)]
+                    for name in ('vcl', 'vsl')
+                }
         
-        # VSL distribution
-        vsl_values = [t.vsl for t in tracks if t.vsl is not None]
-        if vsl_values:
-            ax2.hist(vsl_values, bins=20, alpha=0.7, color='#e74c3c', edgecolor='black')
-            ax2.set_xlabel('VSL (μm/s)')
-            ax2.set_ylabel('Frequency')
-            ax2.set_title('Straight Line Velocity Distribution')
+        if summary.video_metrics and summary.video_metrics.count_over_time:
+            chart_data['count_over_time'] = {
+                'times': [point['time'] for point in summary.video_metrics.count_over_time],
+                'counts': [point['count'] for point in summary.video_metrics.count_over_time]
+            }
         
-        plt.tight_layout()
-        return fig
+        return chart_data
     
-    def _create_count_over_time_chart(self, video_metrics):
-        """Create sperm count over time chart"""
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        times = [point['time'] for point in video_metrics.count_over_time]
-        counts = [point['count'] for point in video_metrics.count_over_time]
-        
-        ax.plot(times, counts, linewidth=2, color='#2c3e50')
-        ax.fill_between(times, counts, alpha=0.3, color='#3498db')
-        ax.set_xlabel('Time (seconds)')
-        ax.set_ylabel('Sperm Count')
-        ax.set_title('Sperm Count Over Time')
-        ax.grid(True, alpha=0.3)
-        
-        return fig
\ No newline at end of file
+    def _write_charts_archive(self, chart_files: List[Path], format: str, zip_path: Path):
+        """Write rendered charts into a zip archive"""
+        with zipfile.ZipFile(zip_path, 'w') as zipf:
+            for chart_file in chart_files:
+                # Strip the resolution suffix used for caching
+                zipf.write(chart_file, f"{chart_file.name.rsplit('_', 1)[0]}.{format}")
@@ -0,0 +1,118 @@
+"""
+Region of interest applied to decoded frames before detection
+Frames are cropped to the counting chamber; coordinates are mapped back to
+full-frame pixels afterwards
+"""
+
+from pathlib import Path
+from typing import Dict, Optional, Any, Tuple
+
+import cv2
+import numpy as np
+
+# ROI masks are only read from this directory
+MASKS_DIR = Path("config") / "masks"
+
+
+def resolve_mask_path(mask_path: str) -> Optional[Path]:
+    """
+    Resolve a mask name (relative to ``MASKS_DIR``) to its file
+
+    Returns None unless the path resolves to an existing file inside
+    ``MASKS_DIR``, so masks cannot name arbitrary server files.
+    """
+    masks_dir = MASKS_DIR.resolve()
+    path = (masks_dir / mask_path).resolve()
+    if not path.is_relative_to(masks_dir) or not path.is_file():
+        return None
+    return path
+
+
+class FrameROI:
+    """
+    Rectangular crop with an optional binary mask inside it
+
+    ``parameters['roi']`` accepts either a rectangle in full-frame pixels::
+
+        {"x": 40, "y": 30, "width": 560, "height": 420}
+
+    or a mask image in ``config/masks`` (non-zero pixels are kept), whose
+    bounding box becomes the crop::
+
+        {"mask_path": "scope-3.png"}
+
+    Both may be given; the crop is then the intersection.
+    """
+
+    def __init__(self, x: int, y: int, width: int, height: int, mask: Optional[np.ndarray] = None):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        # Boolean mask of the cropped region, or None for a plain rectangle
+        self.mask = mask
+
+    @classmethod
+    def from_parameters(cls, roi: Optional[Dict[str, Any]], frame_width: int, frame_height: int) -> Optional["FrameROI"]:
+        """Build the ROI for a frame size; returns None when it covers the whole frame"""
+        if not roi:
+            return None
+
+        x0, y0, x1, y1 = 0, 0, frame_width, frame_height
+        if 'width' in roi or 'height' in roi:
+            x0 = max(x0, int(roi.get('x', 0)))
+            y0 = max(y0, int(roi.get('y', 0)))
+            x1 = min(x1, x0 + int(roi.get('width', frame_width)))
+            y1 = min(y1, y0 + int(roi.get('height', frame_height)))
+
+        mask = None
+        if roi.get('mask_path'):
+            mask_file = resolve_mask_path(roi['mask_path'])
+            full_mask = cv2.imread(str(mask_file), cv2.IMREAD_GRAYSCALE) if mask_file else None
+            if full_mask is None:
+                raise ValueError(f"Could not load ROI mask: {roi['mask_path']}")
+            if full_mask.shape != (frame_height, frame_width):
+                full_mask = cv2.resize(full_mask, (frame_width, frame_height), interpolation=cv2.INTER_NEAREST)
+            ys, xs = np.nonzero(full_mask)
+            if len(xs) == 0:
+                raise ValueError(f"ROI mask is empty: {roi['mask_path']}")
+            x0, y0 = max(x0, int(xs.min())), max(y0, int(ys.min()))
+            x1, y1 = min(x1, int(xs.max()) + 1), min(y1, int(ys.max()) + 1)
+            mask = full_mask[y0:y1, x0:x1] > 0
+
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f"ROI does not intersect the {frame_width}x{frame_height} frame: {roi}")
+        if mask is None and (x0, y0, x1, y1) == (0, 0, frame_width, frame_height):
+            return None
+        if mask is not None and mask.all():
+            mask = None
+        return cls(x0, y0, x1 - x0, y1 - y0, mask)
+
+    @property
+    def offset(self) -> Tuple[int, int]:
+        return self.x, self.y
+
+    @property
+    def area(self) -> int:
+        """Pixels analyzed per frame"""
+        return int(self.mask.sum()) if self.mask is not None else self.width * self.height
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """Crop a full frame to the ROI; masked-out pixels are blanked"""
+        region = frame[self.y:self.y + self.height, self.x:self.x + self.width]
+        if self.mask is None:
+            return np.ascontiguousarray(region)
+        region = region.copy()
+        region[~self.mask] = 0
+        return region
+
+    def contains(self, x: float, y: float) -> bool:
+        """Whether a point in cropped coordinates lies inside the ROI"""
+        col, row = int(x), int(y)
+        if not (0 <= col < self.width and 0 <= row < self.height):
+            return False
+        return self.mask is None or bool(self.mask[row, col])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'x': self.x, 'y': self.y, 'width': self.width, 'height': self.height,
+                'masked': self.mask is not None, 'area': self.area}
@@ -0,0 +1,237 @@
+"""
+Frame sources for recordings that are not video files
+Multi-page TIFF stacks are read lazily behind the cv2.VideoCapture interface
+"""
+
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+
+from utils.logger import setup_logger
+
+try:
+    import tifffile
+except ImportError:  # pragma: no cover - only needed for TIFF stacks
+    tifffile = None
+
+logger = setup_logger()
+
+TIFF_SUFFIXES = {".tif", ".tiff"}
+
+# Frame rate assumed for stacks whose metadata carries no timing
+DEFAULT_STACK_FPS = 30.0
+
+# Frames sampled to pick the intensity scale of >8-bit stacks
+SCALE_SAMPLE_FRAMES = 5
+
+# Axes that can carry the frame sequence: time, plain page sequences, and Z
+# (ImageJ stacks saved without hyperstack metadata often store time as slices)
+FRAME_AXES = ('T', 'I', 'Q', 'Z')
+
+
+def is_frame_stack(path: Union[str, Path]) -> bool:
+    return Path(path).suffix.lower() in TIFF_SUFFIXES
+
+
+def open_frame_source(path: Union[str, Path], fps: Optional[float] = None):
+    """
+    Open a recording for frame-by-frame reading
+
+    Returns a TiffStackCapture for TIFF stacks and a cv2.VideoCapture
+    otherwise; both support ``read``/``grab``/``get``/``set``/``release``.
+    ``fps`` is used for stacks whose metadata has no frame timing.
+    """
+    if is_frame_stack(path):
+        return TiffStackCapture(str(path), fps)
+    return cv2.VideoCapture(str(path))
+
+
+def frame_timestamps(cap) -> Optional[np.ndarray]:
+    """Per-frame timestamps (seconds) when the source records them, else None"""
+    return getattr(cap, 'timestamps', None)
+
+
+class TiffStackCapture:
+    """
+    cv2.VideoCapture-compatible reader over a multi-page TIFF stack
+
+    Frames are read along the T axis (or the one page/Z axis of a plain
+    stack); multi-channel stacks are rejected. Uncompressed contiguous stacks
+    (ImageJ, most camera exports) are memory-mapped, anything else is decoded
+    page by page on demand, so only the current frame is ever in memory. Frames are returned as 8-bit BGR
+    like a decoded video; deeper stacks are scaled by one factor for the
+    whole stack so intensities stay comparable between frames.
+
+    Timing comes from, in order: OME-XML plane ``DeltaT``, Micro-Manager
+    per-frame ``ElapsedTime-ms``, ImageJ ``finterval``, then ``fps``.
+    ``timestamps`` holds seconds since the first frame; ``CAP_PROP_FPS`` is
+    the mean rate.
+    """
+
+    def __init__(self, path: str, fps: Optional[float] = None):
+        if tifffile is None:
+            raise RuntimeError("Reading TIFF stacks requires the tifffile package")
+        self.path = path
+        self._tif = tifffile.TiffFile(path)
+        series = self._tif.series[0]
+        axes = series.axes.upper()
+        if 'Y' not in axes or 'X' not in axes:
+            self._tif.close()
+            raise ValueError(f"TIFF series has no image axes: {series.axes}")
+
+        # Frames run along a single axis; several channels or Z planes per time
+        # point would otherwise be interleaved into one track sequence
+        leading = dict(zip(axes[:axes.index('Y')], series.shape[:axes.index('Y')]))
+        stacked = [axis for axis, size in leading.items() if size > 1]
+        if len(stacked) > 1 or (stacked and stacked[0] not in FRAME_AXES):
+            self._tif.close()
+            raise ValueError(
+                f"TIFF stack {series.axes} {series.shape} has more than one channel or plane per frame; "
+                "export a single-channel time series"
+            )
+        self.frame_count = int(leading[stacked[0]]) if stacked else 1
+        self.height = int(series.shape[axes.index('Y')])
+        self.width = int(series.shape[axes.index('X')])
+        frame_shape = tuple(series.shape[axes.index('Y'):])
+
+        try:
+            data = tifffile.memmap(path, series=0, mode='r')
+            self._frames = data.reshape((self.frame_count,) + frame_shape)
+            self._pages = None
+        except ValueError:
+            # Compressed or scattered strips: decode pages on demand
+            self._frames = None
+            self._pages = series.pages
+            if len(self._pages) != self.frame_count:
+                self.frame_count = len(self._pages)
+
+        self.timestamps, self.timestamp_source = self._read_timestamps(fps)
+        if self.frame_count > 1 and self.timestamps[-1] > 0:
+            self.fps = (self.frame_count - 1) / float(self.timestamps[-1])
+        else:
+            self.fps = fps or DEFAULT_STACK_FPS
+        self._scale = self._intensity_scale(series.dtype)
+        self._position = 0
+        self._opened = True
+        logger.info(
+            f"TIFF stack {path}: {self.frame_count} frames {self.width}x{self.height} {series.dtype}, "
+            f"{'memory-mapped' if self._frames is not None else 'page-wise'}, "
+            f"{self.fps:.2f} fps from {self.timestamp_source}"
+        )
+
+    def _raw_frame(self, index: int) -> np.ndarray:
+        if self._frames is not None:
+            return self._frames[index]
+        return self._pages[index].asarray()
+
+    def _read_timestamps(self, fps: Optional[float]):
+        """Seconds since the first frame, and which metadata they came from"""
+        n = self.frame_count
+        try:
+            if self._tif.ome_metadata:
+                delta_t = self._ome_delta_t(self._tif.ome_metadata)
+                if delta_t is not None and len(delta_t) == n:
+                    return delta_t - delta_t[0], "ome"
+
+            if self._tif.is_micromanager and self._pages is not None:
+                elapsed = []
+                for page in self._pages:
+                    tag = page.tags.get('MicroManagerMetadata')
+                    if tag is None or 'ElapsedTime-ms' not in tag.value:
+                        break
+                    elapsed.append(float(tag.value['ElapsedTime-ms']) / 1000)
+                if len(elapsed) == n:
+                    elapsed = np.array(elapsed)
+                    return elapsed - elapsed[0], "micromanager"
+
+            imagej = self._tif.imagej_metadata or {}
+            if imagej.get('finterval'):
+                return np.arange(n) * float(imagej['finterval']), "imagej"
+        except Exception as e:
+            logger.warning(f"Could not read TIFF timing metadata of {self.path}: {str(e)}")
+
+        rate = fps or DEFAULT_STACK_FPS
+        if not fps:
+            logger.warning(f"No frame timing in {self.path}; assuming {rate} fps")
+        return np.arange(n) / rate, "fps" if fps else "default"
+
+    @staticmethod
+    def _ome_delta_t(ome_xml: str) -> Optional[np.ndarray]:
+        """Plane DeltaT values of the first OME image, in seconds and plane order"""
+        root = ElementTree.fromstring(ome_xml)
+        namespace = root.tag.split('}')[0] + '}' if root.tag.startswith('{') else ''
+        pixels = root.find(f"{namespace}Image/{namespace}Pixels")
+        if pixels is None:
+            return None
+        planes = pixels.findall(f"{namespace}Plane")
+        if not planes or any(plane.get('DeltaT') is None for plane in planes):
+            return None
+        units = {'s': 1.0, 'ms': 1e-3, 'µs': 1e-6, 'us': 1e-6, 'min': 60.0}
+        scale = units.get(planes[0].get('DeltaTUnit', 's'), 1.0)
+        return np.array([float(plane.get('DeltaT')) for plane in planes]) * scale
+
+    def _intensity_scale(self, dtype) -> float:
+        """Factor mapping stack intensities to 0-255"""
+        if np.dtype(dtype) == np.uint8:
+            return 1.0
+        sample = np.linspace(0, self.frame_count - 1, min(SCALE_SAMPLE_FRAMES, self.frame_count)).astype(int)
+        peak = max(float(np.max(self._raw_frame(int(i)))) for i in sample)
+        return 255.0 / peak if peak > 0 else 1.0
+
+    def _to_bgr(self, frame: np.ndarray) -> np.ndarray:
+        if self._scale != 1.0 or frame.dtype != np.uint8:
+            frame = np.clip(frame.astype(np.float32) * self._scale, 0, 255).astype(np.uint8)
+        if frame.ndim == 2:
+            return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        if frame.shape[2] == 4:
+            return cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+        if frame.shape[2] == 3:
+            return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        return cv2.cvtColor(np.ascontiguousarray(frame[:, :, 0]), cv2.COLOR_GRAY2BGR)
+
+    # cv2.VideoCapture interface
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._position)
+        return 0.0
+
+    def set(self, prop: int, value: float) -> bool:
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self._position = int(min(max(value, 0), self.frame_count))
+        return True
+
+    def grab(self) -> bool:
+        if not self._opened or self._position >= self.frame_count:
+            return False
+        self._position += 1
+        return True
+
+    def read(self):
+        if not self._opened or self._position >= self.frame_count:
+            return False, None
+        frame = self._to_bgr(self._raw_frame(self._position))
+        self._position += 1
+        return True, frame
+
+    def release(self):
+        if self._opened:
+            self._frames = None
+            self._pages = None
+            self._tif.close()
+            self._opened = False
@@ -0,0 +1,121 @@
+"""
+Background sampling of system health
+Probes read the latest snapshot instead of measuring on the request path
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Optional, Any
+
+import psutil
+import torch
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Seconds between samples; CPU usage is averaged over this interval
+HEALTH_SAMPLE_INTERVAL = 5.0
+
+# A snapshot older than this many intervals means the sampler has stalled
+STALE_AFTER_INTERVALS = 3
+
+# Uploads and results need disk: above this usage the instance is not ready
+READINESS_MAX_DISK_PERCENT = 95.0
+
+
+class HealthMonitor:
+    """
+    Periodically samples CPU, memory, disk, GPU and queue depth
+
+    ``analysis_service`` supplies the queue stats (``queue_stats()`` and
+    ``pending_work()``). Model state is a couple of attribute reads, so
+    probes pass it in rather than it being sampled.
+    """
+
+    def __init__(self, analysis_service=None, interval: float = HEALTH_SAMPLE_INTERVAL, disk_path: str = '/'):
+        self.analysis_service = analysis_service
+        self.interval = interval
+        self.disk_path = disk_path
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self._sampled_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the sampling task on the running event loop"""
+        if self._task is not None and not self._task.done():
+            return
+        # The first cpu_percent call only sets the reference point
+        psutil.cpu_percent(interval=None)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # psutil and CUDA queries are syscalls; keep them off the event loop
+                self.snapshot = await loop.run_in_executor(None, self.sample)
+                self._sampled_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"Health sampling failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def sample(self) -> Dict[str, Any]:
+        """Take one snapshot (blocking; CPU usage is since the previous sample)"""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+
+        gpu_available = torch.cuda.is_available()
+        gpu_memory = None
+        if gpu_available:
+            gpu_memory = {
+                "total": torch.cuda.get_device_properties(0).total_memory,
+                "allocated": torch.cuda.memory_allocated(),
+                "cached": torch.cuda.memory_reserved()
+            }
+
+        queue = None
+        if self.analysis_service is not None:
+            queue = {
+                **self.analysis_service.queue_stats(),
+                "pending_megapixel_frames": self.analysis_service.pending_work()
+            }
+
+        return {
+            "sampled_at": datetime.now(),
+            "system_info": {
+                "cpu_percent": psutil.cpu_percent(interval=None),
+                "memory_percent": memory.percent,
+                "disk_percent": disk.percent,
+                "gpu_available": gpu_available,
+                "gpu_memory": gpu_memory
+            },
+            "queue": queue
+        }
+
+    def is_stale(self) -> bool:
+        if self._sampled_at is None:
+            return True
+        return time.monotonic() - self._sampled_at > self.interval * STALE_AFTER_INTERVALS
+
+    def readiness(self, model_state: Dict[str, Any]) -> Dict[str, Any]:
+        """Whether this instance should receive analysis traffic, and why not"""
+        problems = []
+        if not model_state.get("initialized"):
+            problems.append("model not initialized")
+        if self.is_stale():
+            problems.append("health sampling stalled")
+        elif self.snapshot["system_info"]["disk_percent"] >= READINESS_MAX_DISK_PERCENT:
+            problems.append("disk nearly full")
+        return {"ready": not problems, "problems": problems}
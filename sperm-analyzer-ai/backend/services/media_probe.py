@@ -0,0 +1,147 @@
+"""
+Upload-time media probing
+Reads container headers (and decodes a single frame) so unusable uploads are
+rejected before they are queued, and records what the analysis will cost
+"""
+
+import math
+import os
+import time
+from typing import Dict, Optional, Any
+
+import cv2
+from PIL import Image, UnidentifiedImageError
+
+from models.analysis_models import MediaInfo
+from services.frame_sequence import TiffStackCapture, is_frame_stack
+from services.model_service import analysis_frame_step
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class MediaProbeError(ValueError):
+    """The upload cannot be analyzed (unreadable, undecodable or empty)"""
+
+
+def _fourcc_name(value: float) -> Optional[str]:
+    code = int(value)
+    if code <= 0:
+        return None
+    name = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+    return name.lower() if name.isprintable() and name else None
+
+
+def probe_media(path: str, analysis_type: str) -> MediaInfo:
+    """
+    Probe an uploaded file without analyzing it
+
+    Videos are opened with the same decoder the analysis uses; only the
+    header properties are read and one frame is decoded to prove the codec
+    works. TIFF stacks read their metadata and first page, and still images
+    only their header. Raises MediaProbeError for anything unusable.
+    """
+    start = time.perf_counter()
+    file_size = os.path.getsize(path)
+    if file_size == 0:
+        raise MediaProbeError("Uploaded file is empty")
+
+    if analysis_type == "image":
+        info = _probe_image(path)
+    elif is_frame_stack(path):
+        info = _probe_stack(path)
+    else:
+        info = _probe_video(path)
+
+    info.file_size = file_size
+    info.probe_ms = (time.perf_counter() - start) * 1000
+    return info
+
+
+def _probe_video(path: str) -> MediaInfo:
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise MediaProbeError("Unsupported or corrupt video container")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        codec = _fourcc_name(cap.get(cv2.CAP_PROP_FOURCC))
+        ok, frame = cap.read()
+        if not ok or frame is None:
+            raise MediaProbeError(f"Video stream cannot be decoded (codec: {codec or 'unknown'})")
+    finally:
+        cap.release()
+
+    if fps <= 0 or frame_count <= 0:
+        raise MediaProbeError("Video has no frame rate or frame count")
+    return MediaInfo(
+        kind="video",
+        codec=codec,
+        fps=fps,
+        frame_count=frame_count,
+        width=width or frame.shape[1],
+        height=height or frame.shape[0],
+        duration=frame_count / fps
+    )
+
+
+def _probe_stack(path: str) -> MediaInfo:
+    try:
+        cap = TiffStackCapture(path)
+    except Exception as e:
+        raise MediaProbeError(f"Unreadable TIFF stack: {str(e)}")
+    try:
+        ok, _ = cap.read()
+        if not ok:
+            raise MediaProbeError("TIFF stack has no readable frames")
+        return MediaInfo(
+            kind="stack",
+            codec="tiff",
+            fps=cap.fps,
+            frame_count=cap.frame_count,
+            width=cap.width,
+            height=cap.height,
+            duration=cap.frame_count / cap.fps if cap.fps > 0 else 0.0,
+            timestamp_source=cap.timestamp_source
+        )
+    except MediaProbeError:
+        raise
+    except Exception as e:
+        raise MediaProbeError(f"TIFF stack cannot be decoded: {str(e)}")
+    finally:
+        cap.release()
+
+
+def _probe_image(path: str) -> MediaInfo:
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            codec = (image.format or "").lower() or None
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise MediaProbeError("Unsupported or corrupt image")
+    return MediaInfo(kind="image", codec=codec, frame_count=1, width=width, height=height)
+
+
+def estimate_cost(info: MediaInfo, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Expected work of an analysis, for queue ordering and time estimates
+
+    ``analyzed_frames`` accounts for ``target_fps`` subsampling;
+    ``megapixel_frames`` (analyzed frames x analyzed megapixels) is the
+    quantity detection time scales with.
+    """
+    parameters = parameters or {}
+    frame_step = analysis_frame_step(info.fps or 0, parameters.get('target_fps')) if info.kind != "image" else 1
+    analyzed_frames = math.ceil(info.frame_count / frame_step)
+
+    roi = parameters.get('roi') or {}
+    width = min(roi.get('width') or info.width, info.width)
+    height = min(roi.get('height') or info.height, info.height)
+    return {
+        'analyzed_frames': analyzed_frames,
+        'frame_step': frame_step,
+        'megapixel_frames': analyzed_frames * width * height / 1e6
+    }
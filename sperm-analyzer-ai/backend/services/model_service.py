@@ -9,15 +9,44 @@ from ultralytics import YOLO
 from deep_sort_realtime import DeepSort
 from pathlib import Path
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Dict, Any, Optional
 import os
 import json
+import time
 
 from utils.logger import setup_logger
+from utils.stage_timer import StageTimer
 from models.analysis_models import SpermDetection, SpermTrack
+from services.frame_roi import FrameROI
+from services.motion_tracker import MotionTracker
+from services.frame_sequence import open_frame_source, frame_timestamps
 
 logger = setup_logger()
 
+# Detections are cached down to this confidence (or the running threshold, if
+# lower) so re-analysis can raise or lower the threshold without re-running YOLO
+DETECTION_CACHE_MIN_CONFIDENCE = 0.1
+
+# Box size handed to the tracker around each detected head center
+TRACK_BOX_WIDTH = 20   # Estimated sperm width
+TRACK_BOX_HEIGHT = 15  # Estimated sperm height
+
+# Farthest (pixels) a head may be from its predicted position to continue a motion-only track
+TRACK_MAX_STEP = 40.0
+
+# Still images per model call in batch image analysis
+IMAGE_BATCH_SIZE = 16
+
+# Threads decoding the next batch of images while the current one is inferred
+IMAGE_DECODE_WORKERS = 4
+
+def analysis_frame_step(fps: float, target_fps: Optional[float]) -> int:
+    """Analyze every n-th frame so the analyzed rate is as close as possible to ``target_fps``"""
+    if not target_fps or fps <= 0 or target_fps >= fps:
+        return 1
+    return max(1, int(round(fps / target_fps)))
+
 class ModelService:
     """Service for managing YOLOv8 model and tracking"""
     
@@ -27,7 +56,11 @@ class ModelService:
         self.model_path = "models/sperm_yolov8.pt"
         self.confidence_threshold = 0.25
         self.iou_threshold = 0.45
+        # Detector input size in pixels (YOLO ``imgsz``); None keeps the size the model was trained at
+        self.inference_size: Optional[int] = None
         self.is_initialized = False
+        # Worker pool for segment-parallel video processing, created on first use
+        self.segment_processor = None
         
     async def initialize(self):
         """Initialize model and tracker"""
@@ -67,6 +100,13 @@ class ModelService:
             logger.info("Falling back to base YOLOv8 model")
             self.model = YOLO('yolov8n.pt')
     
+    def load_for_inference(self):
+        """Load existing weights and a tracker synchronously, never training (for worker processes)"""
+        model_path = self.model_path if os.path.exists(self.model_path) else 'yolov8n.pt'
+        self.model = YOLO(model_path)
+        self._initialize_tracker()
+        self.is_initialized = True
+    
     async def _create_and_train_model(self):
         """Create and train YOLOv8 model for sperm detection"""
         logger.info("Training new sperm detection model...")
@@ -123,61 +163,53 @@ class ModelService:
         
         logger.info(f"Dataset configuration created: {config_path}")
     
+    def create_tracker(self, max_age: int = 30, n_init: int = 3, max_cosine_distance: float = 0.2,
+                       embedder: Optional[str] = "mobilenet") -> DeepSort:
+        """Create a DeepSORT tracker; with ``embedder=None`` appearance features must be supplied"""
+        return DeepSort(
+            max_age=max_age,
+            n_init=n_init,
+            nms_max_overlap=1.0,
+            max_cosine_distance=max_cosine_distance,
+            nn_budget=None,
+            override_track_class=None,
+            embedder=embedder,
+            half=True,
+            bgr=True,
+            embedder_gpu=torch.cuda.is_available(),
+            embedder_model_name=None,
+            embedder_wts=None,
+            polygon=False,
+            today=None
+        )
+    
+    def create_motion_tracker(self, max_age: int = 30, n_init: int = 3,
+                              max_step: float = TRACK_MAX_STEP) -> MotionTracker:
+        """Create a motion-only tracker, for re-tracking detections without their frames"""
+        return MotionTracker(max_age=max_age, n_init=n_init, max_step=max_step)
+    
     def _initialize_tracker(self):
         """Initialize DeepSORT tracker"""
         try:
-            self.tracker = DeepSort(
-                max_age=30,
-                n_init=3,
-                nms_max_overlap=1.0,
-                max_cosine_distance=0.2,
-                nn_budget=None,
-                override_track_class=None,
-                embedder="mobilenet",
-                half=True,
-                bgr=True,
-                embedder_gpu=torch.cuda.is_available(),
-                embedder_model_name=None,
-                embedder_wts=None,
-                polygon=False,
-                today=None
-            )
+            self.tracker = self.create_tracker()
             logger.info("DeepSORT tracker initialized")
         except Exception as e:
             logger.error(f"Tracker initialization failed: {str(e)}")
             self.tracker = None
     
-    def detect_sperm(self, frame: np.ndarray) -> List[SpermDetection]:
-        """Detect sperm in a single frame"""
+    def detect_sperm(self, frame: np.ndarray, confidence: Optional[float] = None) -> List[SpermDetection]:
+        """Detect sperm in a single frame (at ``confidence_threshold`` unless overridden)"""
         if not self.model:
             return []
         
         try:
             # Run inference
-            results = self.model(frame, conf=self.confidence_threshold, iou=self.iou_threshold)
+            conf = confidence if confidence is not None else self.confidence_threshold
+            results = self.model(frame, conf=conf, iou=self.iou_threshold, **self._inference_options())
             
             detections = []
             for r in results:
-                boxes = r.boxes
-                if boxes is not None:
-                    for i, box in enumerate(boxes):
-                        # Extract detection data
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = box.conf[0].cpu().numpy()
-                        
-                        # Calculate center point
-                        x_center = (x1 + x2) / 2
-                        y_center = (y1 + y2) / 2
-                        
-                        detection = SpermDetection(
-                            id=i,
-                            x=float(x_center),
-                            y=float(y_center),
-                            confidence=float(confidence),
-                            frame_number=0,  # Will be set by caller
-                            timestamp=0.0    # Will be set by caller
-                        )
-                        detections.append(detection)
+                detections.extend(self._parse_detections(r))
             
             return detections
             
@@ -185,28 +217,73 @@ class ModelService:
             logger.error(f"Detection failed: {str(e)}")
             return []
     
-    def update_tracker(self, detections: List[SpermDetection], frame: np.ndarray) -> List[Dict]:
-        """Update tracker with new detections"""
-        if not self.tracker or not detections:
+    def detect_sperm_batch(self, frames: List[np.ndarray], confidence: Optional[float] = None) -> List[List[SpermDetection]]:
+        """Detect sperm in several frames with one model call per IMAGE_BATCH_SIZE frames"""
+        if not self.model:
+            return [[] for _ in frames]
+        
+        conf = confidence if confidence is not None else self.confidence_threshold
+        batch_detections = []
+        for start in range(0, len(frames), IMAGE_BATCH_SIZE):
+            batch = frames[start:start + IMAGE_BATCH_SIZE]
+            try:
+                results = self.model(batch, conf=conf, iou=self.iou_threshold, verbose=False,
+                                     **self._inference_options())
+                batch_detections.extend(self._parse_detections(r) for r in results)
+            except Exception as e:
+                logger.error(f"Batch detection failed: {str(e)}")
+                batch_detections.extend([] for _ in batch)
+        return batch_detections
+    
+    def _inference_options(self) -> Dict[str, Any]:
+        return {'imgsz': self.inference_size} if self.inference_size else {}
+    
+    def _parse_detections(self, result) -> List[SpermDetection]:
+        """Head centers of one YOLO result's boxes"""
+        detections = []
+        boxes = result.boxes
+        if boxes is None:
+            return detections
+        
+        xyxy = boxes.xyxy.cpu().numpy()
+        confidences = boxes.conf.cpu().numpy()
+        for i, ((x1, y1, x2, y2), confidence) in enumerate(zip(xyxy, confidences)):
+            detections.append(SpermDetection(
+                id=i,
+                x=float((x1 + x2) / 2),
+                y=float((y1 + y2) / 2),
+                confidence=float(confidence),
+                frame_number=0,  # Will be set by caller
+                timestamp=0.0    # Will be set by caller
+            ))
+        return detections
+    
+    def update_tracker(self, detections: List[SpermDetection], frame: Optional[np.ndarray] = None,
+                       tracker: Optional[Any] = None, embeds: Optional[List[np.ndarray]] = None) -> List[Dict]:
+        """
+        Update tracker with new detections
+
+        Frames without detections still advance the tracker so unmatched
+        tracks age out. ``tracker`` replaces ``self.tracker`` (e.g. a motion
+        tracker for re-tracking, which needs neither frame nor ``embeds``).
+        """
+        tracker = tracker or self.tracker
+        if not tracker:
             return []
         
         try:
-            # Convert detections to format expected by DeepSORT
+            # Convert detections to DeepSORT's ([left, top, width, height], confidence, class) format
             detection_list = []
             for det in detections:
                 # Convert center point to bbox
-                bbox_width = 20  # Estimated sperm width
-                bbox_height = 15  # Estimated sperm height
-                
-                x1 = det.x - bbox_width/2
-                y1 = det.y - bbox_height/2
-                x2 = det.x + bbox_width/2
-                y2 = det.y + bbox_height/2
-                
-                detection_list.append([x1, y1, x2, y2, det.confidence])
+                x1 = det.x - TRACK_BOX_WIDTH / 2
+                y1 = det.y - TRACK_BOX_HEIGHT / 2
+                detection_list.append(([x1, y1, TRACK_BOX_WIDTH, TRACK_BOX_HEIGHT], det.confidence, 'sperm'))
             
             # Update tracker
-            tracks = self.tracker.update_tracks(detection_list, frame=frame)
+            if embeds is None and not detection_list:
+                embeds = []
+            tracks = tracker.update_tracks(detection_list, embeds=embeds, frame=frame)
             
             # Convert tracks to our format
             track_results = []
@@ -227,16 +304,190 @@ class ModelService:
             logger.error(f"Tracking failed: {str(e)}")
             return []
     
-    async def process_video(self, video_path: str) -> Dict[str, Any]:
-        """Process entire video for sperm detection and tracking"""
+    def track_frames(self, cap: cv2.VideoCapture, fps: float, total_frames: int,
+                     start_frame: int = 0, end_frame: Optional[int] = None,
+                     roi: Optional[FrameROI] = None, frame_step: int = 1,
+                     timestamps: Optional[np.ndarray] = None,
+                     timer: Optional[StageTimer] = None) -> Tuple[List[Dict], Dict[Any, List[Dict]]]:
+        """
+        Detect and track sperm in frames ``[start_frame, end_frame)`` of an open capture
+
+        The capture must already be positioned at ``start_frame``; with
+        ``end_frame=None`` frames are read until the end of the stream.
+        With an ROI, each frame is cropped right after decode and detection
+        and tracking run on the crop; returned coordinates are full-frame.
+        With ``frame_step`` > 1 only frames whose number is a multiple of it
+        are analyzed; the others are skipped with ``grab()``, which never
+        converts or copies them out of the decoder. Timestamps are
+        ``frame_number / fps``, or ``timestamps[frame_number]`` when the
+        source records per-frame times (TIFF stacks), so CASA kinematics see
+        the true intervals.
+        With a ``timer``, each analyzed frame records decode (including
+        skipped frames before it), preprocess, inference and tracking times.
+        Returns the per-frame detection records and the track histories.
+        """
+        all_tracks = {}
+        frame_detections = []
+        frame_number = start_frame
+        skipped_time = 0.0
+        
+        while end_frame is None or frame_number < end_frame:
+            started = time.perf_counter()
+            if frame_number % frame_step:
+                if not cap.grab():
+                    break
+                frame_number += 1
+                skipped_time += time.perf_counter() - started
+                continue
+            
+            ret, frame = cap.read()
+            if not ret:
+                break
+            decoded = time.perf_counter()
+            
+            if timestamps is not None and frame_number < len(timestamps):
+                timestamp = float(timestamps[frame_number])
+            else:
+                timestamp = frame_number / fps if fps > 0 else frame_number
+            
+            if roi is not None:
+                frame = roi.crop(frame)
+            preprocessed = time.perf_counter()
+            
+            # Detect sperm in current frame, down to the cache floor
+            candidates = self.detect_sperm(frame, confidence=min(self.confidence_threshold, DETECTION_CACHE_MIN_CONFIDENCE))
+            if roi is not None and roi.mask is not None:
+                candidates = [det for det in candidates if roi.contains(det.x, det.y)]
+            detections = [det for det in candidates if det.confidence >= self.confidence_threshold]
+            inferred = time.perf_counter()
+            
+            # Update detections with frame info
+            for det in detections:
+                det.frame_number = frame_number
+                det.timestamp = timestamp
+            
+            # Update tracker
+            tracks = self.update_tracker(detections, frame)
+            if roi is not None:
+                self._map_to_full_frame(candidates, tracks, roi)
+            
+            # Store results
+            self._record_frame(frame_detections, all_tracks, frame_number, timestamp, len(detections), tracks)
+            # Full-frame (x, y, confidence) of every candidate, persisted by DetectionCache
+            frame_detections[-1]['raw_detections'] = np.array(
+                [(det.x, det.y, det.confidence) for det in candidates], dtype=np.float32
+            ).reshape(-1, 3)
+            
+            if timer is not None:
+                timer.record('decode', skipped_time + decoded - started)
+                timer.record('preprocess', preprocessed - decoded)
+                timer.record('inference', inferred - preprocessed)
+                timer.record('tracking', time.perf_counter() - inferred)
+            skipped_time = 0.0
+            frame_number += 1
+            
+            # Log progress every 100 frames
+            if frame_number % 100 == 0:
+                logger.info(f"Processed {frame_number}/{total_frames} frames")
+        
+        return frame_detections, all_tracks
+    
+    def _record_frame(self, frame_detections: List[Dict], all_tracks: Dict[Any, List[Dict]],
+                      frame_number: int, timestamp: float, detection_count: int, tracks: List[Dict]):
+        """Append a frame record and extend the track histories"""
+        frame_detections.append({
+            'frame_number': frame_number,
+            'timestamp': timestamp,
+            'detection_count': detection_count,
+            'tracks': tracks
+        })
+        
+        # Update track history
+        for track in tracks:
+            track_id = track['track_id']
+            if track_id not in all_tracks:
+                all_tracks[track_id] = []
+            
+            # Convert bbox to center point
+            bbox = track['bbox']
+            x_center = (bbox[0] + bbox[2]) / 2
+            y_center = (bbox[1] + bbox[3]) / 2
+            
+            all_tracks[track_id].append({
+                'frame_number': frame_number,
+                'timestamp': timestamp,
+                'x': x_center,
+                'y': y_center,
+                'confidence': track['confidence']
+            })
+    
+    def retrack_detections(self, cached: Dict[str, Any], confidence_threshold: float,
+                           timer: Optional[StageTimer] = None, **tracker_params) -> Tuple[List[Dict], Dict[Any, List[Dict]]]:
+        """
+        Re-run tracking over cached per-frame detections (see DetectionCache)
+
+        No frames are decoded and no inference runs. Without frames there are
+        no appearance features, so association uses the motion-only tracker;
+        ``tracker_params`` go to ``create_motion_tracker``.
+        Returns the same structure as ``track_frames``.
+        """
+        tracker = self.create_motion_tracker(**tracker_params)
+        fps = cached['meta']['video_properties']['fps']
+        timestamps = cached.get('frame_timestamps')
+        offsets = cached['frame_offsets']
+        x, y, confidence = cached['x'], cached['y'], cached['confidence']
+        
+        all_tracks = {}
+        frame_detections = []
+        for index, frame_number in enumerate(cached['frame_numbers']):
+            started = time.perf_counter()
+            frame_number = int(frame_number)
+            if timestamps is not None:
+                timestamp = float(timestamps[index])
+            else:
+                timestamp = frame_number / fps if fps > 0 else frame_number
+            rows = np.arange(offsets[index], offsets[index + 1])
+            rows = rows[confidence[rows] >= confidence_threshold]
+            detections = [
+                SpermDetection(id=i, x=float(x[row]), y=float(y[row]), confidence=float(confidence[row]),
+                               frame_number=frame_number, timestamp=timestamp)
+                for i, row in enumerate(rows)
+            ]
+            tracks = self.update_tracker(detections, tracker=tracker)
+            self._record_frame(frame_detections, all_tracks, frame_number, timestamp, len(detections), tracks)
+            if timer is not None:
+                timer.record('tracking', time.perf_counter() - started)
+        
+        return frame_detections, all_tracks
+    
+    def _map_to_full_frame(self, detections: List[SpermDetection], tracks: List[Dict], roi: FrameROI):
+        """Shift detections and track boxes from ROI coordinates to full-frame pixels"""
+        dx, dy = roi.offset
+        for det in detections:
+            det.x += dx
+            det.y += dy
+        for track in tracks:
+            x1, y1, x2, y2 = track['bbox']
+            track['bbox'] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+    
+    async def process_video(self, video_path: str, roi: Optional[Dict[str, Any]] = None,
+                            target_fps: Optional[float] = None, stack_fps: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Process entire video for sperm detection and tracking
+
+        ``roi`` is an ``AnalysisRequest.parameters['roi']`` spec (see FrameROI).
+        ``target_fps`` subsamples high-frame-rate recordings to about that rate.
+        TIFF stacks are read lazily with timestamps from their metadata;
+        ``stack_fps`` applies to stacks without timing metadata.
+        """
         if not self.is_initialized:
             raise RuntimeError("Model service not initialized")
         
         logger.info(f"Processing video: {video_path}")
         
         try:
-            # Open video
-            cap = cv2.VideoCapture(video_path)
+            # Open video (or frame stack)
+            cap = open_frame_source(video_path, stack_fps)
             if not cap.isOpened():
                 raise ValueError(f"Could not open video file: {video_path}")
             
@@ -249,61 +500,22 @@ class ModelService:
             
             logger.info(f"Video properties: {width}x{height}, {fps} fps, {total_frames} frames, {duration:.2f}s")
             
-            # Process frames
-            all_tracks = {}
-            frame_detections = []
-            frame_number = 0
+            frame_roi = FrameROI.from_parameters(roi, width, height)
+            if frame_roi is not None:
+                logger.info(f"Analyzing ROI {frame_roi.to_dict()} ({frame_roi.area / (width * height):.0%} of frame)")
             
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                timestamp = frame_number / fps if fps > 0 else frame_number
-                
-                # Detect sperm in current frame
-                detections = self.detect_sperm(frame)
-                
-                # Update detections with frame info
-                for det in detections:
-                    det.frame_number = frame_number
-                    det.timestamp = timestamp
-                
-                # Update tracker
-                tracks = self.update_tracker(detections, frame)
-                
-                # Store results
-                frame_detections.append({
-                    'frame_number': frame_number,
-                    'timestamp': timestamp,
-                    'detection_count': len(detections),
-                    'tracks': tracks
-                })
-                
-                # Update track history
-                for track in tracks:
-                    track_id = track['track_id']
-                    if track_id not in all_tracks:
-                        all_tracks[track_id] = []
-                    
-                    # Convert bbox to center point
-                    bbox = track['bbox']
-                    x_center = (bbox[0] + bbox[2]) / 2
-                    y_center = (bbox[1] + bbox[3]) / 2
-                    
-                    all_tracks[track_id].append({
-                        'frame_number': frame_number,
-                        'timestamp': timestamp,
-                        'x': x_center,
-                        'y': y_center,
-                        'confidence': track['confidence']
-                    })
-                
-                frame_number += 1
-                
-                # Log progress every 100 frames
-                if frame_number % 100 == 0:
-                    logger.info(f"Processed {frame_number}/{total_frames} frames")
+            frame_step = analysis_frame_step(fps, target_fps)
+            effective_fps = fps / frame_step if fps > 0 else fps
+            if frame_step > 1:
+                logger.info(f"Analyzing every {frame_step} frames ({effective_fps:.1f} fps)")
+            
+            # Process frames
+            timer = StageTimer()
+            frame_detections, all_tracks = self.track_frames(
+                cap, fps, total_frames, roi=frame_roi, frame_step=frame_step, timestamps=frame_timestamps(cap),
+                timer=timer
+            )
+            frame_number = len(frame_detections)
             
             cap.release()
             
@@ -314,10 +526,15 @@ class ModelService:
                     'height': height,
                     'fps': fps,
                     'total_frames': total_frames,
-                    'duration': duration
+                    'duration': duration,
+                    'roi': frame_roi.to_dict() if frame_roi else None,
+                    'effective_fps': effective_fps,
+                    'frame_step': frame_step,
+                    'detection_confidence_floor': min(self.confidence_threshold, DETECTION_CACHE_MIN_CONFIDENCE)
                 },
                 'frame_detections': frame_detections,
                 'tracks': all_tracks,
+                'timings': timer,
                 'summary': {
                     'total_tracks': len(all_tracks),
                     'frames_processed': frame_number,
@@ -332,7 +549,36 @@ class ModelService:
             logger.error(f"Video processing failed: {str(e)}")
             raise
     
-    async def process_image(self, image_path: str) -> Dict[str, Any]:
+    async def process_video_segmented(self, video_path: str, segments: int,
+                                      roi: Optional[Dict[str, Any]] = None,
+                                      target_fps: Optional[float] = None,
+                                      stack_fps: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Process a video as overlapping segments in parallel worker processes
+
+        Returns the same structure as ``process_video``; tracks crossing a
+        segment boundary are stitched back together.
+        """
+        if not self.is_initialized:
+            raise RuntimeError("Model service not initialized")
+        
+        from services.segmented_video import SegmentedVideoProcessor
+        if self.segment_processor is None:
+            self.segment_processor = SegmentedVideoProcessor(self.confidence_threshold, self.iou_threshold)
+        
+        logger.info(f"Processing video in up to {segments} segments: {video_path}")
+        try:
+            return await self.segment_processor.process(video_path, segments, roi, target_fps, stack_fps)
+        except Exception as e:
+            logger.error(f"Segmented video processing failed: {str(e)}")
+            raise
+    
+    def shutdown(self):
+        """Stop the segment worker processes, if any were started"""
+        if self.segment_processor is not None:
+            self.segment_processor.shutdown()
+    
+    async def process_image(self, image_path: str, roi: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Process single image for sperm detection"""
         if not self.is_initialized:
             raise RuntimeError("Model service not initialized")
@@ -340,15 +586,26 @@ class ModelService:
         logger.info(f"Processing image: {image_path}")
         
         try:
+            timer = StageTimer()
+            
             # Load image
-            image = cv2.imread(image_path)
+            with timer.stage('decode'):
+                image = cv2.imread(image_path)
             if image is None:
                 raise ValueError(f"Could not load image: {image_path}")
             
             height, width = image.shape[:2]
             
-            # Detect sperm
-            detections = self.detect_sperm(image)
+            # Detect sperm, on the ROI only when one is set
+            with timer.stage('preprocess'):
+                frame_roi = FrameROI.from_parameters(roi, width, height)
+                frame = frame_roi.crop(image) if frame_roi is not None else image
+            with timer.stage('inference'):
+                detections = self.detect_sperm(frame)
+            if frame_roi is not None:
+                detections = [det for det in detections if frame_roi.contains(det.x, det.y)]
+                self._map_to_full_frame(detections, [], frame_roi)
+            analyzed_area = frame_roi.area if frame_roi else width * height
             
             # Update detections with image info
             for i, det in enumerate(detections):
@@ -360,12 +617,14 @@ class ModelService:
             results = {
                 'image_properties': {
                     'width': width,
-                    'height': height
+                    'height': height,
+                    'roi': frame_roi.to_dict() if frame_roi else None
                 },
                 'detections': [det.dict() for det in detections],
+                'timings': timer,
                 'summary': {
                     'total_detections': len(detections),
-                    'detection_density': len(detections) / (width * height) * 1000000  # per megapixel
+                    'detection_density': len(detections) / analyzed_area * 1000000  # per megapixel
                 }
             }
             
@@ -374,4 +633,89 @@ class ModelService:
             
         except Exception as e:
             logger.error(f"Image processing failed: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    async def process_image_batch(self, image_paths: List[str], roi: Optional[Dict[str, Any]] = None,
+                                  progress=None) -> Dict[str, Any]:
+        """
+        Process many still images with batched inference
+
+        Returns ``images``, one ``process_image``-style result per path in
+        order (images that cannot be decoded get an ``error`` entry instead
+        of failing the batch), and the stage ``timings``.
+        ``progress(done, total)`` is called after each model batch.
+        """
+        if not self.is_initialized:
+            raise RuntimeError("Model service not initialized")
+        
+        logger.info(f"Processing batch of {len(image_paths)} images")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._process_image_batch, image_paths, roi, progress)
+    
+    def _process_image_batch(self, image_paths: List[str], roi: Optional[Dict[str, Any]],
+                             progress) -> Dict[str, Any]:
+        results = []
+        timer = StageTimer()
+        rois: Dict[Tuple[int, int], Optional[FrameROI]] = {}
+        chunks = [image_paths[i:i + IMAGE_BATCH_SIZE] for i in range(0, len(image_paths), IMAGE_BATCH_SIZE)]
+        
+        def read_image(path: str) -> Optional[np.ndarray]:
+            with timer.stage('decode'):
+                return cv2.imread(path)
+        
+        with ThreadPoolExecutor(max_workers=IMAGE_DECODE_WORKERS) as pool:
+            # Decode one batch ahead of inference
+            pending = [pool.submit(read_image, path) for path in chunks[0]] if chunks else []
+            for index, chunk in enumerate(chunks):
+                images = [future.result() for future in pending]
+                pending = [pool.submit(read_image, path) for path in chunks[index + 1]] if index + 1 < len(chunks) else []
+                
+                started = time.perf_counter()
+                frames, entries = [], []
+                for path, image in zip(chunk, images):
+                    if image is None:
+                        results.append({'image_path': path, 'error': f"Could not load image: {path}"})
+                        continue
+                    height, width = image.shape[:2]
+                    if (width, height) not in rois:
+                        rois[(width, height)] = FrameROI.from_parameters(roi, width, height)
+                    frame_roi = rois[(width, height)]
+                    frames.append(frame_roi.crop(image) if frame_roi is not None else image)
+                    entry = {'image_path': path, 'width': width, 'height': height, 'roi': frame_roi}
+                    entries.append(entry)
+                    results.append(entry)
+                preprocessed = time.perf_counter()
+                
+                batch_detections = self.detect_sperm_batch(frames)
+                inferred = time.perf_counter()
+                # Per-image shares of the batch, so percentiles stay per frame
+                for _ in frames:
+                    timer.record('preprocess', (preprocessed - started) / len(frames))
+                    timer.record('inference', (inferred - preprocessed) / len(frames))
+                
+                for entry, detections in zip(entries, batch_detections):
+                    frame_roi = entry.pop('roi')
+                    if frame_roi is not None:
+                        detections = [det for det in detections if frame_roi.contains(det.x, det.y)]
+                        self._map_to_full_frame(detections, [], frame_roi)
+                    analyzed_area = frame_roi.area if frame_roi else entry['width'] * entry['height']
+                    for i, det in enumerate(detections):
+                        det.id = i
+                    entry.update({
+                        'image_properties': {
+                            'width': entry.pop('width'),
+                            'height': entry.pop('height'),
+                            'roi': frame_roi.to_dict() if frame_roi else None
+                        },
+                        'detections': [det.dict() for det in detections],
+                        'summary': {
+                            'total_detections': len(detections),
+                            'detection_density': len(detections) / analyzed_area * 1000000  # per megapixel
+                        }
+                    })
+                
+                if progress is not None:
+                    progress(min((index + 1) * IMAGE_BATCH_SIZE, len(image_paths)), len(image_paths))
+        
+        logger.info(f"Batch image processing complete: {len(image_paths)} images")
+        return {'images': results, 'timings': timer}
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+Motion-only tracker for re-tracking cached detections
+Associates head positions by distance to each track's predicted position,
+without frames or appearance features
+"""
+
+from typing import List, Optional, Any, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+class MotionTrack:
+    """
+    One track of a ``MotionTracker``
+
+    Exposes the parts of DeepSORT's ``Track`` that ``ModelService.update_tracker``
+    reads (``track_id``, ``is_confirmed``, ``to_ltrb``, ``get_det_conf``).
+    """
+
+    def __init__(self, track_id: str, box: List[float], confidence: float):
+        self.track_id = track_id
+        self.hits = 1
+        self.time_since_update = 0
+        self.confirmed = False
+        self.det_conf: Optional[float] = confidence
+        self.width, self.height = box[2], box[3]
+        # Last observed center and velocity, in pixels per frame
+        self.position = np.array([box[0] + box[2] / 2, box[1] + box[3] / 2], dtype=np.float64)
+        self.velocity = np.zeros(2, dtype=np.float64)
+
+    def predicted(self) -> np.ndarray:
+        """Center expected at the current frame, extrapolated at constant velocity"""
+        return self.position + self.velocity * self.time_since_update
+
+    def mark_missed(self):
+        self.time_since_update += 1
+        self.det_conf = None
+
+    def update(self, box: List[float], confidence: float, frames: int):
+        """Move to a detection seen ``frames`` frames after the last one"""
+        center = np.array([box[0] + box[2] / 2, box[1] + box[3] / 2], dtype=np.float64)
+        self.velocity = (center - self.position) / frames
+        self.position = center
+        self.width, self.height = box[2], box[3]
+        self.det_conf = confidence
+        self.hits += 1
+        self.time_since_update = 0
+
+    def is_confirmed(self) -> bool:
+        return self.confirmed
+
+    def to_ltrb(self) -> List[float]:
+        x, y = self.predicted()
+        return [x - self.width / 2, y - self.height / 2, x + self.width / 2, y + self.height / 2]
+
+    def get_det_conf(self) -> Optional[float]:
+        return self.det_conf
+
+
+class MotionTracker:
+    """
+    Nearest-neighbour tracker over head positions
+
+    Each frame, tracks are matched one-to-one to detections by minimum total
+    distance from their predicted position, up to ``max_step`` pixels. As in
+    DeepSORT, a track is confirmed after ``n_init`` consecutive matches,
+    tentative tracks are dropped on their first miss and confirmed ones after
+    ``max_age`` missed frames. ``update_tracks`` takes DeepSORT's detection
+    format, so ``ModelService.update_tracker`` drives either tracker.
+    """
+
+    def __init__(self, max_age: int = 30, n_init: int = 3, max_step: float = 40.0):
+        self.max_age = max_age
+        self.n_init = n_init
+        self.max_step = max_step
+        self.tracks: List[MotionTrack] = []
+        self._next_id = 1
+
+    def update_tracks(self, raw_detections: List[Tuple[List[float], float, Any]],
+                      embeds: Any = None, frame: Any = None) -> List[MotionTrack]:
+        """
+        Advance one frame with ``([left, top, width, height], confidence, class)`` detections
+
+        ``embeds`` and ``frame`` are accepted for DeepSORT compatibility and
+        ignored. Returns the tracks matched in this frame.
+        """
+        matched, unmatched = self._associate(raw_detections)
+
+        for track in self.tracks:
+            if track in matched:
+                box, confidence, _ = raw_detections[matched[track]]
+                track.update(box, confidence, track.time_since_update + 1)
+                if track.hits >= self.n_init:
+                    track.confirmed = True
+            else:
+                track.mark_missed()
+        self.tracks = [
+            track for track in self.tracks
+            if track.time_since_update == 0
+            or (track.confirmed and track.time_since_update <= self.max_age)
+        ]
+
+        for index in unmatched:
+            box, confidence, _ = raw_detections[index]
+            track = MotionTrack(str(self._next_id), box, confidence)
+            track.confirmed = self.n_init <= 1
+            self.tracks.append(track)
+            self._next_id += 1
+
+        return [track for track in self.tracks if track.time_since_update == 0]
+
+    def _associate(self, raw_detections) -> Tuple[dict, List[int]]:
+        """Match tracks to detection indices; returns (track -> index, unmatched indices)"""
+        if not self.tracks or not raw_detections:
+            return {}, list(range(len(raw_detections)))
+
+        predicted = np.array([track.predicted() for track in self.tracks])
+        centers = np.array([[box[0] + box[2] / 2, box[1] + box[3] / 2] for box, _, _ in raw_detections])
+        distance = np.linalg.norm(predicted[:, None, :] - centers[None, :, :], axis=2)
+        # Pairs beyond max_step are infeasible; the large cost keeps them out of the assignment
+        cost = np.where(distance <= self.max_step, distance, self.max_step * 1e3)
+        rows, cols = linear_sum_assignment(cost)
+
+        matched = {
+            self.tracks[row]: int(col)
+            for row, col in zip(rows, cols)
+            if distance[row, col] <= self.max_step
+        }
+        taken = set(matched.values())
+        return matched, [index for index in range(len(raw_detections)) if index not in taken]
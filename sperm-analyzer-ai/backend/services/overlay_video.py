@@ -0,0 +1,303 @@
+"""
+Annotated overlay videos: stored tracks drawn over the source video
+Segments are drawn and encoded in parallel worker processes and concatenated
+"""
+
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple
+
+import cv2
+import numpy as np
+
+from models.analysis_models import AnalysisStatus as StatusEnum, SpermMotilityClass, MOTILITY_CODES
+from services.analysis_service import AnalysisService
+from services.export_cache import ExportArtifactCache
+from services.frame_sequence import open_frame_source
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+OVERLAY_ARTIFACT = "overlay.mp4"
+
+# Segment files are MPEG-4 Part 2 so they can be concatenated without re-encoding
+OVERLAY_FOURCC = "mp4v"
+
+# Frames of history drawn behind each sperm head
+TRAIL_FRAMES = 30
+
+# Segments shorter than this are not worth a worker process
+MIN_SEGMENT_FRAMES = 150
+
+# BGR colors per motility code, matching the export charts; -1 is unclassified
+MOTILITY_COLORS = {
+    MOTILITY_CODES[SpermMotilityClass.PROGRESSIVE]: (113, 204, 46),
+    MOTILITY_CODES[SpermMotilityClass.NON_PROGRESSIVE]: (18, 156, 243),
+    MOTILITY_CODES[SpermMotilityClass.IMMOTILE]: (60, 76, 231),
+    -1: (200, 200, 200),
+}
+
+# Per-point arrays handed to segment workers
+OVERLAY_ARRAYS = ['track', 'frame', 'x', 'y', 'motility']
+
+
+def plan_segments(total_frames: int, workers: int) -> List[Tuple[int, int]]:
+    """Split ``[0, total_frames)`` into contiguous ``(start, end)`` ranges"""
+    if total_frames <= 0:
+        return []
+    count = max(1, min(workers * 2, total_frames // MIN_SEGMENT_FRAMES))
+    bounds = np.linspace(0, total_frames, count + 1).astype(int)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def render_segment(video_path: str, arrays_dir: str, start_frame: int, end_frame: int,
+                   output_path: str, last_segment: bool = False) -> int:
+    """
+    Draw tracks over frames ``[start_frame, end_frame)`` and encode them
+
+    Runs in a worker process. The per-point arrays are memory-mapped, and only
+    points inside the segment (plus the trail before it) are touched. The last
+    segment reads to the end of the stream, since container frame counts are
+    not always exact. Returns the number of frames written.
+    """
+    arrays = {name: np.load(os.path.join(arrays_dir, f"{name}.npy"), mmap_mode='r') for name in OVERLAY_ARRAYS}
+    window = (arrays['frame'] >= start_frame - TRAIL_FRAMES) & (arrays['frame'] < end_frame)
+    # Points stay grouped by track and ordered by frame within a track
+    track = np.asarray(arrays['track'][window])
+    frame = np.asarray(arrays['frame'][window])
+    points = np.stack([arrays['x'][window], arrays['y'][window]], axis=1).round().astype(np.int32)
+    motility = np.asarray(arrays['motility'][window])
+
+    cap = open_frame_source(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*OVERLAY_FOURCC), fps, (width, height))
+
+    written = 0
+    frame_number = start_frame
+    try:
+        while last_segment or frame_number < end_frame:
+            ret, image = cap.read()
+            if not ret:
+                break
+            _draw_frame(image, frame_number, fps, track, frame, points, motility)
+            writer.write(image)
+            written += 1
+            frame_number += 1
+    finally:
+        cap.release()
+        writer.release()
+    return written
+
+
+def _draw_frame(image: np.ndarray, frame_number: int, fps: float, track: np.ndarray,
+                frame: np.ndarray, points: np.ndarray, motility: np.ndarray):
+    """Draw the trail and head of every track visible at ``frame_number``"""
+    visible = np.flatnonzero((frame > frame_number - TRAIL_FRAMES) & (frame <= frame_number))
+    if len(visible):
+        # Split the visible points into one polyline per track
+        breaks = np.flatnonzero(np.diff(track[visible])) + 1
+        for run in np.split(visible, breaks):
+            color = MOTILITY_COLORS.get(int(motility[run[0]]), MOTILITY_COLORS[-1])
+            if len(run) > 1:
+                cv2.polylines(image, [points[run]], False, color, 1, cv2.LINE_AA)
+            if frame[run[-1]] == frame_number:
+                cv2.circle(image, tuple(int(v) for v in points[run[-1]]), 4, color, 1, cv2.LINE_AA)
+
+    label = f"frame {frame_number}  t={frame_number / fps:.2f}s"
+    cv2.putText(image, label, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+
+
+def concatenate_segments(segment_paths: List[str], output_path: str):
+    """
+    Join encoded segments into one file
+
+    Uses ffmpeg's concat demuxer (stream copy) when available. Otherwise the
+    segments are decoded and re-encoded with OpenCV, which is slower but
+    needs nothing beyond the existing dependencies.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        list_path = Path(output_path).with_suffix(".txt")
+        list_path.write_text("".join(f"file '{os.path.abspath(p)}'\n" for p in segment_paths))
+        try:
+            subprocess.run(
+                [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                 "-i", str(list_path), "-c", "copy", "-movflags", "+faststart", "-f", "mp4", str(output_path)],
+                check=True
+            )
+            return
+        except subprocess.CalledProcessError as e:
+            logger.error(f"ffmpeg concat failed, falling back to OpenCV: {str(e)}")
+        finally:
+            list_path.unlink(missing_ok=True)
+
+    writer = None
+    try:
+        for segment_path in segment_paths:
+            cap = cv2.VideoCapture(segment_path)
+            if writer is None:
+                fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                # VideoWriter picks the container from the extension
+                writer = cv2.VideoWriter(
+                    str(Path(output_path).with_suffix(".mp4")), cv2.VideoWriter_fourcc(*OVERLAY_FOURCC), fps, size
+                )
+            while True:
+                ret, image = cap.read()
+                if not ret:
+                    break
+                writer.write(image)
+            cap.release()
+    finally:
+        if writer is not None:
+            writer.release()
+    Path(output_path).with_suffix(".mp4").replace(output_path)
+
+
+class OverlayVideoService:
+    """
+    Background jobs that render annotated overlay videos
+
+    Job state uses the same fields as an analysis in
+    ``AnalysisService.active_analyses`` (status, progress, message,
+    created_at, completed_at). The finished video is stored in the export
+    artifact cache under the result version, so a later request for the same
+    results is served without rendering.
+    """
+
+    def __init__(self, analysis_service: AnalysisService, artifact_cache: ExportArtifactCache,
+                 max_workers: Optional[int] = None):
+        self.analysis_service = analysis_service
+        self.artifact_cache = artifact_cache
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._jobs_lock = threading.Lock()
+
+    def start_job(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Register a render job, or return the existing one for the same result
+        version. Returns None if the analysis has no stored results.
+        """
+        version = self.analysis_service.get_result_version(analysis_id)
+        if version is None:
+            return None
+
+        with self._jobs_lock:
+            for job in self.jobs.values():
+                if (job['analysis_id'] == analysis_id and job['version'] == version
+                        and job['status'] != StatusEnum.FAILED):
+                    return job
+
+            job = {
+                'job_id': str(uuid.uuid4()),
+                'analysis_id': analysis_id,
+                'version': version,
+                'status': StatusEnum.PENDING,
+                'progress': 0.0,
+                'message': 'Queued for rendering',
+                'created_at': datetime.now(),
+                'completed_at': None,
+                'output_path': None
+            }
+            cached = self.artifact_cache.get(analysis_id, version, OVERLAY_ARTIFACT)
+            if cached:
+                job.update({
+                    'status': StatusEnum.COMPLETED,
+                    'progress': 100.0,
+                    'message': 'Overlay video ready',
+                    'completed_at': job['created_at'],
+                    'output_path': str(cached)
+                })
+            self.jobs[job['job_id']] = job
+            return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def run_job(self, job_id: str):
+        """Render the overlay video for a registered job (blocking; run in the background)"""
+        job = self.jobs[job_id]
+        if job['status'] == StatusEnum.COMPLETED:
+            return
+        try:
+            self._update_job(job_id, StatusEnum.PROCESSING, 1, "Preparing tracks...")
+            output_path = self.artifact_cache.get_or_build(
+                job['analysis_id'], job['version'], OVERLAY_ARTIFACT,
+                lambda path: self._render(job_id, path)
+            )
+            job['output_path'] = str(output_path)
+            job['completed_at'] = datetime.now()
+            self._update_job(job_id, StatusEnum.COMPLETED, 100, "Overlay video ready")
+            logger.info(f"Overlay video for {job['analysis_id']} rendered: {output_path}")
+        except Exception as e:
+            logger.error(f"Overlay rendering for {job['analysis_id']} failed: {str(e)}")
+            self._update_job(job_id, StatusEnum.FAILED, 0, f"Rendering failed: {str(e)}")
+
+    def _update_job(self, job_id: str, status: StatusEnum, progress: float, message: str):
+        self.jobs[job_id].update({'status': status, 'progress': progress, 'message': message})
+
+    def _render(self, job_id: str, output_path: Path):
+        job = self.jobs[job_id]
+        analysis_id = job['analysis_id']
+        video_path = self.analysis_service.get_source_path(analysis_id)
+        if video_path is None:
+            raise ValueError(f"Source video not found for analysis {analysis_id}")
+
+        cap = open_frame_source(video_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        segments = plan_segments(total_frames, self.max_workers)
+        if not segments:
+            raise ValueError(f"Could not read frames from {video_path}")
+
+        with tempfile.TemporaryDirectory(dir=output_path.parent) as work_dir:
+            self._write_overlay_arrays(analysis_id, work_dir)
+            segment_paths = [os.path.join(work_dir, f"segment_{i:04d}.mp4") for i in range(len(segments))]
+
+            # Spawned workers do not inherit the server's threads or locks
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(segments)),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [
+                    pool.submit(render_segment, video_path, work_dir, start, end, path, i == len(segments) - 1)
+                    for i, ((start, end), path) in enumerate(zip(segments, segment_paths))
+                ]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    future.result()
+                    self._update_job(job_id, StatusEnum.PROCESSING, 5 + 85 * done / len(futures),
+                                     f"Rendered {done}/{len(futures)} segments")
+
+            self._update_job(job_id, StatusEnum.PROCESSING, 95, "Joining segments...")
+            concatenate_segments(segment_paths, str(output_path))
+
+    def _write_overlay_arrays(self, analysis_id: str, work_dir: str):
+        """Write per-point track/frame/position/motility arrays for the workers to memory-map"""
+        storage = self.analysis_service.storage
+        names = ['point_offsets', 'point_frame', 'point_x', 'point_y', 'motility_class']
+        if storage.has_columns(analysis_id):
+            columns = storage.load_columns(analysis_id, names)
+        else:
+            columns = storage.result_to_columns(self.analysis_service.get_analysis_results(analysis_id))
+
+        lengths = np.diff(columns['point_offsets'])
+        arrays = {
+            'track': np.repeat(np.arange(len(lengths), dtype=np.int32), lengths),
+            'frame': np.asarray(columns['point_frame']),
+            'x': np.asarray(columns['point_x']),
+            'y': np.asarray(columns['point_y']),
+            'motility': np.repeat(np.asarray(columns['motility_class']), lengths),
+        }
+        for name, values in arrays.items():
+            np.save(os.path.join(work_dir, f"{name}.npy"), values)
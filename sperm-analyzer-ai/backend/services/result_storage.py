@@ -0,0 +1,246 @@
+"""
+Result storage for analysis results
+Splits each result into a small JSON summary and columnar binary arrays
+"""
+
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple
+import numpy as np
+
+from models.analysis_models import (
+    AnalysisResult, SpermTrack, SpermDetection, MOTILITY_CODES, MOTILITY_CLASSES, TRACK_METRIC_COLUMNS
+)
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+STORAGE_FORMAT = "columnar-v1"
+
+
+class ResultStorage:
+    """
+    Stores analysis results as a compact JSON summary plus one ``.npy`` file
+    per column for the bulk track and point arrays.
+
+    Layout inside ``results_dir``::
+
+        {analysis_id}.json                   summary (AnalysisResult without tracks)
+        {analysis_id}_arrays.{token}/*.npy   track and point columns
+
+    Array files are opened with ``mmap_mode='r'`` so reading a handful of
+    columns never pulls the whole result into memory. A rewrite puts its
+    arrays in a new directory and then replaces the summary, which names the
+    current directory, so readers always see one complete generation.
+    """
+
+    def __init__(self, results_dir: Path):
+        self.results_dir = Path(results_dir)
+        self.results_dir.mkdir(exist_ok=True)
+        # Current array directory per analysis, keyed by the summary version it was read from
+        self._arrays_dirs: Dict[str, Tuple[str, Optional[Path]]] = {}
+
+    def summary_path(self, analysis_id: str) -> Path:
+        return self.results_dir / f"{analysis_id}.json"
+
+    def arrays_dir(self, analysis_id: str) -> Optional[Path]:
+        """Array directory of the current result, as named by its summary"""
+        version = self.version(analysis_id)
+        if version is None:
+            return None
+        cached = self._arrays_dirs.get(analysis_id)
+        if cached is None or cached[0] != version:
+            cached = (version, self._arrays_path(self.load_summary(analysis_id) or {}))
+            self._arrays_dirs[analysis_id] = cached
+        return cached[1]
+
+    def _arrays_path(self, summary: Dict[str, Any]) -> Optional[Path]:
+        name = summary.get('storage', {}).get('arrays')
+        return self.results_dir / name if name else None
+
+    def exists(self, analysis_id: str) -> bool:
+        return self.summary_path(analysis_id).exists()
+
+    def has_columns(self, analysis_id: str) -> bool:
+        arrays_dir = self.arrays_dir(analysis_id)
+        return arrays_dir is not None and arrays_dir.exists()
+
+    def version(self, analysis_id: str) -> Optional[str]:
+        """Opaque version string that changes whenever the result is rewritten"""
+        summary_file = self.summary_path(analysis_id)
+        if not summary_file.exists():
+            return None
+        stat = summary_file.stat()
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def save(self, result: AnalysisResult):
+        """Save result as summary JSON plus columnar arrays"""
+        columns = self.result_to_columns(result)
+        arrays = self.write_columns(result.analysis_id, columns)
+        self.write_summary(result, columns, arrays)
+
+    def write_columns(self, analysis_id: str, columns: Dict[str, np.ndarray]) -> str:
+        """
+        Write the array files of a result into a new directory and return its name
+
+        The directory becomes current once ``write_summary`` names it; until
+        then readers keep using the previous arrays.
+        """
+        name = f"{analysis_id}_arrays.{time.time_ns():x}"
+        tmp_dir = self.results_dir / f".{name}.tmp"
+        tmp_dir.mkdir()
+        for column, values in columns.items():
+            np.save(tmp_dir / f"{column}.npy", values)
+        tmp_dir.rename(self.results_dir / name)
+        return name
+
+    def write_summary(self, result: AnalysisResult, columns: Dict[str, np.ndarray], arrays: str):
+        """Write the summary JSON naming the ``arrays`` directory; the result's version changes with it"""
+        analysis_id = result.analysis_id
+        summary = result.dict(exclude={'tracks'})
+        summary['storage'] = {
+            'format': STORAGE_FORMAT,
+            'arrays': arrays,
+            'track_count': len(result.tracks),
+            'point_count': int(columns['point_offsets'][-1])
+        }
+
+        previous = self.arrays_dir(analysis_id)
+        summary_file = self.summary_path(analysis_id)
+        tmp_file = summary_file.with_suffix('.json.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(summary, f, separators=(',', ':'), default=str)
+        tmp_file.replace(summary_file)
+
+        # A reader may have resolved the previous arrays just before the swap,
+        # so that generation is only removed by the next rewrite
+        keep = {arrays, previous.name if previous is not None else None}
+        for path in self.results_dir.glob(f"{analysis_id}_arrays.*"):
+            if path.name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def load_summary(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """Load the raw summary dict (bulk arrays not included)"""
+        summary_file = self.summary_path(analysis_id)
+        if not summary_file.exists():
+            return None
+        with open(summary_file, 'r') as f:
+            return json.load(f)
+
+    def is_columnar(self, summary: Dict[str, Any]) -> bool:
+        """Whether a summary was written by this storage (vs. legacy full JSON)"""
+        return summary.get('storage', {}).get('format') == STORAGE_FORMAT
+
+    def load_columns(self, analysis_id: str, names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Memory-map the requested columns (all columns when ``names`` is None)"""
+        return self._load_columns(self.arrays_dir(analysis_id), names)
+
+    def _load_columns(self, arrays_dir: Optional[Path], names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        if arrays_dir is None or not arrays_dir.exists():
+            return {}
+        if names is None:
+            names = [path.stem for path in arrays_dir.glob("*.npy")]
+        return {
+            name: np.load(arrays_dir / f"{name}.npy", mmap_mode='r')
+            for name in names
+            if (arrays_dir / f"{name}.npy").exists()
+        }
+
+    def load_result(self, analysis_id: str, include_tracks: bool = True) -> Optional[AnalysisResult]:
+        """Load a result, optionally skipping the bulk track arrays"""
+        data = self.load_summary(analysis_id)
+        if data is None:
+            return None
+
+        if not self.is_columnar(data):
+            # Legacy single-file JSON result: everything is inline
+            if not include_tracks:
+                data['tracks'] = []
+            return AnalysisResult(**data)
+
+        if include_tracks:
+            # The arrays named by this summary, even if a rewrite has replaced it since
+            data['tracks'] = self.tracks_from_columns(self._load_columns(self._arrays_path(data)))
+
+        return AnalysisResult(**data)
+
+    def delete(self, analysis_id: str):
+        """Delete summary and array files"""
+        summary_file = self.summary_path(analysis_id)
+        if summary_file.exists():
+            summary_file.unlink()
+        self._arrays_dirs.pop(analysis_id, None)
+        for path in self.results_dir.glob(f"{analysis_id}_arrays.*"):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def tracks_from_columns(self, columns: Dict[str, np.ndarray],
+                            indices: Optional[np.ndarray] = None) -> List[SpermTrack]:
+        """Rebuild SpermTrack objects for the given track indices (all by default)"""
+        if 'track_id' not in columns:
+            return []
+
+        offsets = columns['point_offsets']
+        if indices is None:
+            indices = np.arange(len(columns['track_id']))
+
+        tracks = []
+        for i in indices:
+            start, end = int(offsets[i]), int(offsets[i + 1])
+            detections = [
+                SpermDetection(
+                    id=int(columns['point_id'][j]),
+                    x=float(columns['point_x'][j]),
+                    y=float(columns['point_y'][j]),
+                    confidence=float(columns['point_confidence'][j]),
+                    frame_number=int(columns['point_frame'][j]),
+                    timestamp=float(columns['point_timestamp'][j])
+                )
+                for j in range(start, end)
+            ]
+            metrics = {
+                name: (None if np.isnan(columns[name][i]) else float(columns[name][i]))
+                for name in TRACK_METRIC_COLUMNS
+            }
+            tracks.append(SpermTrack(
+                track_id=int(columns['track_id'][i]),
+                detections=detections,
+                start_frame=int(columns['start_frame'][i]),
+                end_frame=int(columns['end_frame'][i]),
+                duration=float(columns['duration'][i]),
+                motility_class=MOTILITY_CLASSES.get(int(columns['motility_class'][i])),
+                **metrics
+            ))
+        return tracks
+
+    def result_to_columns(self, result: AnalysisResult) -> Dict[str, np.ndarray]:
+        """Flatten tracks and their detections into columnar arrays"""
+        tracks = result.tracks
+        lengths = [len(track.detections) for track in tracks]
+        detections = [det for track in tracks for det in track.detections]
+
+        columns = {
+            'track_id': np.array([t.track_id for t in tracks], dtype=np.int64),
+            'start_frame': np.array([t.start_frame for t in tracks], dtype=np.int64),
+            'end_frame': np.array([t.end_frame for t in tracks], dtype=np.int64),
+            'duration': np.array([t.duration for t in tracks], dtype=np.float64),
+            'motility_class': np.array(
+                [MOTILITY_CODES.get(t.motility_class, -1) for t in tracks], dtype=np.int8
+            ),
+            'point_offsets': np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))).astype(np.int64),
+            'point_id': np.array([d.id for d in detections], dtype=np.int32),
+            # Full precision, so results reloaded from columns match the saved values exactly
+            'point_x': np.array([d.x for d in detections], dtype=np.float64),
+            'point_y': np.array([d.y for d in detections], dtype=np.float64),
+            'point_confidence': np.array([d.confidence for d in detections], dtype=np.float64),
+            'point_frame': np.array([d.frame_number for d in detections], dtype=np.int32),
+            'point_timestamp': np.array([d.timestamp for d in detections], dtype=np.float64),
+        }
+        for name in TRACK_METRIC_COLUMNS:
+            columns[name] = np.array(
+                [np.nan if getattr(t, name) is None else getattr(t, name) for t in tracks],
+                dtype=np.float64
+            )
+
+        return columns
@@ -0,0 +1,309 @@
+"""
+Segment-parallel video processing
+A video is split into overlapping frame ranges that are detected and tracked
+in separate processes; tracks are stitched across the overlaps afterwards
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Any, Tuple
+
+import cv2
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from services.frame_roi import FrameROI
+from services.frame_sequence import open_frame_source, frame_timestamps
+from services.model_service import analysis_frame_step, DETECTION_CACHE_MIN_CONFIDENCE
+from utils.logger import setup_logger
+from utils.stage_timer import StageTimer
+
+logger = setup_logger()
+
+# Frames each segment re-processes before its own range, so its tracker has
+# confirmed tracks (DeepSORT n_init=3) that can be matched to the previous segment
+DEFAULT_OVERLAP_FRAMES = 30
+
+# Segments shorter than this many overlaps spend most of their time re-processing
+MIN_SEGMENT_OVERLAPS = 4
+
+# Track matching across a boundary
+MIN_COMMON_FRAMES = 3       # frames both tracks must share to be compared point by point
+MAX_STITCH_GAP = 5          # frames allowed between one track ending and the other starting
+MAX_STITCH_COST = 15.0      # pixels
+VELOCITY_HORIZON = 5.0      # frames; velocity difference is weighted as displacement over this horizon
+VELOCITY_POINTS = 5         # points used to estimate a track's velocity at either end
+
+# Worker-process model service, created once per worker by _init_worker
+_worker_service = None
+
+
+def _init_worker(confidence_threshold: float, iou_threshold: float):
+    """Load the detection model once per worker process"""
+    global _worker_service
+    from services.model_service import ModelService
+
+    _worker_service = ModelService()
+    _worker_service.confidence_threshold = confidence_threshold
+    _worker_service.iou_threshold = iou_threshold
+    _worker_service.load_for_inference()
+
+
+def process_segment(video_path: str, read_from: int, end_frame: Optional[int],
+                    roi: Optional[Dict[str, Any]] = None, frame_step: int = 1,
+                    stack_fps: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Detect and track frames ``[read_from, end_frame)`` with a fresh tracker
+
+    Runs in a worker process. ``end_frame=None`` reads to the end of the video.
+    """
+    _worker_service._initialize_tracker()
+    timer = StageTimer()
+    cap = open_frame_source(video_path, stack_fps)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frame_roi = FrameROI.from_parameters(
+            roi, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        )
+        cap.set(cv2.CAP_PROP_POS_FRAMES, read_from)
+        frame_detections, tracks = _worker_service.track_frames(
+            cap, fps, total_frames, read_from, end_frame, roi=frame_roi, frame_step=frame_step,
+            timestamps=frame_timestamps(cap), timer=timer
+        )
+    finally:
+        cap.release()
+    return {'frame_detections': frame_detections, 'tracks': tracks, 'timings': timer.samples}
+
+
+def plan_boundaries(total_frames: int, segments: int, overlap: int) -> List[int]:
+    """Frame boundaries ``[0, b1, ..., total_frames]`` of up to ``segments`` equal ranges"""
+    segments = max(1, min(segments, total_frames // max(1, overlap * MIN_SEGMENT_OVERLAPS)))
+    return [int(b) for b in np.linspace(0, total_frames, segments + 1).astype(int)]
+
+
+def _endpoint(points: List[Dict], at_end: bool) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Position, velocity (px/frame) and frame number at one end of a track"""
+    window = points[-VELOCITY_POINTS:] if at_end else points[:VELOCITY_POINTS]
+    xy = np.array([[p['x'], p['y']] for p in window], dtype=np.float64)
+    frames = np.array([p['frame_number'] for p in window], dtype=np.float64)
+    velocity = np.zeros(2)
+    if len(window) > 1 and frames[-1] > frames[0]:
+        velocity = (xy[-1] - xy[0]) / (frames[-1] - frames[0])
+    anchor = -1 if at_end else 0
+    return xy[anchor], velocity, int(frames[anchor])
+
+
+def _stitch_cost(before: List[Dict], after: List[Dict], max_gap: int = MAX_STITCH_GAP) -> float:
+    """
+    Cost of treating two tracks from adjacent segments as the same sperm
+
+    Tracks that both cover enough overlap frames are compared point by point;
+    otherwise the earlier track is extrapolated across the gap to where the
+    later one starts. Either way, a velocity mismatch adds the displacement it
+    would cause over ``VELOCITY_HORIZON`` frames.
+    """
+    before_by_frame = {p['frame_number']: p for p in before}
+    common = [p for p in after if p['frame_number'] in before_by_frame]
+    if len(common) >= MIN_COMMON_FRAMES:
+        a = np.array([[before_by_frame[p['frame_number']]['x'], before_by_frame[p['frame_number']]['y']]
+                      for p in common])
+        b = np.array([[p['x'], p['y']] for p in common])
+        frames = np.array([p['frame_number'] for p in common], dtype=np.float64)
+        span = max(frames[-1] - frames[0], 1.0)
+        velocity_error = np.linalg.norm(((a[-1] - a[0]) - (b[-1] - b[0])) / span)
+        return float(np.linalg.norm(a - b, axis=1).mean() + VELOCITY_HORIZON * velocity_error)
+
+    end_xy, end_velocity, end_frame = _endpoint(before, at_end=True)
+    start_xy, start_velocity, start_frame = _endpoint(after, at_end=False)
+    gap = start_frame - end_frame
+    if gap < 1 or gap > max_gap:
+        return np.inf
+    predicted = end_xy + end_velocity * gap
+    return float(np.linalg.norm(predicted - start_xy)
+                 + VELOCITY_HORIZON * np.linalg.norm(end_velocity - start_velocity))
+
+
+def match_tracks(before: Dict[Any, List[Dict]], after: Dict[Any, List[Dict]],
+                 boundary: int, overlap: int, frame_step: int = 1) -> List[Tuple[Any, Any]]:
+    """
+    Match tracks ending around ``boundary`` to tracks of the next segment
+
+    Only tracks alive near the overlap window ``[boundary - overlap, boundary)``
+    are considered. Returns ``(before_id, after_id)`` pairs from a minimum-cost
+    assignment, gated by ``MAX_STITCH_COST``. Gaps are counted in analyzed
+    frames, i.e. in units of ``frame_step``.
+    """
+    max_gap = MAX_STITCH_GAP * frame_step
+    window_start = boundary - overlap
+    before_ids = [tid for tid, pts in before.items()
+                  if pts and pts[-1]['frame_number'] >= window_start - max_gap]
+    after_ids = [tid for tid, pts in after.items()
+                 if pts and pts[0]['frame_number'] < boundary + max_gap]
+    if not before_ids or not after_ids:
+        return []
+
+    costs = np.array([[_stitch_cost(before[a], after[b], max_gap) for b in after_ids] for a in before_ids])
+    feasible = np.where(np.isfinite(costs), costs, MAX_STITCH_COST * 1e3)
+    rows, cols = linear_sum_assignment(feasible)
+    return [(before_ids[r], after_ids[c]) for r, c in zip(rows, cols) if costs[r, c] <= MAX_STITCH_COST]
+
+
+def stitch_segments(segment_results: List[Dict[str, Any]], boundaries: List[int],
+                    overlap: int, frame_step: int = 1) -> Tuple[List[Dict], Dict[int, List[Dict]]]:
+    """
+    Merge per-segment results into whole-video frame records and tracks
+
+    Each segment owns the frames of its own range; the re-processed overlap
+    before it is only used for matching. Matched tracks keep the global id of
+    the earlier segment's track. Track ids in the frame records are remapped
+    to the same global ids.
+    """
+    frame_detections = []
+    tracks: Dict[int, List[Dict]] = {}
+    next_id = 1
+    previous_tracks: Dict[Any, List[Dict]] = {}
+    previous_ids: Dict[Any, int] = {}
+
+    for index, segment in enumerate(segment_results):
+        own_start = boundaries[index]
+        local_ids: Dict[Any, int] = {}
+        if index > 0:
+            # Only tracks that made it into the output can be continued
+            continuable = {tid: pts for tid, pts in previous_tracks.items() if tid in previous_ids}
+            for before_id, after_id in match_tracks(continuable, segment['tracks'], own_start, overlap, frame_step):
+                local_ids[after_id] = previous_ids[before_id]
+
+        for local_id, points in segment['tracks'].items():
+            own_points = [p for p in points if p['frame_number'] >= own_start]
+            if not own_points:
+                continue
+            if local_id not in local_ids:
+                local_ids[local_id] = next_id
+                tracks[next_id] = []
+                next_id += 1
+            tracks[local_ids[local_id]].extend(own_points)
+
+        for record in segment['frame_detections']:
+            if record['frame_number'] < own_start:
+                continue
+            record['tracks'] = [
+                {**track, 'track_id': local_ids[track['track_id']]}
+                for track in record['tracks'] if track['track_id'] in local_ids
+            ]
+            frame_detections.append(record)
+
+        previous_tracks, previous_ids = segment['tracks'], local_ids
+
+    return frame_detections, tracks
+
+
+class SegmentedVideoProcessor:
+    """Processes one video on several cores by splitting it into overlapping segments"""
+
+    def __init__(self, confidence_threshold: float, iou_threshold: float,
+                 max_workers: Optional[int] = None, overlap: int = DEFAULT_OVERLAP_FRAMES):
+        self.confidence_threshold = confidence_threshold
+        self.iou_threshold = iou_threshold
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.overlap = overlap
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the server's threads, locks or CUDA context
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.confidence_threshold, self.iou_threshold)
+                )
+            return self._executor
+
+    async def process(self, video_path: str, segments: int, roi: Optional[Dict[str, Any]] = None,
+                      target_fps: Optional[float] = None, stack_fps: Optional[float] = None) -> Dict[str, Any]:
+        """Process a video in parallel segments; returns the same structure as ``process_video``"""
+        cap = open_frame_source(video_path, stack_fps)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {video_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        duration = total_frames / fps if fps > 0 else 0
+        # Validates the ROI up front; workers rebuild it from the spec
+        frame_roi = FrameROI.from_parameters(roi, width, height)
+        # Skipping is aligned to absolute frame numbers, so segments agree on which
+        # frames are analyzed; the overlap keeps the same number of analyzed frames
+        frame_step = analysis_frame_step(fps, target_fps)
+        overlap = self.overlap * frame_step
+
+        boundaries = plan_boundaries(total_frames, min(segments, self.max_workers), overlap)
+        count = len(boundaries) - 1
+        logger.info(f"Processing {video_path} in {count} segments of ~{total_frames // max(count, 1)} frames")
+
+        # The last segment reads to the end, since container frame counts are not always exact
+        executor = self.executor
+        futures = [
+            executor.submit(
+                process_segment, video_path, max(0, start - overlap), end if i < count - 1 else None,
+                roi, frame_step, stack_fps
+            )
+            for i, (start, end) in enumerate(zip(boundaries[:-1], boundaries[1:]))
+        ]
+        try:
+            segment_results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        except BrokenProcessPool:
+            # A crashed worker poisons the whole pool; start a fresh one next time
+            logger.error("Segment worker pool crashed, restarting on next video")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+        timer = StageTimer()
+        for result in segment_results:
+            timer.merge(result.pop('timings', None))
+        with timer.stage('stitching'):
+            frame_detections, tracks = stitch_segments(segment_results, boundaries, overlap, frame_step)
+        logger.info(f"Segmented processing complete: {len(tracks)} tracks after stitching")
+        return {
+            'video_properties': {
+                'width': width,
+                'height': height,
+                'fps': fps,
+                'total_frames': total_frames,
+                'duration': duration,
+                'roi': frame_roi.to_dict() if frame_roi else None,
+                'effective_fps': fps / frame_step if fps > 0 else fps,
+                'frame_step': frame_step,
+                'detection_confidence_floor': min(self.confidence_threshold, DETECTION_CACHE_MIN_CONFIDENCE)
+            },
+            'frame_detections': frame_detections,
+            'tracks': tracks,
+            'timings': timer,
+            'summary': {
+                'total_tracks': len(tracks),
+                'frames_processed': len(frame_detections),
+                'segments': count,
+                'average_detections_per_frame': np.mean([fd['detection_count'] for fd in frame_detections]) if frame_detections else 0
+            }
+        }
+
+    def shutdown(self):
+        """Stop the worker processes (the pool is recreated for the next video)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,359 @@
+"""
+Synthetic sperm videos with ground-truth trajectories
+Deterministic fixtures for tracking, CASA and benchmark runs
+"""
+
+import argparse
+import json
+import math
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Any, Tuple, Union
+
+import cv2
+import numpy as np
+
+from models.analysis_models import MOTILITY_CLASSES, TRACK_METRIC_COLUMNS
+from services.casa_calculator import CASACalculator, DEFAULT_PIXEL_TO_MICRON
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Parameter ranges per motility class, sampled uniformly; a scalar fixes the value.
+# vcl in μm/s; alh is the lateral head amplitude about the average path in μm;
+# bcf in Hz; curvature of the average path in 1/μm; jitter in μm per frame.
+MOTILITY_PRESETS = {
+    'progressive': {'vcl': (40.0, 120.0), 'alh': (0.75, 2.5), 'bcf': (5.0, 12.0), 'curvature': (-0.004, 0.004)},
+    'non_progressive': {'vcl': (8.0, 22.0), 'alh': (0.25, 1.0), 'bcf': (2.0, 6.0), 'radius': (4.0, 15.0)},
+    'immotile': {'jitter': 0.05},
+}
+
+DEFAULT_MOTILITY_MIX = {'progressive': 0.5, 'non_progressive': 0.2, 'immotile': 0.3}
+
+# Head of a human sperm is roughly 5 x 3 μm
+HEAD_SIZE = (5.0, 3.0)
+TAIL_LENGTH = 25.0  # μm
+
+BACKGROUND_LEVEL = 40
+HEAD_LEVEL = 210
+TAIL_LEVEL = 80
+
+# Bisection steps when solving for the progression speed that gives the target VCL
+SPEED_SOLVER_STEPS = 40
+
+
+def _pick(rng: np.random.Generator, value: Union[float, Tuple[float, float]]) -> float:
+    if isinstance(value, (tuple, list)):
+        return float(rng.uniform(value[0], value[1]))
+    return float(value)
+
+
+def _class_counts(count: int, mix: Dict[str, float]) -> Dict[str, int]:
+    """Split ``count`` by the mix fractions (largest remainder, so the total is exact)"""
+    total = sum(mix.values())
+    shares = {name: count * fraction / total for name, fraction in mix.items()}
+    counts = {name: int(math.floor(share)) for name, share in shares.items()}
+    remainder = count - sum(counts.values())
+    for name in sorted(shares, key=lambda n: shares[n] - counts[n], reverse=True)[:remainder]:
+        counts[name] += 1
+    return counts
+
+
+def expected_casa(tracks: List[Dict[str, Any]],
+                  pixel_to_micron: float = DEFAULT_PIXEL_TO_MICRON) -> Dict[str, Any]:
+    """
+    CASA metrics of ground-truth tracks in the ``ground_truth()`` layout
+
+    Tracks under 3 points are skipped, as in analysis. Returns the population
+    metrics and per-track metrics with their motility class.
+    """
+    tracks = [t for t in tracks if len(t['frames']) >= 3]
+    calculator = CASACalculator(pixel_to_micron)
+    offsets = np.concatenate([[0], np.cumsum([len(t['frames']) for t in tracks])]).astype(np.int64)
+    x = np.concatenate([t['x'] for t in tracks]) if tracks else np.zeros(0)
+    y = np.concatenate([t['y'] for t in tracks]) if tracks else np.zeros(0)
+    timestamps = np.concatenate([t['timestamps'] for t in tracks]) if tracks else np.zeros(0)
+    metrics = calculator.calculate_track_metrics_vectorized(x, y, timestamps, offsets)
+    population = calculator.calculate_population_metrics_vectorized(metrics)
+
+    per_track = {}
+    for i, track in enumerate(tracks):
+        values = {name: float(metrics[name][i]) for name in TRACK_METRIC_COLUMNS}
+        code = int(metrics['motility_class'][i])
+        values['motility_class'] = MOTILITY_CLASSES[code].value if code >= 0 else None
+        per_track[track['track_id']] = values
+    return {'population': population.dict(), 'tracks': per_track}
+
+
+class SyntheticSpermVideo:
+    """
+    Sperm swimming along parameterised trajectories, rendered frame by frame
+
+    Each motile cell follows an average path (a straight-ish line for
+    progressive cells, a small circle for non-progressive ones) with a
+    sinusoidal lateral head oscillation of amplitude ``alh`` at ``bcf`` Hz;
+    the speed along the average path is solved so the sampled VCL matches
+    the requested one. Immotile cells only jitter in place. Everything is
+    derived from ``seed``, so the same arguments give the same frames.
+
+    A cell's ground-truth track ends when its head leaves the field.
+    ``expected_casa`` runs the service's CASA calculator on those tracks,
+    i.e. it is what a perfect detector and tracker would report.
+    """
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 30.0, frame_count: int = 150,
+                 pixel_to_micron: float = DEFAULT_PIXEL_TO_MICRON, density: float = 100.0,
+                 count: Optional[int] = None, motility_mix: Optional[Dict[str, float]] = None,
+                 presets: Optional[Dict[str, Dict[str, Any]]] = None, noise: float = 6.0, seed: int = 0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_count = frame_count
+        self.pixel_to_micron = pixel_to_micron
+        self.noise = noise
+        self.seed = seed
+        # Density is cells per megapixel of field, like the service's concentration
+        self.count = count if count is not None else int(round(density * width * height / 1e6))
+        self.motility_mix = motility_mix or DEFAULT_MOTILITY_MIX
+        self.presets = {name: {**values, **((presets or {}).get(name) or {})}
+                        for name, values in MOTILITY_PRESETS.items()}
+        self.timestamps = np.arange(frame_count) / fps
+
+        rng = np.random.default_rng(seed)
+        self.background = self._make_background(rng)
+        self.cells = self._make_cells(rng)
+
+    def _make_background(self, rng: np.random.Generator) -> np.ndarray:
+        """Static uneven illumination and debris shared by all frames"""
+        texture = rng.normal(0, 1, (self.height // 8 + 1, self.width // 8 + 1)).astype(np.float32)
+        texture = cv2.resize(texture, (self.width, self.height), interpolation=cv2.INTER_CUBIC)
+        background = BACKGROUND_LEVEL + 8 * texture
+        for _ in range(int(rng.integers(3, 10))):
+            center = (int(rng.uniform(0, self.width)), int(rng.uniform(0, self.height)))
+            cv2.circle(background, center, int(rng.integers(2, 6)), float(rng.uniform(15, 35)), -1)
+        return background
+
+    def _make_cells(self, rng: np.random.Generator) -> List[Dict[str, Any]]:
+        cells = []
+        counts = _class_counts(self.count, self.motility_mix)
+        classes = [name for name in MOTILITY_PRESETS for _ in range(counts.get(name, 0))]
+        for track_id, motility in enumerate(classes):
+            start = np.array([rng.uniform(0, self.width), rng.uniform(0, self.height)]) * self.pixel_to_micron
+            if motility == 'immotile':
+                parameters = {'jitter': _pick(rng, self.presets['immotile']['jitter'])}
+                steps = rng.normal(0, parameters['jitter'], (self.frame_count, 2))
+                steps[0] = 0
+                path = start + np.cumsum(steps, axis=0)
+            else:
+                parameters, path = self._motile_path(rng, motility, start)
+            path = path / self.pixel_to_micron
+            cells.append({
+                'track_id': track_id,
+                'motility_class': motility,
+                'parameters': parameters,
+                'path': path,
+                'headings': self._headings(path),
+                'visible': self._visible_frames(path)
+            })
+        return cells
+
+    def _motile_path(self, rng: np.random.Generator, motility: str,
+                     start: np.ndarray) -> Tuple[Dict[str, float], np.ndarray]:
+        """Trajectory in μm of one motile cell, with the parameters actually used"""
+        preset = self.presets[motility]
+        vcl = _pick(rng, preset['vcl'])
+        alh = _pick(rng, preset['alh'])
+        bcf = _pick(rng, preset['bcf'])
+        if 'radius' in preset:
+            curvature = rng.choice([-1.0, 1.0]) / _pick(rng, preset['radius'])
+        else:
+            curvature = _pick(rng, preset['curvature'])
+        heading = rng.uniform(0, 2 * np.pi)
+        phase = rng.uniform(0, 2 * np.pi)
+        t = self.timestamps
+
+        def path(speed: float) -> np.ndarray:
+            s = speed * t
+            angle = heading + curvature * s
+            if abs(curvature) < 1e-9:
+                average = np.stack([s * np.cos(heading), s * np.sin(heading)], axis=1)
+            else:
+                average = np.stack([np.sin(angle) - np.sin(heading), np.cos(heading) - np.cos(angle)], axis=1)
+                average /= curvature
+            normal = np.stack([-np.sin(angle), np.cos(angle)], axis=1)
+            lateral = alh * np.sin(2 * np.pi * bcf * t + phase)
+            return start + average + normal * lateral[:, None]
+
+        def sampled_vcl(speed: float) -> float:
+            steps = np.diff(path(speed), axis=0)
+            return float(np.mean(np.sqrt(np.sum(steps ** 2, axis=1)))) * self.fps
+
+        if self.frame_count < 2:
+            return {'vcl': vcl, 'alh': alh, 'bcf': bcf, 'curvature': curvature, 'speed': vcl}, path(vcl)
+
+        # The head oscillation alone must leave room for forward motion
+        lateral_vcl = sampled_vcl(0.0)
+        if lateral_vcl > 0.9 * vcl:
+            alh *= 0.9 * vcl / lateral_vcl
+        low, high = 0.0, vcl
+        for _ in range(SPEED_SOLVER_STEPS):
+            middle = (low + high) / 2
+            if sampled_vcl(middle) < vcl:
+                low = middle
+            else:
+                high = middle
+        speed = (low + high) / 2
+        return {'vcl': vcl, 'alh': alh, 'bcf': bcf, 'curvature': curvature, 'speed': speed}, path(speed)
+
+    def _visible_frames(self, path: np.ndarray) -> int:
+        """Frames until the head first leaves the field"""
+        inside = ((path[:, 0] >= 0) & (path[:, 0] < self.width) &
+                  (path[:, 1] >= 0) & (path[:, 1] < self.height))
+        outside = np.flatnonzero(~inside)
+        return int(outside[0]) if len(outside) else len(path)
+
+    def _headings(self, path: np.ndarray) -> np.ndarray:
+        if len(path) < 2:
+            return np.zeros(len(path))
+        velocity = np.gradient(path, axis=0)
+        return np.arctan2(velocity[:, 1], velocity[:, 0])
+
+    def _head_boxes(self, path: np.ndarray, headings: np.ndarray) -> np.ndarray:
+        """Axis-aligned boxes (x1, y1, x2, y2) around the rotated head ellipses"""
+        a = HEAD_SIZE[0] / 2 / self.pixel_to_micron
+        b = HEAD_SIZE[1] / 2 / self.pixel_to_micron
+        cos, sin = np.cos(headings), np.sin(headings)
+        half_w = np.sqrt((a * cos) ** 2 + (b * sin) ** 2)
+        half_h = np.sqrt((a * sin) ** 2 + (b * cos) ** 2)
+        return np.stack([path[:, 0] - half_w, path[:, 1] - half_h,
+                         path[:, 0] + half_w, path[:, 1] + half_h], axis=1)
+
+    def render_frame(self, index: int) -> np.ndarray:
+        """Frame ``index`` as 8-bit BGR, like a decoded video frame"""
+        frame = self.background.copy()
+        head_axes = (HEAD_SIZE[0] / 2 / self.pixel_to_micron, HEAD_SIZE[1] / 2 / self.pixel_to_micron)
+        tail = TAIL_LENGTH / self.pixel_to_micron
+        shift = 4
+        scale = 1 << shift
+        for cell in self.cells:
+            if index >= cell['visible']:
+                continue
+            x, y = cell['path'][index]
+            heading = cell['headings'][index]
+            tail_end = (x - tail * math.cos(heading), y - tail * math.sin(heading))
+            cv2.line(frame, (int(x * scale), int(y * scale)),
+                     (int(tail_end[0] * scale), int(tail_end[1] * scale)), TAIL_LEVEL, 1, cv2.LINE_AA, shift)
+            cv2.ellipse(frame, (int(x * scale), int(y * scale)),
+                        (int(head_axes[0] * scale), int(head_axes[1] * scale)),
+                        math.degrees(heading), 0, 360, HEAD_LEVEL, -1, cv2.LINE_AA, shift)
+        # Per-frame sensor noise, seeded by frame so any frame can be rendered on its own
+        rng = np.random.default_rng([self.seed, index])
+        frame = cv2.GaussianBlur(frame, (3, 3), 0) + rng.normal(0, self.noise, frame.shape)
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+    def frames(self) -> Iterator[np.ndarray]:
+        for index in range(self.frame_count):
+            yield self.render_frame(index)
+
+    def ground_truth(self) -> List[Dict[str, Any]]:
+        """Per-cell tracks in pixels, truncated where the head leaves the field"""
+        tracks = []
+        for cell in self.cells:
+            visible = cell['visible']
+            if visible == 0:
+                continue
+            path = cell['path'][:visible]
+            boxes = self._head_boxes(path, cell['headings'][:visible])
+            tracks.append({
+                'track_id': cell['track_id'],
+                'motility_class': cell['motility_class'],
+                'parameters': cell['parameters'],
+                'frames': list(range(visible)),
+                'timestamps': self.timestamps[:visible].tolist(),
+                'x': path[:, 0].tolist(),
+                'y': path[:, 1].tolist(),
+                'bboxes': boxes.tolist()
+            })
+        return tracks
+
+    def frame_boxes(self, index: int) -> List[List[float]]:
+        """Ground-truth head boxes (x1, y1, x2, y2) visible in frame ``index``"""
+        boxes = []
+        for cell in self.cells:
+            if index < cell['visible']:
+                box = self._head_boxes(cell['path'][index:index + 1], cell['headings'][index:index + 1])
+                boxes.append(box[0].tolist())
+        return boxes
+
+    def expected_casa(self, tracks: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """CASA metrics of the ground-truth tracks (tracks under 3 points are skipped, as in analysis)"""
+        return expected_casa(tracks or self.ground_truth(), self.pixel_to_micron)
+
+    def write(self, output_dir: Union[str, Path], name: str = "synthetic") -> Dict[str, Path]:
+        """Write ``{name}.mp4`` and ``{name}.json`` (video settings, ground truth, expected CASA)"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        video_path = output_dir / f"{name}.mp4"
+        truth_path = output_dir / f"{name}.json"
+
+        writer = cv2.VideoWriter(str(video_path), cv2.VideoWriter_fourcc(*'mp4v'), self.fps,
+                                 (self.width, self.height))
+        try:
+            for frame in self.frames():
+                writer.write(frame)
+        finally:
+            writer.release()
+
+        tracks = self.ground_truth()
+        with open(truth_path, 'w') as f:
+            json.dump({
+                'video': self.settings(),
+                'tracks': tracks,
+                'expected_casa': self.expected_casa(tracks)
+            }, f, default=str)
+        logger.info(f"Synthetic video written to {video_path} ({len(tracks)} ground-truth tracks)")
+        return {'video': video_path, 'ground_truth': truth_path}
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            'width': self.width,
+            'height': self.height,
+            'fps': self.fps,
+            'frame_count': self.frame_count,
+            'duration': self.frame_count / self.fps,
+            'pixel_to_micron': self.pixel_to_micron,
+            'count': self.count,
+            'motility_mix': self.motility_mix,
+            'presets': self.presets,
+            'noise': self.noise,
+            'seed': self.seed
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a synthetic sperm video with ground truth")
+    parser.add_argument("--output", default="synthetic", help="Output directory")
+    parser.add_argument("--name", default="synthetic")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--density", type=float, default=100.0, help="Cells per megapixel")
+    parser.add_argument("--progressive", type=float, default=DEFAULT_MOTILITY_MIX['progressive'])
+    parser.add_argument("--non-progressive", type=float, default=DEFAULT_MOTILITY_MIX['non_progressive'])
+    parser.add_argument("--immotile", type=float, default=DEFAULT_MOTILITY_MIX['immotile'])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    video = SyntheticSpermVideo(
+        width=args.width, height=args.height, fps=args.fps, frame_count=args.frames, density=args.density,
+        motility_mix={'progressive': args.progressive, 'non_progressive': args.non_progressive,
+                      'immotile': args.immotile},
+        seed=args.seed
+    )
+    paths = video.write(args.output, args.name)
+    print(json.dumps({name: str(path) for name, path in paths.items()}))
+
+
+if __name__ == "__main__":
+    main()
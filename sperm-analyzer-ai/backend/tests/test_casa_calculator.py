@@ -0,0 +1,101 @@
+"""
+Vectorized CASA metrics against the per-track calculation
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import make_result
+from models.analysis_models import MOTILITY_CODES, SpermDetection, SpermTrack
+from services.casa_calculator import CASACalculator
+
+# Names of the scalar path's metrics in the vectorized output
+SCALAR_NAMES = {'vcl': 'vcl', 'vsl': 'vsl', 'vap': 'vap', 'lin': 'lin', 'str_metric': 'str',
+                'wob': 'wob', 'alh': 'alh', 'bcf': 'bcf'}
+
+
+def track(points, fps=30.0, track_id=0):
+    detections = [
+        SpermDetection(id=i, x=x, y=y, confidence=0.9, frame_number=i, timestamp=i / fps)
+        for i, (x, y) in enumerate(points)
+    ]
+    return SpermTrack(track_id=track_id, detections=detections, start_frame=0,
+                      end_frame=len(points) - 1, duration=(len(points) - 1) / fps)
+
+
+def vectorized(calculator, tracks):
+    """Vectorized metrics over the tracks laid out as point columns"""
+    points = [det for sperm_track in tracks for det in sperm_track.detections]
+    offsets = np.concatenate(([0], np.cumsum([len(sperm_track.detections) for sperm_track in tracks])))
+    return calculator.calculate_track_metrics_vectorized(
+        np.array([det.x for det in points]), np.array([det.y for det in points]),
+        np.array([det.timestamp for det in points]), offsets
+    )
+
+
+def assert_matches_scalar(calculator, tracks, metrics):
+    for i, sperm_track in enumerate(tracks):
+        expected = calculator.calculate_track_metrics(sperm_track.detections, fps=30.0)
+        if not expected:
+            assert all(np.isnan(metrics[name][i]) for name in SCALAR_NAMES)
+            assert metrics['motility_class'][i] == -1
+            continue
+        for name, scalar_name in SCALAR_NAMES.items():
+            assert metrics[name][i] == pytest.approx(expected[scalar_name], rel=1e-9, abs=1e-9), name
+        assert metrics['motility_class'][i] == MOTILITY_CODES[expected['motility_class']]
+
+
+@pytest.mark.parametrize("pixel_to_micron", [0.2, 0.65])
+def test_random_walks_match_scalar_path(pixel_to_micron):
+    calculator = CASACalculator(pixel_to_micron=pixel_to_micron)
+    tracks = make_result(n_tracks=300, track_length=40, seed=7).tracks
+
+    assert_matches_scalar(calculator, tracks, vectorized(calculator, tracks))
+
+
+def test_edge_cases_match_scalar_path():
+    calculator = CASACalculator()
+    tracks = [
+        track([(10, 10), (12, 11)]),                          # too short for metrics
+        track([(10, 10), (12, 11), (14, 13), (15, 15)]),      # too short for smoothing and BCF
+        track([(50, 50)] * 8),                                # immotile, no direction
+        track([(0, 0), (5, 3), (10, -3), (15, 3), (20, -3), (25, 0)]),  # zig-zag around its axis
+        track([(100 + 3 * i, 40) for i in range(10)]),        # straight line
+    ]
+    # Timestamps that do not increase make the scalar path return no metrics
+    tracks.append(track([(1, 1), (2, 2), (3, 3), (4, 4)]))
+    tracks[-1].detections[2].timestamp = tracks[-1].detections[1].timestamp
+
+    assert_matches_scalar(calculator, tracks, vectorized(calculator, tracks))
+
+
+def test_bcf_ignores_rounding_at_the_track_end():
+    calculator = CASACalculator()
+    rng = np.random.default_rng(3)
+    tracks = [track(rng.normal(0, 20, size=(12, 2)) + 300, track_id=i) for i in range(200)]
+    metrics = vectorized(calculator, tracks)
+
+    for i, sperm_track in enumerate(tracks):
+        points = np.array([(d.x, d.y) for d in sperm_track.detections]) * calculator.pixel_to_micron
+        direction = (points[-1] - points[0]) / np.linalg.norm(points[-1] - points[0])
+        lateral = (points - points[0]) @ np.array([-direction[1], direction[0]])
+        # Crossings between interior points only; the end point lies on the axis
+        crossings = np.count_nonzero(lateral[:-2] * lateral[1:-1] < 0)
+        total_time = sperm_track.detections[-1].timestamp - sperm_track.detections[0].timestamp
+        assert metrics['bcf'][i] == pytest.approx(crossings / 2 / total_time)
+
+
+def test_population_metrics_match_scalar_path():
+    calculator = CASACalculator()
+    result = make_result(n_tracks=50, track_length=30, seed=2)
+    for sperm_track in result.tracks:
+        computed = calculator.calculate_track_metrics(sperm_track.detections, fps=30.0)
+        computed['str_metric'] = computed.pop('str')
+        for name, value in computed.items():
+            setattr(sperm_track, name, value)
+
+    expected = calculator.calculate_population_metrics(result.tracks)
+    actual = calculator.calculate_population_metrics_vectorized(vectorized(calculator, result.tracks))
+
+    for name, value in expected.dict().items():
+        assert getattr(actual, name) == pytest.approx(value, rel=1e-9, abs=1e-9), name
@@ -0,0 +1,50 @@
+"""
+Frame ROI: rectangles, masks and the mask directory restriction
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from services.frame_roi import FrameROI, MASKS_DIR, resolve_mask_path
+
+
+@pytest.fixture
+def masks_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    MASKS_DIR.mkdir(parents=True)
+    mask = np.zeros((48, 64), dtype=np.uint8)
+    mask[10:30, 20:50] = 255
+    cv2.imwrite(str(MASKS_DIR / "chamber.png"), mask)
+    (tmp_path / "outside.png").write_bytes((MASKS_DIR / "chamber.png").read_bytes())
+    return tmp_path
+
+
+def test_rectangle_is_clipped_to_the_frame():
+    roi = FrameROI.from_parameters({'x': 40, 'y': 30, 'width': 100, 'height': 100}, 64, 48)
+
+    assert (roi.x, roi.y, roi.width, roi.height) == (40, 30, 24, 18)
+    assert roi.crop(np.ones((48, 64), dtype=np.uint8)).shape == (18, 24)
+
+
+def test_full_frame_rectangle_is_no_roi():
+    assert FrameROI.from_parameters({'x': 0, 'y': 0, 'width': 64, 'height': 48}, 64, 48) is None
+
+
+def test_mask_bounding_box_becomes_the_crop(masks_dir):
+    roi = FrameROI.from_parameters({'mask_path': "chamber.png"}, 64, 48)
+
+    assert (roi.x, roi.y, roi.width, roi.height) == (20, 10, 30, 20)
+    assert roi.area == 600
+
+
+@pytest.mark.parametrize("mask_path", ["../outside.png", "missing.png", "/etc/passwd", ""])
+def test_masks_outside_the_masks_dir_are_rejected(masks_dir, mask_path):
+    assert resolve_mask_path(mask_path) is None
+
+
+def test_rejected_mask_does_not_name_the_resolved_file(masks_dir):
+    with pytest.raises(ValueError) as error:
+        FrameROI.from_parameters({'mask_path': "../outside.png"}, 64, 48)
+
+    assert str(masks_dir) not in str(error.value)
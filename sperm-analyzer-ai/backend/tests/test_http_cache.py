@@ -0,0 +1,109 @@
+"""
+Conditional GET: ETag matching, 304 responses and Cache-Control on results
+"""
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from benchmarks.fixtures import make_result
+from utils.http_cache import (
+    CachedStaticFiles, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, etag_matches, make_etag
+)
+
+ETAG = make_etag("analysis", "v1")
+
+
+def request_with(if_none_match=None) -> Request:
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"other", {ETAG}', True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(request_with(header), ETAG) is expected
+
+
+def test_make_etag_depends_on_every_part():
+    assert make_etag("a", "v1") == make_etag("a", "v1")
+    assert make_etag("a", "v1") != make_etag("a", "v2")
+    assert make_etag("a", "v1", "casa_metrics") != make_etag("a", "v1", "tracks")
+
+
+@pytest.fixture
+def results_client(tmp_path, monkeypatch):
+    """The real results route, backed by a service storing into tmp_path"""
+    pytest.importorskip("torch")
+    monkeypatch.chdir(tmp_path)
+    from routes import analysis
+    from services.analysis_service import AnalysisService
+
+    service = AnalysisService()
+    service.storage.save(make_result(n_tracks=3, track_length=10, analysis_id="cached"))
+    monkeypatch.setattr(analysis, "analysis_service", service)
+
+    app = FastAPI()
+    app.include_router(analysis.router)
+    return TestClient(app), service
+
+
+def test_results_revalidate_with_etag(results_client):
+    client, _ = results_client
+
+    response = client.get("/analysis/cached/results")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == REVALIDATE_CACHE_CONTROL
+    # The compressed body carries the weak form of the ETag, which must still revalidate
+    etag = response.headers["ETag"]
+    assert etag.startswith("W/")
+
+    response = client.get("/analysis/cached/results", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag[2:]
+    assert response.content == b""
+
+
+def test_field_selection_has_its_own_etag(results_client):
+    client, _ = results_client
+
+    full = client.get("/analysis/cached/results").headers["ETag"]
+    summary = client.get("/analysis/cached/results", params={"exclude": "tracks"}).headers["ETag"]
+
+    assert full != summary
+    response = client.get("/analysis/cached/results", params={"exclude": "tracks"},
+                          headers={"If-None-Match": full})
+    assert response.status_code == 200
+
+
+def test_rewritten_result_is_not_served_as_unmodified(results_client):
+    client, service = results_client
+    etag = client.get("/analysis/cached/results").headers["ETag"]
+
+    result = make_result(n_tracks=4, track_length=10, analysis_id="cached")
+    service.storage.save(result)
+    service.results_cache.pop("cached", None)
+    service.summary_cache.pop("cached", None)
+
+    response = client.get("/analysis/cached/results", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()["tracks"]) == 4
+
+
+def test_static_files_cache_control(tmp_path):
+    (tmp_path / "report.csv").write_text("a,b\n")
+    (tmp_path / "v1").mkdir()
+    (tmp_path / "v1" / "chart.png").write_bytes(b"png")
+    app = FastAPI()
+    app.mount("/exports", CachedStaticFiles(directory=tmp_path, immutable_subdir="v1"))
+    client = TestClient(app)
+
+    assert client.get("/exports/report.csv").headers["Cache-Control"] == REVALIDATE_CACHE_CONTROL
+    assert client.get("/exports/v1/chart.png").headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
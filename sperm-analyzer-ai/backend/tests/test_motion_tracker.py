@@ -0,0 +1,64 @@
+"""
+Motion-only tracker used to re-track cached detections
+"""
+
+from services.motion_tracker import MotionTracker
+
+
+def detection(x, y, confidence=0.9):
+    return ([x - 10, y - 7.5, 20, 15], confidence, 'sperm')
+
+
+def confirmed_ids(tracks):
+    return {track.track_id: track for track in tracks if track.is_confirmed()}
+
+
+def test_crossing_heads_keep_their_ids():
+    tracker = MotionTracker(n_init=3)
+    directions = {}
+    for frame in range(20):
+        # Two heads passing each other on neighbouring rows
+        tracks = tracker.update_tracks([detection(100 + 8 * frame, 100), detection(260 - 8 * frame, 112)])
+        confirmed = confirmed_ids(tracks)
+        if frame >= 2:
+            assert len(confirmed) == 2
+            for track_id, track in confirmed.items():
+                directions.setdefault(track_id, set()).add(bool(track.velocity[0] > 0))
+
+    # Two ids for the whole sequence, each always moving the same way
+    assert len(directions) == 2
+    assert all(len(moves) == 1 for moves in directions.values())
+
+
+def test_tracks_are_confirmed_after_n_init_matches():
+    tracker = MotionTracker(n_init=3)
+
+    assert not confirmed_ids(tracker.update_tracks([detection(50, 50)]))
+    assert not confirmed_ids(tracker.update_tracks([detection(52, 50)]))
+    assert list(confirmed_ids(tracker.update_tracks([detection(54, 50)]))) == ['1']
+
+
+def test_detection_beyond_max_step_starts_a_new_track():
+    tracker = MotionTracker(n_init=1, max_step=10.0)
+    tracker.update_tracks([detection(50, 50)])
+
+    tracks = tracker.update_tracks([detection(80, 50)])
+
+    assert [track.track_id for track in tracks] == ['2']
+
+
+def test_missed_tracks_coast_until_max_age():
+    tracker = MotionTracker(max_age=2, n_init=1)
+    for frame in range(3):
+        tracker.update_tracks([detection(50 + 5 * frame, 50)])
+
+    tracker.update_tracks([])
+    tracker.update_tracks([])
+    # Reappears where constant velocity predicts it after two missed frames
+    tracks = tracker.update_tracks([detection(75, 50, confidence=0.5)])
+
+    assert [(track.track_id, track.get_det_conf()) for track in tracks] == [('1', 0.5)]
+
+    for _ in range(3):
+        tracker.update_tracks([])
+    assert tracker.tracks == []
@@ -0,0 +1,103 @@
+"""
+Round trip of results through the summary JSON plus columnar arrays
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import make_result
+from models.analysis_models import AnalysisResult
+from services.result_storage import ResultStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return ResultStorage(tmp_path)
+
+
+@pytest.fixture
+def result():
+    result = make_result(n_tracks=6, track_length=20, analysis_id="round-trip")
+    # Unclassified tracks and missing kinematics are stored as -1 / NaN
+    result.tracks[0].motility_class = None
+    result.tracks[1].alh = None
+    result.tracks[1].bcf = None
+    return result
+
+
+def test_round_trip_preserves_every_field(storage, result):
+    storage.save(result)
+
+    loaded = storage.load_result(result.analysis_id)
+
+    assert loaded.dict() == result.dict()
+
+
+def test_point_values_keep_full_precision(storage, result):
+    result.tracks[2].detections[0].x = 123.456789012345
+    storage.save(result)
+
+    loaded = storage.load_result(result.analysis_id)
+
+    assert loaded.tracks[2].detections[0].x == 123.456789012345
+
+
+def test_summary_only_load_keeps_video_metrics(storage, result):
+    storage.save(result)
+
+    summary = storage.load_result(result.analysis_id, include_tracks=False)
+
+    assert summary.tracks == []
+    assert summary.video_metrics == result.video_metrics
+    assert summary.casa_metrics == result.casa_metrics
+
+
+def test_columns_are_memory_mapped(storage, result):
+    storage.save(result)
+
+    columns = storage.load_columns(result.analysis_id, ['point_x', 'track_id'])
+
+    assert set(columns) == {'point_x', 'track_id'}
+    assert isinstance(columns['point_x'], np.memmap)
+    assert len(columns['point_x']) == sum(len(track.detections) for track in result.tracks)
+
+
+def test_rewrite_replaces_arrays_and_keeps_previous_generation(storage, result):
+    storage.save(result)
+    first_dir = storage.arrays_dir(result.analysis_id)
+
+    result.tracks = result.tracks[:2]
+    storage.save(result)
+
+    assert storage.arrays_dir(result.analysis_id) != first_dir
+    assert len(storage.load_result(result.analysis_id).tracks) == 2
+    # Readers that resolved the old arrays just before the swap can still open them
+    assert first_dir.exists()
+
+    storage.save(result)
+    assert not first_dir.exists()
+
+
+def test_delete_removes_summary_and_arrays(storage, result, tmp_path):
+    storage.save(result)
+    storage.save(result)
+
+    storage.delete(result.analysis_id)
+
+    assert not storage.exists(result.analysis_id)
+    assert not storage.has_columns(result.analysis_id)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_legacy_single_file_results_still_load(storage, result, tmp_path):
+    with open(tmp_path / f"{result.analysis_id}.json", 'w') as f:
+        json.dump(json.loads(result.json()), f)
+
+    loaded = storage.load_result(result.analysis_id)
+
+    assert not storage.has_columns(result.analysis_id)
+    assert isinstance(loaded, AnalysisResult)
+    assert loaded.dict() == result.dict()
+    assert storage.load_result(result.analysis_id, include_tracks=False).tracks == []
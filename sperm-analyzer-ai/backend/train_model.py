@@ -15,6 +15,7 @@ from typing import List, Dict, Tuple
 import json
 import argparse
 
+from services.synthetic_video import SyntheticSpermVideo
 from utils.logger import setup_logger
 
 logger = setup_logger()
@@ -48,11 +49,8 @@ class SpermDatasetPreparator:
         logger.info(f"Generating {num_samples} synthetic training samples...")
         
         for i in range(num_samples):
-            # Create synthetic image
-            img = self._generate_synthetic_image()
-            
-            # Generate annotations
-            annotations = self._generate_synthetic_annotations(img.shape[:2])
+            # Render a synthetic field with boxes around the rendered heads
+            img, annotations = self._generate_synthetic_sample(seed=i)
             
             # Determine split (80% train, 15% val, 5% test)
             if i < num_samples * 0.8:
@@ -74,49 +72,29 @@ class SpermDatasetPreparator:
         
         logger.info("Synthetic data generation complete!")
     
-    def _generate_synthetic_image(self, width: int = 640, height: int = 480) -> np.ndarray:
-        """Generate synthetic microscopy-like image"""
-        # Create base background
-        img = np.random.randint(20, 60, (height, width, 3), dtype=np.uint8)
-        
-        # Add microscopy-like background texture
-        noise = np.random.normal(0, 15, (height, width, 3))
-        img = np.clip(img + noise, 0, 255).astype(np.uint8)
-        
-        # Add some debris and artifacts
-        for _ in range(np.random.randint(5, 15)):
-            x = np.random.randint(0, width)
-            y = np.random.randint(0, height)
-            size = np.random.randint(3, 10)
-            cv2.circle(img, (x, y), size, (np.random.randint(0, 100),) * 3, -1)
+    def _generate_synthetic_sample(self, seed: int, width: int = 640, height: int = 480) -> Tuple[np.ndarray, List[Dict]]:
+        """Render one synthetic microscopy field and its head boxes (YOLO-normalized)"""
+        rng = np.random.default_rng(seed)
+        # Two frames so head orientations follow the motion
+        video = SyntheticSpermVideo(
+            width=width, height=height, frame_count=2,
+            density=rng.uniform(30, 160), noise=rng.uniform(3, 12), seed=seed
+        )
+        img = video.render_frame(0)
         
-        return img
-    
-    def _generate_synthetic_annotations(self, img_shape: Tuple[int, int]) -> List[Dict]:
-        """Generate synthetic sperm-like object annotations"""
-        height, width = img_shape
         annotations = []
-        
-        # Random number of sperm objects
-        num_objects = np.random.randint(10, 50)
-        
-        for _ in range(num_objects):
-            # Sperm are roughly elliptical, small objects
-            center_x = np.random.uniform(0.1, 0.9)
-            center_y = np.random.uniform(0.1, 0.9)
-            
-            # Sperm dimensions in normalized coordinates
-            w = np.random.uniform(0.01, 0.03)  # Width: 1-3% of image
-            h = np.random.uniform(0.005, 0.015)  # Height: 0.5-1.5% of image
-            
+        for x1, y1, x2, y2 in video.frame_boxes(0):
+            # Clip heads cut by the field edge
+            x1, x2 = max(x1, 0), min(x2, width)
+            y1, y2 = max(y1, 0), min(y2, height)
             annotations.append({
-                'x': center_x,
-                'y': center_y,
-                'w': w,
-                'h': h
+                'x': (x1 + x2) / 2 / width,
+                'y': (y1 + y2) / 2 / height,
+                'w': (x2 - x1) / width,
+                'h': (y2 - y1) / height
             })
         
-        return annotations
+        return img, annotations
     
     def augment_existing_data(self, source_dir: str, multiplier: int = 3):
         """Augment existing annotated data"""
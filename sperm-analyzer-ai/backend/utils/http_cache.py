@@ -0,0 +1,67 @@
+"""
+HTTP caching helpers: ETags, conditional GET and Cache-Control
+"""
+
+import hashlib
+import os
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.staticfiles import StaticFiles
+
+# Downloads whose content can change under the same URL (e.g. after re-analysis):
+# caches may store them but must revalidate with the ETag before reuse
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# Files whose path embeds the result version never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the given parts"""
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header matches the ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates)
+
+
+def not_modified(etag: str, cache_control: Optional[str] = None) -> Response:
+    """Empty 304 response carrying the validators"""
+    headers = {"ETag": etag}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(status_code=304, headers=headers)
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that adds Cache-Control to every file it serves"""
+
+    def __init__(self, *args, cache_control: str = REVALIDATE_CACHE_CONTROL,
+                 immutable_subdir: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+        # Files under this subdirectory are version-addressed and never change
+        self.immutable_subdir = immutable_subdir
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if self.immutable_subdir and f"{os.sep}{self.immutable_subdir}{os.sep}" in str(full_path):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = self.cache_control
+        return response
@@ -0,0 +1,151 @@
+"""
+Prometheus metrics for the analysis service
+Event metrics are recorded as analyses and requests run; gauges and cache
+counters that already live on the services are read at scrape time
+"""
+
+import time
+from typing import Iterable, Optional
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from utils.stage_timer import StageTimer
+
+# Per-frame stages take milliseconds, per-analysis stages up to minutes
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+FPS_BUCKETS = (1, 2, 5, 10, 15, 30, 60, 120, 250, 500, 1000)
+DETECTION_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Route label of requests that matched no API route (static files, 404s)
+UNMATCHED_ROUTE = "other"
+
+ANALYSES_STARTED = Counter(
+    'sperm_analyses_started_total', 'Analyses started', ['analysis_type']
+)
+ANALYSES_COMPLETED = Counter(
+    'sperm_analyses_completed_total', 'Analyses completed successfully', ['analysis_type']
+)
+ANALYSES_FAILED = Counter(
+    'sperm_analyses_failed_total', 'Analyses that failed', ['analysis_type']
+)
+STAGE_SECONDS = Histogram(
+    'sperm_analysis_stage_seconds',
+    'Pipeline stage latency; per frame for decode/preprocess/inference/tracking, per analysis otherwise',
+    ['stage'], buckets=STAGE_BUCKETS
+)
+FRAMES_ANALYZED = Counter(
+    'sperm_frames_analyzed_total', 'Frames (or images) run through detection or re-tracking'
+)
+ANALYSIS_FPS = Histogram(
+    'sperm_analysis_frames_per_second', 'Analyzed frames per second of wall time, per analysis',
+    buckets=FPS_BUCKETS
+)
+DETECTIONS_PER_FRAME = Histogram(
+    'sperm_detections_per_frame', 'Detections per analyzed frame or image', buckets=DETECTION_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency until the response body is sent',
+    ['method', 'route', 'status'], buckets=REQUEST_BUCKETS
+)
+
+
+def analysis_type_label(analysis_type) -> str:
+    """Label value of an AnalysisType (or its string)"""
+    return getattr(analysis_type, 'value', analysis_type)
+
+
+def observe_analysis(timer: Optional[StageTimer], frames: int, wall_seconds: float,
+                     detections_per_frame: Iterable[int]):
+    """Record the stage timings, throughput and detection counts of a completed analysis"""
+    if timer is not None:
+        for stage, values in timer.samples.items():
+            histogram = STAGE_SECONDS.labels(stage)
+            for seconds in values:
+                histogram.observe(seconds)
+    FRAMES_ANALYZED.inc(frames)
+    if frames and wall_seconds > 0:
+        ANALYSIS_FPS.observe(frames / wall_seconds)
+    for count in detections_per_frame:
+        DETECTIONS_PER_FRAME.observe(count)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by route template
+
+    Labels use the matched route's path (``/analysis/{analysis_id}``), not the
+    raw URL, so ids do not blow up the series count. Streaming responses are
+    timed until their last body chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {'code': 500}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get('route'), 'path', None) or UNMATCHED_ROUTE
+            REQUEST_SECONDS.labels(scope['method'], route, str(status['code'])).observe(
+                time.perf_counter() - start
+            )
+
+
+class AnalysisServiceCollector:
+    """
+    Scrape-time gauges and cache counters of the analysis and export services
+
+    ``analysis_service`` is whatever runs the app's analyses: it needs
+    ``queue_stats()`` and ``pending_work()``, and ``result_cache_stats()``
+    if it caches results.
+    """
+
+    def __init__(self, analysis_service, export_service=None, body_cache_stats=None):
+        self.analysis_service = analysis_service
+        self.export_service = export_service
+        self.body_cache_stats = body_cache_stats
+
+    def collect(self):
+        queue = self.analysis_service.queue_stats()
+        yield GaugeMetricFamily(
+            'sperm_analysis_active_jobs', 'Analyses currently processing', value=queue['active']
+        )
+        yield GaugeMetricFamily(
+            'sperm_analysis_queue_depth', 'Accepted uploads whose analysis has not started', value=queue['queued']
+        )
+        yield GaugeMetricFamily(
+            'sperm_analysis_pending_megapixel_frames',
+            'Estimated detection work of unfinished analyses (analyzed frames x megapixels)',
+            value=self.analysis_service.pending_work()
+        )
+
+        hits = CounterMetricFamily('sperm_cache_hits', 'Cache hits', labels=['cache'])
+        misses = CounterMetricFamily('sperm_cache_misses', 'Cache misses', labels=['cache'])
+        caches = {}
+        if hasattr(self.analysis_service, 'result_cache_stats'):
+            caches['results'] = self.analysis_service.result_cache_stats()
+        if self.export_service is not None:
+            artifact_cache = self.export_service.artifact_cache
+            caches['export_artifacts'] = {'hits': artifact_cache.hits, 'misses': artifact_cache.misses}
+        if self.body_cache_stats is not None:
+            caches['compressed_bodies'] = self.body_cache_stats()
+        for name, stats in caches.items():
+            hits.add_metric([name], stats['hits'])
+            misses.add_metric([name], stats['misses'])
+        yield hits
+        yield misses
@@ -0,0 +1,119 @@
+"""
+Per-stage timing of the analysis pipeline
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional, Any, Union
+
+import numpy as np
+
+# Pipeline stages in execution order; per-frame stages get one sample per frame
+PIPELINE_STAGES = ['decode', 'preprocess', 'inference', 'tracking', 'casa', 'serialization', 'save']
+PER_FRAME_STAGES = ['decode', 'preprocess', 'inference', 'tracking']
+
+# Per-frame samples kept per stage for service-wide percentiles
+SERVICE_SAMPLE_WINDOW = 50000
+
+
+def timing_summary(samples: List[float]) -> Dict[str, float]:
+    """Count, total and percentiles (ms) of one stage's durations in seconds"""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0.0, 0.0, 0.0)
+    return {
+        'count': int(len(values)),
+        'total_ms': float(values.sum()),
+        'mean_ms': float(values.mean()) if len(values) else 0.0,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(values.max()) if len(values) else 0.0
+    }
+
+
+class StageTimer:
+    """
+    Wall-clock durations per named stage
+
+    Plain lists of seconds, so a timer can be returned from a worker
+    process and merged into the parent's.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def merge(self, other: Optional[Union["StageTimer", Dict[str, List[float]]]]):
+        if other is None:
+            return
+        samples = other.samples if isinstance(other, StageTimer) else other
+        for name, values in samples.items():
+            self.samples.setdefault(name, []).extend(values)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage timing summaries, pipeline stages first"""
+        order = PIPELINE_STAGES + sorted(set(self.samples) - set(PIPELINE_STAGES))
+        return {name: timing_summary(self.samples[name]) for name in order if name in self.samples}
+
+
+class PerformanceStats:
+    """
+    Service-wide aggregate of per-analysis stage timings
+
+    Keeps running totals per stage plus a window of recent per-frame samples
+    for percentiles. Thread-safe.
+    """
+
+    def __init__(self, window: int = SERVICE_SAMPLE_WINDOW):
+        self._lock = threading.Lock()
+        self.analyses = 0
+        self.frames = 0
+        self.wall_seconds = 0.0
+        self.totals: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.recent: Dict[str, Deque[float]] = {}
+        self.window = window
+
+    def add(self, timer: StageTimer, frames: int, wall_seconds: float):
+        with self._lock:
+            self.analyses += 1
+            self.frames += frames
+            self.wall_seconds += wall_seconds
+            for name, values in timer.samples.items():
+                self.totals[name] = self.totals.get(name, 0.0) + float(sum(values))
+                self.counts[name] = self.counts.get(name, 0) + len(values)
+                self.recent.setdefault(name, deque(maxlen=self.window)).extend(values)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for name in PIPELINE_STAGES + sorted(set(self.totals) - set(PIPELINE_STAGES)):
+                if name not in self.totals:
+                    continue
+                recent = timing_summary(list(self.recent[name]))
+                stages[name] = {
+                    'count': self.counts[name],
+                    'total_ms': self.totals[name] * 1000,
+                    'mean_ms': self.totals[name] * 1000 / self.counts[name] if self.counts[name] else 0.0,
+                    'recent_p50_ms': recent['p50_ms'],
+                    'recent_p95_ms': recent['p95_ms'],
+                    'recent_p99_ms': recent['p99_ms']
+                }
+            return {
+                'analyses': self.analyses,
+                'frames': self.frames,
+                'frames_per_second': self.frames / self.wall_seconds if self.wall_seconds > 0 else 0.0,
+                'stages': stages
+            }